@@ -0,0 +1,249 @@
+"""Benchmark of `rdvc run` submitting to an in-process fake cluster.
+
+Every scenario drives the `rdvc` CLI from a throwaway Git repository against `FakeCluster`, through
+a `LatencyProxy` simulating the round-trip time to the cluster. It reports the wall time, the time
+spent in each phase of the submission, and the round trips and bytes exchanged with the cluster.
+
+    python benchmarks/bench_submit.py --rtt-ms 0 --rtt-ms 50
+    python benchmarks/bench_submit.py --rtt-ms 50 --update-baseline
+
+Results are compared with `benchmarks/baseline.json`: more remote commands, round trips or bytes
+than the baseline fail the benchmark, as does a slower wall time with `--check-time`.
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import paramiko
+from fake_cluster import FakeCluster, LatencyProxy
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# Every repetition submits again, rather than attaching to the identical job submitted by the first one
+SCENARIOS: Dict[str, List[str]] = {
+    "exec": ["run", "--no-attach"],
+    "sftp": ["run", "--no-attach", "--submit-mode", "sftp"],
+    "sweep": ["run", "--no-attach", "--sweep", "lr=" + ",".join(str(i / 100) for i in range(1, 11))],
+}
+
+# Functions timed as phases of a submission, as (module, attribute path)
+PHASES: Dict[str, Tuple[str, str]] = {
+    "context": ("rdvc.context", "load_context"),
+    "cli_defaults": ("rdvc.cli_options", "get_cli_defaults"),
+    "repo_check": ("rdvc.commands.run", "check_local_repo_consistent_with_remote"),
+    "render_template": ("rdvc.commands.run", "render_template"),
+    "connect": ("rdvc.slurm.ssh_client", "SSHClient.__enter__"),
+    "upload": ("rdvc.slurm.ssh_client", "SSHClient.upload"),
+    "submit": ("rdvc.commands.run", "submit_remote_single_exec"),
+    "submit_sftp": ("rdvc.commands.run", "submit_remote"),
+}
+
+# Relative increase of the bytes exchanged tolerated before failing, e.g. for longer job ids
+BYTES_TOLERANCE = 0.1
+# Round trips tolerated above the baseline: SSH window adjustments and keep-alives are not deterministic
+ROUND_TRIPS_TOLERANCE = 2
+
+
+def _git(repo_dir: Path, *args: str) -> None:
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "rdvc",
+        "GIT_AUTHOR_EMAIL": "rdvc@example.com",
+        "GIT_COMMITTER_NAME": "rdvc",
+        "GIT_COMMITTER_EMAIL": "rdvc@example.com",
+    }
+    subprocess.run(["git", *args], cwd=repo_dir, env=env, check=True, capture_output=True)
+
+
+def make_home(base_dir: Path) -> Path:
+    """Home directory with its own SSH key, so that neither user configs nor the connection daemon are used."""
+    home_dir = base_dir / "home"
+    (home_dir / ".ssh").mkdir(parents=True)
+    paramiko.RSAKey.generate(2048).write_private_key_file(str(home_dir / ".ssh/id_rsa"))
+    return home_dir
+
+
+def make_repo(base_dir: Path, host: str, files: int) -> Path:
+    """Git repository in sync with its remote, with `files` tracked files and an rDVC project config."""
+    origin_dir, repo_dir = base_dir / "origin.git", base_dir / "repo"
+    origin_dir.mkdir(parents=True)
+    repo_dir.mkdir()
+    _git(origin_dir, "init", "--quiet", "--bare")
+    _git(repo_dir, "init", "--quiet", "--initial-branch=main")
+
+    for i in range(files):
+        path = repo_dir / "src" / f"module_{i % 100}" / f"file_{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"VALUE = {i}\n" * 20)
+    (repo_dir / ".rdvc").mkdir()
+    (repo_dir / ".rdvc/config.toml").write_text(
+        f'[cluster]\nhost = "{host}"\nusername = "bench"\n\n[run]\ninstance = "t3.xlarge"\n'
+    )
+
+    _git(repo_dir, "add", "--all")
+    _git(repo_dir, "commit", "--quiet", "--message", "Benchmark repository")
+    _git(repo_dir, "remote", "add", "origin", str(origin_dir))
+    _git(repo_dir, "push", "--quiet", "--set-upstream", "origin", "main")
+    return repo_dir
+
+
+@contextlib.contextmanager
+def timed_phases(phases: Dict[str, float]) -> Iterator[None]:
+    """Adds the time spent in each function of `PHASES` to `phases` while active."""
+    patched: List[Tuple[Any, str, Any]] = []
+
+    def timed(name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+        return wrapper
+
+    for name, (module_name, attribute_path) in PHASES.items():
+        owner: Any = importlib.import_module(module_name)
+        *owner_path, attribute = attribute_path.split(".")
+        for owner_attribute in owner_path:
+            owner = getattr(owner, owner_attribute)
+        original = getattr(owner, attribute)
+        patched.append((owner, attribute, original))
+        setattr(owner, attribute, timed(name, original))
+
+    try:
+        yield
+    finally:
+        for owner, attribute, original in reversed(patched):
+            setattr(owner, attribute, original)
+
+
+def run_scenario(args: List[str], cluster: FakeCluster, proxy: LatencyProxy, repeat: int) -> Dict[str, Any]:
+    # pylint: disable-next=import-outside-toplevel
+    from rdvc.cli import cli
+
+    wall_times: List[float] = []
+    phase_times: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        phases: Dict[str, float] = {}
+        cluster.reset_counters()
+        proxy.reset_counters()
+        with timed_phases(phases), contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            cli.main(args, prog_name="rdvc", standalone_mode=False)
+            wall_times.append(time.perf_counter() - start)
+
+        for name, duration in phases.items():
+            phase_times.setdefault(name, []).append(duration)
+
+    # Traffic does not vary between repetitions, only the last one is reported
+    counters = proxy.reset_counters()
+    return {
+        "wall_ms": round(statistics.median(wall_times) * 1000, 1),
+        "phases_ms": {name: round(statistics.median(times) * 1000, 1) for name, times in phase_times.items()},
+        "connections": counters.connections,
+        "remote_commands": len(cluster.exec_commands),
+        "round_trips": counters.round_trips,
+        "bytes_sent": counters.bytes_sent,
+        "bytes_received": counters.bytes_received,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], time_tolerance: float) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]
+        if result["remote_commands"] > expected["remote_commands"]:
+            regressions.append(
+                f"{key}: {result['remote_commands']} remote commands, baseline {expected['remote_commands']}"
+            )
+        if result["round_trips"] > expected["round_trips"] + ROUND_TRIPS_TOLERANCE:
+            regressions.append(f"{key}: {result['round_trips']} round trips, baseline {expected['round_trips']}")
+        for counter in ("bytes_sent", "bytes_received"):
+            if result[counter] > expected[counter] * (1 + BYTES_TOLERANCE):
+                regressions.append(f"{key}: {result[counter]} {counter}, baseline {expected[counter]}")
+        if time_tolerance and result["wall_ms"] > expected["wall_ms"] * (1 + time_tolerance):
+            regressions.append(f"{key}: {result['wall_ms']} ms, baseline {expected['wall_ms']} ms")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    for key, result in results.items():
+        print(
+            f"{key:<16} {result['wall_ms']:>8.1f} ms  {result['round_trips']:>3} round trips"
+            f"  {result['connections']} connections  {result['remote_commands']} remote commands"
+            f"  {result['bytes_sent']:>7} B sent  {result['bytes_received']:>7} B received"
+        )
+        print("    " + "  ".join(f"{name} {duration:.1f} ms" for name, duration in result["phases_ms"].items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, action="append", help="simulated round-trip time, repeatable")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenario to run, repeatable")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of each scenario, the median is reported")
+    parser.add_argument("--files", type=int, default=1000, help="number of files tracked by the benchmark repository")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="record the results as the new baseline")
+    parser.add_argument(
+        "--check-time",
+        type=float,
+        default=0.0,
+        metavar="TOLERANCE",
+        help="also fail when the wall time exceeds the baseline by more than TOLERANCE, e.g. 0.5",
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+
+    base_dir = Path(tempfile.mkdtemp(prefix="rdvc-bench-"))
+    # Isolate the benchmark from the user's SSH keys, rDVC configs, caches and connection daemon
+    os.environ["HOME"] = str(make_home(base_dir))
+    os.environ.pop("RDVC_DAEMON_SOCKET", None)
+    os.environ.pop("GLOBAL_RDVC_CONFIG", None)
+
+    cluster = FakeCluster(base_dir / "cluster").start()
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for rtt_ms in args.rtt_ms or [0.0]:
+            proxy = LatencyProxy(cluster.port, rtt=rtt_ms / 1000).start()
+            repo_dir = make_repo(base_dir / f"rtt-{rtt_ms:g}", f"127.0.0.1:{proxy.port}", args.files)
+            os.chdir(repo_dir)
+            for scenario in args.scenario or list(SCENARIOS):
+                results[f"{scenario}@{rtt_ms:g}ms"] = run_scenario(SCENARIOS[scenario], cluster, proxy, args.repeat)
+            proxy.stop()
+    finally:
+        cluster.stop()
+
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.is_file() else {}
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    regressions = compare(results, baseline, args.check_time)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""In-process stand-in for a SLURM cluster reachable over SSH, for benchmarking rDVC without a cluster.
+
+`FakeCluster` runs a paramiko SSH/SFTP server backed by a local directory acting as the remote home
+directory. Exec requests run in bash, with the SLURM commands replaced by fake ones. `LatencyProxy`
+sits between rDVC and the server to add a configurable round-trip time and to count the bytes and
+round trips of every connection.
+"""
+
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+import paramiko
+from paramiko.common import AUTH_SUCCESSFUL, OPEN_SUCCEEDED
+from paramiko.sftp import SFTP_OK
+
+from rdvc.slurm.ssh_client import SLURM_BIN_DIR
+
+FAKE_SLURM_COMMANDS = {
+    "sbatch": """\
+#!/bin/bash
+# Allocates increasing job ids, prints the last one like `sbatch --parsable`
+exec 9>>"$RDVC_FAKE_CLUSTER_DIR/jobid.lock"
+flock 9
+job_id=$(( $(cat "$RDVC_FAKE_CLUSTER_DIR/jobid" 2>/dev/null || echo 1000) + 1 ))
+echo "$job_id" > "$RDVC_FAKE_CLUSTER_DIR/jobid"
+echo "$job_id"
+""",
+    "sacct": "#!/bin/bash\n",
+    "squeue": "#!/bin/bash\n",
+    "sinfo": """\
+#!/bin/bash
+echo "general*|t3.xlarge|2|(null)|15000|4|idle"
+""",
+}
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def __init__(self, flags: int):
+        super().__init__(flags)
+        # Read and written by paramiko.SFTPHandle
+        self.readfile: Optional[IO[bytes]] = None
+        self.writefile: Optional[IO[bytes]] = None
+
+    def stat(self) -> Any:
+        file = self.readfile or self.writefile
+        assert file is not None
+        return paramiko.SFTPAttributes.from_stat(os.fstat(file.fileno()))
+
+    def chattr(self, attr: paramiko.SFTPAttributes) -> int:
+        return SFTP_OK
+
+
+class _SFTPServer(paramiko.SFTPServerInterface):
+    def __init__(self, server: paramiko.ServerInterface, *args: Any, **kwargs: Any):
+        super().__init__(server, *args, **kwargs)
+        self.root = server.root  # type: ignore[attr-defined]
+
+    def _path(self, path: str) -> str:
+        return str(self.root / path.lstrip("/")) if not path.startswith(str(self.root)) else path
+
+    def canonicalize(self, path: str) -> str:
+        return self._path(path)
+
+    def list_folder(self, path: str) -> Any:
+        try:
+            attributes = []
+            for name in os.listdir(self._path(path)):
+                attribute = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(self._path(path), name)))
+                attribute.filename = name
+                attributes.append(attribute)
+            return attributes
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno or 0)
+
+    def stat(self, path: str) -> Any:
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno or 0)
+
+    lstat = stat
+
+    def open(self, path: str, flags: int, attr: paramiko.SFTPAttributes) -> Any:
+        try:
+            fd = os.open(self._path(path), flags, 0o644)
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno or 0)
+
+        handle = _SFTPHandle(flags)
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            handle.writefile = os.fdopen(fd, "r+b" if flags & os.O_RDWR else "wb")
+            if flags & os.O_RDWR:
+                handle.readfile = handle.writefile
+        else:
+            handle.readfile = os.fdopen(fd, "rb")
+        return handle
+
+    def chattr(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        if attr.st_mode is not None:
+            os.chmod(self._path(path), attr.st_mode)
+        return SFTP_OK
+
+    def rename(self, oldpath: str, newpath: str) -> int:
+        os.rename(self._path(oldpath), self._path(newpath))
+        return SFTP_OK
+
+    posix_rename = rename
+
+    def mkdir(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        os.mkdir(self._path(path))
+        return SFTP_OK
+
+    def remove(self, path: str) -> int:
+        os.remove(self._path(path))
+        return SFTP_OK
+
+
+class _SSHServer(paramiko.ServerInterface):
+    def __init__(self, cluster: "FakeCluster"):
+        self.cluster = cluster
+        self.root = cluster.home_dir
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "publickey"
+
+    def check_auth_publickey(self, username: str, key: paramiko.PKey) -> int:
+        return AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        return OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel: paramiko.Channel, command: bytes) -> bool:
+        self.cluster.exec_commands.append(command.decode())
+        threading.Thread(target=self.cluster.run_command, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+class FakeCluster:
+    """SSH/SFTP server on localhost whose remote home directory is `home_dir`.
+
+    Attributes:
+        home_dir (Path): remote home directory, with the rDVC directories created
+        port (int): port the server listens on
+        exec_commands (List[str]): commands executed since the last `reset_counters`
+    """
+
+    def __init__(self, base_dir: Optional[Path] = None):
+        self.base_dir = Path(base_dir or tempfile.mkdtemp(prefix="rdvc-fake-cluster-"))
+        self.home_dir = self.base_dir / "home"
+        self.bin_dir = self.base_dir / "bin"
+        self.exec_commands: List[str] = []
+
+        (self.home_dir / ".rdvc/logs").mkdir(parents=True, exist_ok=True)
+        (self.home_dir / ".rdvc/submissions").mkdir(parents=True, exist_ok=True)
+        self.bin_dir.mkdir(exist_ok=True)
+        for command, script in FAKE_SLURM_COMMANDS.items():
+            (self.bin_dir / command).write_text(script)
+            (self.bin_dir / command).chmod(0o755)
+
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(64)
+        self.port = self._socket.getsockname()[1]
+        self._transports: List[paramiko.Transport] = []
+
+    def start(self) -> "FakeCluster":
+        threading.Thread(target=self._serve, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._socket.close()
+        for transport in self._transports:
+            transport.close()
+
+    def reset_counters(self) -> None:
+        self.exec_commands = []
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPServer)
+            transport.start_server(server=_SSHServer(self))
+            self._transports.append(transport)
+
+    def run_command(self, channel: paramiko.Channel, command: str) -> None:
+        env = {**os.environ, "HOME": str(self.home_dir), "RDVC_FAKE_CLUSTER_DIR": str(self.base_dir)}
+        process = subprocess.Popen(
+            ["bash", "-c", command.replace(f"{SLURM_BIN_DIR}/", f"{self.bin_dir}/")],
+            cwd=self.home_dir,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        def feed_stdin() -> None:
+            assert process.stdin is not None
+            for chunk in iter(lambda: channel.recv(32768), b""):
+                process.stdin.write(chunk)
+            process.stdin.close()
+
+        stderr: List[bytes] = []
+        read_stderr = threading.Thread(target=lambda: stderr.append(process.stderr.read()))  # type: ignore[union-attr]
+        threading.Thread(target=feed_stdin, daemon=True).start()
+        read_stderr.start()
+
+        assert process.stdout is not None
+        stdout = process.stdout.read()
+        read_stderr.join()
+        channel.sendall(stdout)
+        channel.sendall_stderr(b"".join(stderr))
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+
+@dataclass
+class TrafficCounters:
+    """Traffic of the connections relayed by a `LatencyProxy`.
+
+    A round trip is counted every time the server answers after the client spoke, which is the
+    number of times the client had to wait for the network.
+    """
+
+    connections: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    round_trips: int = 0
+
+
+class LatencyProxy:
+    """TCP proxy delaying the data in both directions by half of `rtt` seconds."""
+
+    def __init__(self, target_port: int, rtt: float = 0.0):
+        self.target_port = target_port
+        self.rtt = rtt
+        self.counters = TrafficCounters()
+        self._lock = threading.Lock()
+
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(64)
+        self.port = self._socket.getsockname()[1]
+
+    def start(self) -> "LatencyProxy":
+        threading.Thread(target=self._serve, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._socket.close()
+
+    def reset_counters(self) -> TrafficCounters:
+        with self._lock:
+            counters, self.counters = self.counters, TrafficCounters()
+        return counters
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            server = socket.create_connection(("127.0.0.1", self.target_port))
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self.counters.connections += 1
+
+            # The last direction data flowed in, shared by both relays of the connection
+            state: Dict[str, str] = {"last": "down"}
+            threading.Thread(target=self._relay, args=(client, server, "up", state), daemon=True).start()
+            threading.Thread(target=self._relay, args=(server, client, "down", state), daemon=True).start()
+
+    def _relay(self, source: socket.socket, destination: socket.socket, direction: str, state: Dict[str, str]) -> None:
+        # Chunks are delivered in order, each one half a round trip after it was received
+        queue: List[Tuple[float, bytes]] = []
+        condition = threading.Condition()
+
+        def deliver() -> None:
+            while True:
+                with condition:
+                    while not queue:
+                        condition.wait()
+                    due, chunk = queue.pop(0)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    if not chunk:
+                        destination.shutdown(socket.SHUT_WR)
+                        return
+                    destination.sendall(chunk)
+                except OSError:
+                    return
+
+        threading.Thread(target=deliver, daemon=True).start()
+        while True:
+            try:
+                chunk = source.recv(65536)
+            except OSError:
+                chunk = b""
+
+            with self._lock:
+                if direction == "up":
+                    self.counters.bytes_sent += len(chunk)
+                else:
+                    self.counters.bytes_received += len(chunk)
+                    if chunk and state["last"] == "up":
+                        self.counters.round_trips += 1
+                if chunk:
+                    state["last"] = direction
+
+            with condition:
+                queue.append((time.monotonic() + self.rtt / 2, chunk))
+                condition.notify()
+            if not chunk:
+                return
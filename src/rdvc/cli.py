@@ -1,16 +1,103 @@
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
 import click
 
 from rdvc._version import version
-from rdvc.cli_options import get_cli_defaults
-from rdvc.commands.init import init
-from rdvc.commands.run import run
 
 
-@click.group(context_settings={"default_map": get_cli_defaults()})
+class LazyGroup(click.Group):
+    """Group importing the module of a subcommand only once it is invoked.
+
+    Keeps `rdvc --help` and shell completion from paying for paramiko, dulwich and jinja2.
+
+    Attributes:
+        lazy_subcommands (Dict[str, Tuple[str, str]]): maps command names to the "module.attribute"
+            path of the command and to the short help listed by `--help`
+    """
+
+    def __init__(self, *args: Any, lazy_subcommands: Optional[Dict[str, Tuple[str, str]]] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+
+        module_name, attribute = self.lazy_subcommands[cmd_name][0].rsplit(".", 1)
+        command: click.Command = getattr(importlib.import_module(module_name), attribute)
+        return command
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.lazy_subcommands:
+                rows.append((cmd_name, self.lazy_subcommands[cmd_name][1]))
+            else:
+                command = super().get_command(ctx, cmd_name)
+                rows.append((cmd_name, command.get_short_help_str() if command else ""))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "daemon": (
+            "rdvc.commands.daemon.daemon",
+            "Manage the local daemon reusing SSH connections across rDVC commands.",
+        ),
+        "init": ("rdvc.commands.init.init", "Setup rDVC."),
+        "instances": ("rdvc.commands.instances.instances", "List the instance types available on the cluster."),
+        "logs": ("rdvc.commands.logs.logs", "Print the logs of rDVC jobs."),
+        "report": ("rdvc.commands.report.report", "Show where rDVC jobs spend their time on the cluster."),
+        "run": ("rdvc.commands.run.run", "Execute `dvc exp run ARGS` on a remote cluster."),
+        "status": ("rdvc.commands.status.status", "Show the state of the rDVC jobs of this repository."),
+        "wait": (
+            "rdvc.commands.wait.wait",
+            "Wait for rDVC jobs to finish, pulling the experiments of each job as soon as it completes.",
+        ),
+        "workers": ("rdvc.commands.workers.workers", "Manage pilot jobs running queued experiments."),
+    },
+)
 @click.version_option(version)
-def cli() -> None:
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    envvar="RDVC_PROFILE",
+    help="Record the time spent in each phase of the command to this Chrome trace file and summarise it on stderr.",
+)
+@click.pass_context
+def cli(ctx: click.Context, profile: Optional[Path]) -> None:
     """Remote execution of DVC pipelines on a SLURM cluster."""
 
+    if profile is not None:
+        # pylint: disable-next=import-outside-toplevel
+        from rdvc import trace
+
+        trace.enable()
+        ctx.call_on_close(lambda: _write_profile(profile))
+
+    # Resolve configured defaults only once a subcommand is about to run
+    # pylint: disable-next=import-outside-toplevel
+    from rdvc.cli_options import get_cli_defaults
+    from rdvc.context import load_context
+
+    # Subcommands share the repository and configs read here through ctx.obj
+    ctx.obj = load_context()
+    ctx.default_map = get_cli_defaults(ctx.obj)
+
+
+def _write_profile(path: Path) -> None:
+    # pylint: disable-next=import-outside-toplevel
+    from rdvc import trace
 
-cli.add_command(init)
-cli.add_command(run)
+    trace.export_chrome_trace(path)
+    click.echo(trace.summarise(), err=True)
+    click.echo(f"Profile written to {path}.", err=True)
@@ -1,7 +1,7 @@
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, cast
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, TypeVar, cast
 
 import click
 import tomli
@@ -9,7 +9,9 @@ from click_option_group import optgroup
 from typing_extensions import ParamSpec
 
 from rdvc.dir import get_git_root
-from rdvc.repo import OutsideRepositoryError, get_job_repo
+
+if TYPE_CHECKING:
+    from rdvc.context import RDvcContext
 
 P = ParamSpec("P")
 R = TypeVar("R")
@@ -22,14 +24,49 @@ class OptionGroup:
 
 
 CLUSTER_OPTIONS: Dict[str, Dict[str, Any]] = {
-    "host": {"required": True, "show_default": True, "help": "SLURM cluster address"},
+    "host": {
+        "required": True,
+        "multiple": True,
+        "show_default": True,
+        "help": "SLURM cluster address, repeat to submit to the least loaded of several clusters",
+    },
     "username": {"required": True, "show_default": True, "help": "SLURM cluster username"},
+    "submit-mode": {
+        "type": click.Choice(["exec", "sftp"]),
+        "default": "exec",
+        "show_default": True,
+        "help": "submit in a single remote command (exec) or upload the sbatch script over SFTP first (sftp)",
+    },
 }
 
 INSTANCE_OPTIONS: Dict[str, Dict[str, Any]] = {
     "instance": {
         "show_default": True,
-        "help": "select instance type",
+        "help": "select instance type, or `auto` for the smallest idle one with the resources below",
+    },
+    "min-cpus": {
+        "type": click.IntRange(min=0),
+        "default": 0,
+        "show_default": True,
+        "help": "CPUs per node required by --instance auto",
+    },
+    "min-gpus": {
+        "type": click.IntRange(min=0),
+        "default": 0,
+        "show_default": True,
+        "help": "GPUs per node required by --instance auto",
+    },
+    "min-mem": {
+        "type": click.IntRange(min=0),
+        "default": 0,
+        "show_default": True,
+        "help": "GB of memory per node required by --instance auto",
+    },
+    "instance-cache-ttl": {
+        "type": click.IntRange(min=0),
+        "default": 300,
+        "show_default": True,
+        "help": "seconds for which the instance types discovered on the cluster are cached",
     },
 }
 
@@ -44,17 +81,82 @@ SBATCH_OPTIONS: Dict[str, Dict[str, Any]] = {
     "wckey": {"show_default": True, "help": "project tag"},
 }
 
+JOB_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "git-mirror": {
+        "is_flag": True,
+        "default": True,
+        "show_default": True,
+        "help": "clone the job workspace from a bare mirror of the repository shared by all jobs on the cluster",
+    },
+    "git-mirror-max-age": {
+        "type": click.IntRange(min=1),
+        "default": 30,
+        "show_default": True,
+        "help": "days after which unused git mirrors are removed from the cluster",
+    },
+    "partial-clone": {
+        "is_flag": True,
+        "default": True,
+        "show_default": True,
+        "help": "without a git mirror, only download the files of the submitted revision when cloning the repository",
+    },
+    "venv-cache": {
+        "is_flag": True,
+        "default": True,
+        "show_default": True,
+        "help": "reuse the Python environment built on the cluster for the same dependency files",
+    },
+    "venv-cache-max-age": {
+        "type": click.IntRange(min=1),
+        "default": 14,
+        "show_default": True,
+        "help": "days after which unused Python environments are removed from the cluster",
+    },
+    "venv-cache-max-size": {
+        "type": click.IntRange(min=1),
+        "default": 50,
+        "show_default": True,
+        "help": "GB of cached Python environments kept on the cluster, least recently used are removed first",
+    },
+    "node-cache": {
+        "is_flag": True,
+        "default": False,
+        "show_default": True,
+        "help": "keep a DVC cache on the local disk of each node, reading through and writing back to the shared one",
+    },
+    "node-cache-dir": {
+        "default": "/tmp/rdvc-node-cache",
+        "show_default": True,
+        "help": "directory of the node-local DVC cache, e.g. on a local NVMe drive",
+    },
+    "node-cache-max-size": {
+        "type": click.IntRange(min=1),
+        "default": 100,
+        "show_default": True,
+        "help": "GB of node-local DVC cache kept on each node, least recently read files are removed first",
+    },
+    "max-requeues": {
+        "type": click.IntRange(min=0),
+        "default": 0,
+        "show_default": True,
+        "help": "times a job terminated by SLURM, e.g. preempted, requeues itself to resume from the run-cache",
+    },
+}
+
 OPTION_GROUPS = {
     "cluster": OptionGroup(help="cluster configuration", options=CLUSTER_OPTIONS),
     "instance": OptionGroup(help="instance options", options=INSTANCE_OPTIONS),
     "sbatch": OptionGroup(help="sbatch options", options=SBATCH_OPTIONS),
+    "job": OptionGroup(help="job options", options=JOB_OPTIONS),
 }
 
 
 def options(group: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
     def inner(func: Callable[P, R]) -> Callable[P, R]:
         for option, kwargs in reversed(OPTION_GROUPS[group].options.items()):
-            func = optgroup.option(f"--{option}", **kwargs)(func)
+            # Flags can be switched off on the command line when enabled in a config file
+            decl = f"--{option}/--no-{option}" if kwargs.get("is_flag", False) else f"--{option}"
+            func = optgroup.option(decl, **kwargs)(func)
 
         # click-option-group loses typing information and triggers mypy
         return cast(Callable[P, R], optgroup.group(OPTION_GROUPS[group].help)(func))
@@ -75,7 +177,11 @@ def load_config(path: Path) -> Dict[str, Any]:
     if not path.is_file():
         return {}
     with open(path, mode="rb") as file:
-        return tomli.load(file)
+        try:
+            return tomli.load(file)
+        except tomli.TOMLDecodeError as err:
+            # The message of the error gives the line and column of the invalid TOML
+            raise click.UsageError(f"Invalid rDVC config {path}: {err}") from err
 
 
 def get_global_rdvc_config_path() -> Path:
@@ -86,26 +192,26 @@ def get_project_rdvc_config_path(path: Optional[Path] = None) -> Path:
     return get_git_root(path) / ".rdvc/config.toml"
 
 
-def get_cli_defaults() -> Dict[str, Any]:
-    rdvc_global_config = load_config(get_global_rdvc_config_path())
-    rdvc_project_config = load_config(get_project_rdvc_config_path())
-
-    try:
-        job_repo = get_job_repo(os.getcwd())
-    except OutsideRepositoryError:
+def get_cli_defaults(context: Optional["RDvcContext"]) -> Dict[str, Any]:
+    if context is None:
         return {}
 
-    def merge_configs(key: str) -> Dict[str, Any]:
-        # Set job name to rdvc-{cmd}:REPO_NAME:BRANCH as default
-        rdvc_dynamic_config = {"job-name": f"rdvc-{key}:{job_repo.name}:{job_repo.branch}"}
-
-        merged = {**rdvc_dynamic_config, **rdvc_global_config.get(key, {}), **rdvc_project_config.get(key, {})}
-
-        # Click internally replaces dashes with underscores so we conform
-        return {k.replace("-", "_"): v for k, v in merged.items()}
+    cluster_configs = context.merged_config("cluster")
+    # A single cluster can be configured as `host = "..."` rather than as a list
+    if isinstance(cluster_configs.get("host"), str):
+        cluster_configs["host"] = [cluster_configs["host"]]
 
-    cluster_configs = merge_configs("cluster")
     return {
-        "init": {**cluster_configs, **merge_configs("init")},
-        "run": {**cluster_configs, **merge_configs("run")},
+        "init": {**cluster_configs, **context.merged_config("init")},
+        "run": {**cluster_configs, **context.merged_config("run")},
+        "instances": {**cluster_configs, **context.merged_config("run")},
+        "status": cluster_configs,
+        "logs": cluster_configs,
+        "report": cluster_configs,
+        "wait": cluster_configs,
+        "workers": {
+            "start": {**cluster_configs, **context.merged_config("run"), **context.merged_config("workers")},
+            "status": cluster_configs,
+            "stop": cluster_configs,
+        },
     }
@@ -0,0 +1,100 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+import os
+import sys
+
+import click
+
+from rdvc.slurm.connection_daemon import (
+    DEFAULT_IDLE_TIMEOUT,
+    ConnectionDaemon,
+    get_daemon_socket_path,
+    is_daemon_running,
+    request,
+)
+
+log = logging.getLogger("rdvc")
+
+
+@click.group
+def daemon() -> None:
+    """Manage the local daemon reusing SSH connections across rDVC commands."""
+
+
+@daemon.command()
+@click.option(
+    "--idle-timeout",
+    type=click.IntRange(min=1),
+    default=DEFAULT_IDLE_TIMEOUT,
+    show_default=True,
+    help="seconds after which idle SSH connections, and then the daemon itself, are closed",
+)
+@click.option("--foreground", is_flag=True, help="do not detach the daemon from the terminal")
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+def start(
+    idle_timeout: int,
+    foreground: bool,
+    verbose: bool,
+) -> None:
+    """Start the connection daemon."""
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    socket_path = get_daemon_socket_path()
+    if is_daemon_running(socket_path):
+        click.echo(f"Connection daemon is already running on {socket_path}.")
+        return
+
+    # Bind before detaching so that the daemon accepts connections as soon as this command returns
+    server = ConnectionDaemon(socket_path, idle_timeout=idle_timeout)
+    if foreground:
+        server.serve()
+        return
+
+    if os.fork() > 0:
+        server.socket.close()
+        click.echo(f"Connection daemon started on {socket_path}.")
+        return
+
+    os.setsid()
+    logging.basicConfig(filename=socket_path.with_suffix(".log"), level=logging.INFO, force=True)
+    with open(os.devnull, "r+b") as devnull:
+        for stream in (sys.stdin, sys.stdout, sys.stderr):
+            os.dup2(devnull.fileno(), stream.fileno())
+
+    server.serve()
+    os._exit(0)
+
+
+@daemon.command()
+def stop() -> None:
+    """Stop the connection daemon and close its SSH connections."""
+
+    socket_path = get_daemon_socket_path()
+    if not is_daemon_running(socket_path):
+        click.echo("Connection daemon is not running.")
+        return
+
+    sock, _ = request(socket_path, {"kind": "shutdown"})
+    sock.close()
+    click.echo("Connection daemon stopped.")
+
+
+@daemon.command()
+def status() -> None:
+    """Show the SSH connections held by the connection daemon."""
+
+    socket_path = get_daemon_socket_path()
+    if not is_daemon_running(socket_path):
+        click.echo("Connection daemon is not running.")
+        return
+
+    sock, response = request(socket_path, {"kind": "status"})
+    sock.close()
+
+    click.echo(f"Connection daemon running on {socket_path}.")
+    for connection in response["connections"]:
+        state = "active" if connection["active"] else "closed"
+        click.echo(f"{connection['username']}@{connection['host']}: {state}, idle for {connection['idle']}s")
@@ -7,10 +7,10 @@ import click
 import tomli_w
 
 from rdvc import cli_options
+from rdvc.context import RDvcContext
 from rdvc.dir import get_git_root
 from rdvc.slurm.instance import InstanceTypes
 from rdvc.slurm.remote_checks import REMOTE_RDVC_DIRECTORIES
-from rdvc.slurm.ssh_client import SSHClient
 
 log = logging.getLogger("rdvc")
 
@@ -78,7 +78,9 @@ def global_(
 
 @init.command()
 @click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
 def remote(
+    ctx: click.Context,
     verbose: bool,
 ) -> None:
     """Setup remote rDVC config."""
@@ -86,14 +88,18 @@ def remote(
     if verbose:
         logging.basicConfig(level=logging.INFO)
 
-    init_options = cli_options.get_cli_defaults()["init"]
-    host = init_options["host"]
+    # paramiko is only imported by the subcommand connecting to the cluster
+    # pylint: disable-next=import-outside-toplevel
+    from rdvc.slurm.ssh_client import SSHClient
+
+    init_options = cli_options.get_cli_defaults(ctx.find_object(RDvcContext))["init"]
     username = init_options["username"]
 
-    with SSHClient(host, username=username) as client:
-        log.info("Generating remote directories if missing.")
-        remote_directories_command = f"mkdir -p .rdvc/{{{','.join(REMOTE_RDVC_DIRECTORIES)}}}"
-        client.mkdir(remote_directories_command)
+    for host in init_options["host"]:
+        with SSHClient(host, username=username) as client:
+            log.info(f"Generating remote directories on {host} if missing.")
+            remote_directories_command = f"mkdir -p .rdvc/{{{','.join(REMOTE_RDVC_DIRECTORIES)}}}"
+            client.mkdir(remote_directories_command)
 
 
 @init.command()
@@ -0,0 +1,64 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+from typing import Any
+
+import click
+
+from rdvc import cli_options
+from rdvc.slurm.catalogue import DEFAULT_CATALOGUE_TTL, get_catalogue
+from rdvc.slurm.instance import InstanceTypes
+
+log = logging.getLogger("rdvc")
+
+_COLUMNS = ["NAME", "PARTITION", "CPUS", "GPUS", "MEM(GB)", "IDLE", "NODES"]
+
+
+@click.command()
+@cli_options.options("cluster")
+@click.option("--refresh", is_flag=True, help="discover the instance types again rather than using the cache")
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+def instances(
+    ctx: click.Context,
+    refresh: bool,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """List the instance types available on the cluster.
+
+    Instance types are discovered from the partitions and nodes reported by `sinfo`."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+    username = cluster_key_value_options.get("username", None)
+    # Share the cache lifetime configured for `rdvc run`
+    ttl = ctx.lookup_default("instance_cache_ttl") or DEFAULT_CATALOGUE_TTL
+
+    for host in cluster_key_value_options["host"]:
+        entries = get_catalogue(host, username, ttl=ttl, refresh=refresh)
+
+        if len(cluster_key_value_options["host"]) > 1:
+            click.echo(f"{host}:")
+        rows = [
+            [
+                entry.instance.name,
+                entry.instance.partition,
+                str(entry.instance.cpus),
+                str(entry.instance.gpus),
+                str(entry.mem_per_node // 1024),
+                str(entry.idle_nodes),
+                str(entry.total_nodes),
+            ]
+            for entry in entries
+        ]
+        widths = [max(len(row[i]) for row in [_COLUMNS, *rows]) for i in range(len(_COLUMNS))]
+        for row in [_COLUMNS, *rows]:
+            click.echo("  ".join(row[i].ljust(width) for i, width in enumerate(widths)).rstrip())
+
+    click.echo(f"Built-in instance types: {', '.join(InstanceTypes.to_dict())}")
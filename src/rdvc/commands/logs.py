@@ -0,0 +1,144 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+import time
+from typing import Any, Dict, List, Tuple
+
+import click
+
+from rdvc import cli_options
+from rdvc.commands.status import get_repo_job_name_prefix
+from rdvc.slurm.jobs import SlurmJob, find_jobs, query_jobs
+from rdvc.slurm.log_tail import LogTail, read_new_lines
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+# Seconds between two queries of the state of followed jobs
+_JOB_STATE_INTERVAL = 30
+
+
+def _select_jobs(client: SSHClient, ctx: click.Context, job_ids: Tuple[str, ...], last: int) -> List[SlurmJob]:
+    if job_ids:
+        return query_jobs(client, job_ids)
+
+    jobs = find_jobs(client, name_prefix=get_repo_job_name_prefix(ctx, all_repos=False), last=last)
+    active_jobs = [job for job in jobs if not job.is_finished]
+    return active_jobs or jobs[:1]
+
+
+def _add_tails(
+    client: SSHClient, tails: Dict[str, LogTail], jobs: List[SlurmJob], tail_bytes: int, prefix: bool
+) -> None:
+    new_tails = [
+        LogTail(job.log_path, prefix=f"[{job.job_id}] ".encode() if prefix else b"")
+        for job in jobs
+        if job.has_log and job.log_path not in tails
+    ]
+
+    # Start from the end of the logs already written
+    sizes = client.file_sizes([tail.path for tail in new_tails])
+    for tail in new_tails:
+        if tail_bytes > 0:
+            tail.offset = max(0, sizes.get(tail.path, 0) - tail_bytes)
+        tails[tail.path] = tail
+
+
+@click.command()
+@cli_options.options("cluster")
+@click.option("-f", "--follow", is_flag=True, help="keep printing new lines until all jobs are finished")
+@click.option(
+    "--tail",
+    "tail_bytes",
+    type=click.IntRange(min=0),
+    default=16384,
+    show_default=True,
+    help="number of bytes to show from the end of each log, 0 shows whole logs",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    show_default=True,
+    help="seconds between two reads of the logs when following them",
+)
+@click.option(
+    "-n",
+    "--last",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="number of most recent submissions to look at when no JOB_IDS are given",
+)
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.argument("job_ids", nargs=-1)
+@click.pass_context
+# pylint: disable-next=too-many-locals
+def logs(
+    ctx: click.Context,
+    follow: bool,
+    tail_bytes: int,
+    interval: float,
+    last: int,
+    job_ids: Tuple[str, ...],
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Print the logs of rDVC jobs.
+
+    Shows the logs of JOB_IDS, or of the running and pending jobs of this repository (the most
+    recent one if none is). Only the bytes appended since the previous read are fetched, and all
+    logs are followed over a single SSH connection.
+
+    When several clusters are configured, the logs are read from the first one; select another
+    one with `--host`."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    # Job ids are specific to a cluster: only the first one is looked at
+    host = cluster_key_value_options["host"][0]
+    username = cluster_key_value_options.get("username", None)
+    with SSHClient(host=host, username=username) as client:
+        jobs = _select_jobs(client, ctx, job_ids, last)
+        if not jobs and not job_ids:
+            click.echo("No rDVC jobs found.")
+            return
+
+        followed_job_ids = list(dict.fromkeys([*job_ids, *(job.array_job_id for job in jobs)]))
+        prefix = len(followed_job_ids) > 1 or any(job.job_id != job.array_job_id for job in jobs)
+
+        # Jobs unknown to sacct, e.g. submitted moments ago, are looked up by their log file name
+        known_job_ids = {job.job_id for job in jobs} | {job.array_job_id for job in jobs}
+        jobs += [SlurmJob(job_id, "", "UNKNOWN", "", "", "") for job_id in job_ids if job_id not in known_job_ids]
+
+        tails: Dict[str, LogTail] = {}
+        _add_tails(client, tails, jobs, tail_bytes, prefix)
+
+        last_state_query = time.monotonic()
+        finished = not follow or all(job.is_finished for job in jobs)
+        try:
+            while True:
+                for lines in read_new_lines(client, tails.values()):
+                    click.echo(lines, nl=False)
+                if finished:
+                    break
+
+                time.sleep(interval)
+                if time.monotonic() - last_state_query > _JOB_STATE_INTERVAL:
+                    # Array tasks starting in the meantime are followed too
+                    jobs = query_jobs(client, followed_job_ids)
+                    _add_tails(client, tails, jobs, 0, prefix)
+                    finished = bool(jobs) and all(job.is_finished for job in jobs)
+                    last_state_query = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for tail in tails.values():
+                click.echo(tail.flush(), nl=False)
+                tail.close()
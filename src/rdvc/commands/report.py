@@ -0,0 +1,96 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+from typing import Any, Dict, List
+
+import click
+
+from rdvc import cli_options
+from rdvc.commands.status import get_repo_job_name_prefix
+from rdvc.slurm.report import (
+    PhaseRecord,
+    PhaseSummary,
+    fetch_reports,
+    summarise_categories,
+    summarise_phases,
+)
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+_COLUMNS = ["RUNS", "FAILED", "TOTAL (s)", "MEDIAN (s)", "CPU (s)", "SHARE"]
+
+
+def _print_summaries(summaries: Dict[str, PhaseSummary], total: float, name_column: str) -> None:
+    columns = [name_column, *_COLUMNS]
+    rows = [
+        [
+            summary.name,
+            str(len(summary.wall_seconds)),
+            str(summary.failures),
+            f"{summary.total:.1f}",
+            f"{summary.median:.1f}",
+            f"{summary.cpu_seconds:.1f}",
+            f"{summary.total / total:.0%}" if total else "-",
+        ]
+        for summary in summaries.values()
+    ]
+    widths = [max(len(row[i]) for row in [columns, *rows]) for i in range(len(columns))]
+    for row in [columns, *rows]:
+        click.echo("  ".join(row[i].ljust(width) for i, width in enumerate(widths)).rstrip())
+
+
+def _print_report(records: List[PhaseRecord]) -> None:
+    if not records:
+        click.echo("No rDVC job reports found.")
+        return
+
+    total = sum(record.wall_seconds for record in records)
+    click.echo(f"{len({record.job_id for record in records})} jobs, {total:.1f} s on compute nodes.\n")
+    _print_summaries(summarise_phases(records), total, "PHASE")
+    click.echo()
+    _print_summaries(summarise_categories(records), total, "CATEGORY")
+
+
+@click.command()
+@cli_options.options("cluster")
+@click.option("--all-repos", is_flag=True, help="aggregate the rDVC jobs of all repositories")
+@click.option(
+    "-n",
+    "--last",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="number of most recent job reports to look at",
+)
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+def report(
+    ctx: click.Context,
+    all_repos: bool,
+    last: int,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Show where rDVC jobs spend their time on the cluster.
+
+    Every job records the time spent cloning the repository, installing the Python environment,
+    running the experiment and pushing its results. The records of all jobs are fetched with a
+    single remote command per cluster and aggregated by phase, then into setup, compute and push."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    name_prefix = get_repo_job_name_prefix(ctx, all_repos)
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    username = cluster_key_value_options.get("username", None)
+    records: List[PhaseRecord] = []
+    for host in cluster_key_value_options["host"]:
+        with SSHClient(host=host, username=username) as client:
+            records += fetch_reports(client, last, name_prefix=name_prefix)
+
+    _print_report(records)
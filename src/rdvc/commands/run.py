@@ -1,29 +1,144 @@
 # Duplicating code helps make each command self-contained and explicit
 # pylint: disable=duplicate-code
+import dataclasses
 import logging
-import os
-from typing import Any, Tuple
+import math
+import shlex
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import click
 from click_option_group import optgroup
 from dulwich.repo import Repo
 
 from rdvc import cli_options
-from rdvc.dir import get_git_root
-from rdvc.repo import check_local_repo_consistent_with_remote, get_job_repo
-from rdvc.slurm.instance import InstanceTypes
+from rdvc.context import RDvcContext
+from rdvc.job_history import (
+    HistoryKey,
+    JobHistory,
+    JobRecord,
+    collect_metrics,
+    record_jobs,
+)
+from rdvc.repo import check_local_repo_consistent_with_remote, create_bundle
+from rdvc.right_size import (
+    LAST_JOBS,
+    RIGHT_SIZE_MODES,
+    format_time_limit,
+    get_candidates,
+    recommend,
+)
+from rdvc.run_cache import RUN_CACHE_CHECK_MODES, check_run_cache
+from rdvc.slurm.catalogue import InstanceCatalogueError, resolve_instance
+from rdvc.slurm.instance import InstanceType, InstanceTypes
+from rdvc.slurm.placement import connect_least_loaded
 from rdvc.slurm.remote_checks import check_rdvc_init
-from rdvc.slurm.remote_command import submit_remote
+from rdvc.slurm.remote_command import (
+    submit_remote,
+    submit_remote_single_exec,
+    upload_bundle,
+)
 from rdvc.slurm.sbatch_script import render_template
 from rdvc.slurm.ssh_client import SSHClient
+from rdvc.slurm.work_queue import (
+    enqueue_experiments,
+    get_environment_key,
+    get_queue_name,
+    read_queue_states,
+)
+from rdvc.stages import (
+    StageGroup,
+    StageSplitError,
+    parse_stage_instances,
+    split_pipeline,
+)
+from rdvc.submission_index import (
+    Submission,
+    SubmissionIndex,
+    find_in_flight,
+    record_submission,
+    submission_key,
+)
+from rdvc.sweep import expand_sweep
 
 log = logging.getLogger("rdvc")
 
 
+def _enqueue(
+    rdvc_context: RDvcContext, host: str, username: Optional[str], pull: bool, experiments: List[List[str]]
+) -> None:
+    job_repo = rdvc_context.job_repo
+    queue_name = get_queue_name(job_repo, get_environment_key(rdvc_context.repo, job_repo.rev))
+
+    with SSHClient(host=host, username=username) as client:
+        states = read_queue_states(client, queue_name, create=queue_name)
+        spec_ids = enqueue_experiments(client, queue_name, job_repo, pull, experiments)
+
+    click.echo(f"Queued {len(spec_ids)} experiments in queue {queue_name} on {host}.")
+    if not any(state.workers for state in states):
+        click.echo(
+            "No worker serves this queue. Start workers for the current revision with `rdvc workers start`.", err=True
+        )
+
+
+def _resolve_instance(
+    name: str, hosts: Sequence[str], username: Optional[str], instance_key_value_options: Dict[str, Any]
+) -> InstanceType:
+    builtin_names = InstanceTypes.to_dict()
+    if len(hosts) > 1 and name not in builtin_names:
+        # Partitions and node features differ between clusters, and the job may be placed on any of them
+        raise click.UsageError(
+            f"Instance type {name} is looked up in the partitions of a single cluster: with several --host, "
+            f"use one of the built-in instance types {', '.join(builtin_names)}."
+        )
+    try:
+        # Instance types missing from the built-in ones are looked up on the cluster
+        return resolve_instance(
+            name,
+            host=hosts[0],
+            username=username,
+            ttl=instance_key_value_options["instance_cache_ttl"],
+            min_cpus=instance_key_value_options["min_cpus"],
+            min_gpus=instance_key_value_options["min_gpus"],
+            min_mem=instance_key_value_options["min_mem"] * 1024,
+        )
+    except InstanceCatalogueError as err:
+        raise click.UsageError(str(err)) from err
+
+
+def _load_history(repo: Repo, username: Optional[str], keys: List[HistoryKey]) -> List[List[JobRecord]]:
+    """Collects the metrics of the jobs finished since the last run, then returns the latest jobs of each key."""
+    try:
+        with JobHistory(repo) as history:
+            collect_metrics(history, username)
+            return [history.latest(key, LAST_JOBS) for key in keys]
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not read the job history: {err}")
+        return [[] for _ in keys]
+
+
+def _get_dependency_args(job_ids: List[str], array: bool) -> List[str]:
+    """sbatch arguments starting a job once all `job_ids` completed, and cancelling it if any of them fails."""
+    if not job_ids:
+        return []
+    # The tasks of job arrays only wait for the tasks running the same sweep experiment
+    dependency_type = "aftercorr" if array else "afterok"
+    return [f"--dependency={dependency_type}:{':'.join(job_ids)}", "--kill-on-invalid-dep=yes"]
+
+
+def _echo_stage_job(job_id: str, group: StageGroup, instance: InstanceType, is_last: bool) -> None:
+    stages = f"runs stages {', '.join(group.stages)}" if group.stages else "restores all stages"
+    experiment = " and pushes the experiment" if is_last else ""
+    click.echo(f"Job {job_id} {stages} on {instance.name}{experiment}.")
+
+
 @click.command(context_settings={"ignore_unknown_options": True})
 @cli_options.options("cluster")
 @cli_options.options("instance")
 @cli_options.options("sbatch")
+@cli_options.options("job")
 @optgroup.group("DVC options")
 @optgroup.option(
     "--pull/--no-pull",
@@ -31,6 +146,87 @@ log = logging.getLogger("rdvc")
     default=True,
     help="pull dependencies and attempt to pull outputs of previously run stages from DVC remote",
 )
+@optgroup.option(
+    "--run-cache-check",
+    type=click.Choice(RUN_CACHE_CHECK_MODES),
+    default="off",
+    show_default=True,
+    help="before submitting, look the experiments up in the run-cache of the DVC remote and warn about or skip "
+    "the ones with results",
+)
+@optgroup.option(
+    "--split-stages",
+    is_flag=True,
+    help="submit the stages of the pipeline as separate jobs, chained by their dependencies and passing outputs "
+    "through the DVC remote",
+)
+@optgroup.option(
+    "--stage-instance",
+    "stage_instance_specs",
+    multiple=True,
+    metavar="STAGE=INSTANCE",
+    help="instance type of the job of STAGE with --split-stages, instead of --instance",
+)
+@optgroup.option(
+    "--right-size",
+    type=click.Choice(RIGHT_SIZE_MODES),
+    default="off",
+    show_default=True,
+    help="recommend or apply a tighter time limit, memory and instance type, sized from the resources used by the "
+    "last jobs of the same stages recorded in the job history",
+)
+@optgroup.group("sweep options")
+@optgroup.option(
+    "--sweep",
+    "sweep_params",
+    multiple=True,
+    metavar="PARAM=V1,V2,...",
+    help="sweep PARAM over comma-separated values; repeat to sweep over a grid",
+)
+@optgroup.option(
+    "--sweep-file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="file listing extra ARGS (e.g. `-S my_param=a`) of one experiment per line",
+)
+@optgroup.option(
+    "--max-concurrent", type=click.IntRange(min=1), help="maximum number of sweep experiments running at once"
+)
+@optgroup.option(
+    "--experiments-per-job",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="run this many sweep experiments side by side in each job, splitting its CPUs and GPUs between them",
+)
+@optgroup.group("repository check options")
+@optgroup.option(
+    "--full-repo-check",
+    is_flag=True,
+    help="hash the whole working tree instead of trusting the stat data of the git index for tracked files",
+)
+@optgroup.option(
+    "--stat-cache/--no-stat-cache",
+    show_default=True,
+    default=True,
+    help="remember the stat data of unchanged files hashed by the repository check",
+)
+@optgroup.option(
+    "--bundle",
+    is_flag=True,
+    help="upload the commits not pushed yet as a git bundle fetched by the jobs, instead of requiring a push",
+)
+@click.option(
+    "--queue",
+    is_flag=True,
+    help="append the experiments to the queue of the workers started with `rdvc workers start` instead of "
+    "submitting a job",
+)
+@click.option(
+    "--attach/--no-attach",
+    show_default=True,
+    default=True,
+    help="attach to an identical job still pending or running instead of submitting a duplicate",
+)
 @click.option("-v", "--verbose", is_flag=True, help="verbose mode")
 @click.argument(
     "args",
@@ -42,6 +238,19 @@ log = logging.getLogger("rdvc")
 def run(
     ctx: click.Context,
     pull: bool,
+    run_cache_check: str,
+    split_stages: bool,
+    stage_instance_specs: Tuple[str, ...],
+    right_size: str,
+    sweep_params: Tuple[str, ...],
+    sweep_file: Optional[Path],
+    max_concurrent: Optional[int],
+    experiments_per_job: int,
+    full_repo_check: bool,
+    stat_cache: bool,
+    bundle: bool,
+    queue: bool,
+    attach: bool,
     args: Tuple[str, ...],
     verbose: bool,
     **kwargs: Any,
@@ -49,7 +258,15 @@ def run(
     """Execute `dvc exp run ARGS` on a remote cluster.
 
     All unlisted options and arguments are added to ARGS and passed to the remote
-    process without modification."""
+    process without modification.
+
+    With --queue, the experiments are appended to the queue of the workers of the repository on the
+    first cluster instead. A sweep is submitted as a single SLURM job array with one task per experiment, or per
+    --experiments-per-job experiments run as concurrent job steps. With --split-stages, groups of stages
+    of the pipeline run as jobs chained by their dependencies, each on its own instance type. Submitted jobs are
+    recorded in the submission index, and an identical job still in flight is not submitted again. With --bundle,
+    commits not pushed yet are uploaded with the sbatch script rather than fetched from the Git remote. With
+    --right-size, the resources of the jobs are sized from the sacct metrics of earlier jobs."""
 
     # We capture these arguments through ctx.params and delete their references only to satisfy linters
     del kwargs
@@ -57,31 +274,219 @@ def run(
     if verbose:
         logging.basicConfig(level=logging.INFO)
 
-    repo = Repo(str(get_git_root()))
+    rdvc_context = ctx.find_object(RDvcContext)
+    if rdvc_context is None:
+        raise click.UsageError("rdvc run must be called from within a Git repository.")
+    log.info(f"Read repository and configs in {rdvc_context.build_time * 1000:.1f} ms.")
+
+    if split_stages and (queue or not pull or experiments_per_job > 1):
+        raise click.UsageError(
+            "--split-stages passes outputs between jobs through the DVC remote: it requires --pull and cannot be "
+            "combined with --queue or --experiments-per-job."
+        )
+    if bundle and queue:
+        raise click.UsageError(
+            "Workers fetch the experiments of --queue from the Git remote: push instead of --bundle."
+        )
+    # A --max-concurrent set in the configs only applies to sweeps
+    if (
+        ctx.get_parameter_source("max_concurrent") == click.core.ParameterSource.COMMANDLINE
+        and not sweep_params
+        and sweep_file is None
+    ):
+        raise click.UsageError("--max-concurrent limits the experiments of a sweep: pass --sweep or --sweep-file.")
 
     # Check repo consistency once all earlier issues have been ruled out.
-    check_local_repo_consistent_with_remote(repo)
+    check_local_repo_consistent_with_remote(
+        rdvc_context.repo,
+        full_check=full_repo_check,
+        use_stat_cache=stat_cache,
+        refs=rdvc_context.refs,
+        require_pushed=not bundle,
+    )
+    git_bundle = create_bundle(rdvc_context.repo, refs=rdvc_context.refs) if bundle else None
+    if git_bundle is not None:
+        log.info(f"Bundled the commits from {git_bundle.base_rev[:8]} to {git_bundle.rev[:8]}.")
 
-    job_repo = get_job_repo(os.getcwd())
+    sweep = expand_sweep(sweep_params, sweep_file)
+    # Jobs only reuse the run-cache of the DVC remote when pulling from it
+    if run_cache_check != "off" and pull:
+        remaining_sweep = check_run_cache(rdvc_context.git_root, args, sweep, run_cache_check)
+        if remaining_sweep is None:
+            return
+        sweep = remaining_sweep
+
+    job_repo = rdvc_context.job_repo
     cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
     sbatch_key_value_options, sbatch_flag_options = cli_options.get_options_from_context(ctx, "sbatch")
     instance_key_value_options, _ = cli_options.get_options_from_context(ctx, "instance")
+    job_key_value_options, job_flag_options = cli_options.get_options_from_context(ctx, "job")
+
+    hosts = cluster_key_value_options["host"]
+    username = cluster_key_value_options.get("username", None)
+    if queue:
+        _enqueue(rdvc_context, hosts[0], username, pull, [[*args, *map(shlex.quote, point)] for point in sweep or [()]])
+        return
+
+    instance = _resolve_instance(instance_key_value_options["instance"], hosts, username, instance_key_value_options)
+
+    experiments_per_job = min(experiments_per_job, max(len(sweep), 1))
+    if sweep:
+        log.info(f"Submitting a sweep of {len(sweep)} experiments as a job array.")
+
+    # The last job runs the experiment and pushes it, earlier ones only run groups of its stages
+    groups = [StageGroup([], instance_key_value_options["instance"])]
+    stage_args: List[str] = []
+    if split_stages:
+        stage_instances = {
+            **rdvc_context.global_config.get("stage-instances", {}),
+            **rdvc_context.project_config.get("stage-instances", {}),
+            **parse_stage_instances(stage_instance_specs),
+        }
+        try:
+            groups, stage_args = split_pipeline(
+                rdvc_context.git_root, args, stage_instances, instance_key_value_options["instance"]
+            )
+        except StageSplitError as err:
+            raise click.UsageError(f"Cannot split the pipeline into jobs: {err}") from err
 
-    instance = InstanceTypes.from_name(instance_key_value_options["instance"])
-
-    sbatch_script = render_template(
-        "commands/run.sbatch.j2",
-        job_repo=job_repo,
-        sbatch_key_value_options=sbatch_key_value_options,
-        sbatch_flag_options=sbatch_flag_options,
-        instance_key_value_options=instance.to_key_value_options(),
-        instance_flag_options=instance.to_flag_options(),
-        dvc_exp_run_pull=pull,
-        dvc_exp_run_options=args
+    instances = {instance_key_value_options["instance"]: instance}
+    for group in groups:
+        if group.instance not in instances:
+            instances[group.instance] = _resolve_instance(group.instance, hosts, username, instance_key_value_options)
+
+    # Jobs are sized from the history of the requested instance type, whether or not it was right-sized
+    history_keys = [
+        HistoryKey(job_repo.name, job_repo.pipeline or "", ",".join(group.stages), instances[group.instance].name)
+        for group in groups
+    ]
+    group_instances = [instances[group.instance] for group in groups]
+    time_limit = sbatch_key_value_options.get("time")
+    group_time_limits = [time_limit for _ in groups]
+    if right_size != "off" and experiments_per_job > 1:
+        # The history only has jobs running one experiment at a time
+        log.warning("--right-size does not size jobs running several experiments side by side.")
+    elif right_size != "off":
+        # Only built-in instance types exist on all clusters
+        candidates = get_candidates(hosts[0] if len(hosts) == 1 else None)
+        for group_index, records in enumerate(_load_history(rdvc_context.repo, username, history_keys)):
+            group_instance = group_instances[group_index]
+            recommendation = recommend(records, group_instance, time_limit, candidates)
+            if recommendation is None:
+                continue
+            stages = f" of {', '.join(groups[group_index].stages)}" if groups[group_index].stages else ""
+            if right_size == "recommend":
+                click.echo(
+                    f"The last {recommendation.jobs} jobs{stages} suggest requesting "
+                    f"{recommendation.describe(group_instance, time_limit)}. Apply with --right-size=apply."
+                )
+                continue
+
+            click.echo(
+                f"Right-sized from the last {recommendation.jobs} jobs{stages}: "
+                f"{recommendation.describe(group_instance, time_limit)}."
+            )
+            if recommendation.instance is not None:
+                group_instances[group_index] = recommendation.instance
+            if recommendation.mem is not None:
+                group_instances[group_index] = dataclasses.replace(group_instances[group_index], mem=recommendation.mem)
+            if recommendation.time is not None:
+                group_time_limits[group_index] = format_time_limit(recommendation.time)
+
+    try:
+        step_cpus, step_gpus = group_instances[-1].split(experiments_per_job)
+    except ValueError as err:
+        raise click.UsageError(str(err)) from err
+
+    job_name = sbatch_key_value_options.get("job_name")
+    sbatch_scripts = []
+    for group_index, group in enumerate(groups):
+        is_last = group_index == len(groups) - 1
+        sbatch_scripts.append(
+            render_template(
+                "commands/run.sbatch.j2" if is_last else "commands/stage.sbatch.j2",
+                job_repo=job_repo,
+                sbatch_key_value_options={
+                    **sbatch_key_value_options,
+                    "time": group_time_limits[group_index],
+                    **({} if is_last or not job_name else {"job_name": f"{job_name}:{group.stages[-1]}"}),
+                },
+                sbatch_flag_options=sbatch_flag_options,
+                instance_key_value_options=group_instances[group_index].to_key_value_options(),
+                instance_flag_options=group_instances[group_index].to_flag_options(),
+                job_options={**job_key_value_options, **job_flag_options},
+                dvc_exp_run_pull=pull,
+                dvc_exp_run_options=args if is_last else stage_args,
+                stages=group.stages,
+                sweep=sweep,
+                max_concurrent=max_concurrent,
+                array_size=math.ceil(len(sweep) / experiments_per_job),
+                experiments_per_job=experiments_per_job,
+                step_cpus=step_cpus,
+                step_gpus=step_gpus,
+                bundle=git_bundle,
+            )
+        )
+
+    key = submission_key(
+        "\n".join(sbatch_scripts),
+        job_repo.rev,
+        args,
+        ",".join(group_instance.name for group_instance in group_instances),
     )
+    # Jobs depending on each other are all submitted to the same cluster
+    job_ids: List[str] = []
+    with connect_least_loaded(hosts, username, group_instances[-1]) as client:
+        if attach:
+            try:
+                with SubmissionIndex(rdvc_context.repo) as index:
+                    in_flight = find_in_flight(index, key, username, client=client)
+            except (OSError, sqlite3.Error) as err:
+                log.warning(f"Could not look up identical jobs in the submission index: {err}")
+                in_flight = None
+            if in_flight is not None:
+                click.echo(
+                    f"Identical job {in_flight.job_id} is still {in_flight.state} on {in_flight.host}, "
+                    "attaching to it instead of submitting a duplicate."
+                )
+                return
 
-    host = cluster_key_value_options["host"]
-    username = cluster_key_value_options.get("username", None)
-    with SSHClient(host=host, username=username) as client:
-        check_rdvc_init(client)
-        submit_remote(client, sbatch_script)
+        if cluster_key_value_options["submit_mode"] == "sftp" or git_bundle is not None:
+            check_rdvc_init(client)
+        if git_bundle is not None:
+            upload_bundle(client, git_bundle)
+        try:
+            for group_index, group in enumerate(groups):
+                sbatch_args = _get_dependency_args(
+                    [job_ids[upstream] for upstream in group.upstream], array=bool(sweep)
+                )
+                if cluster_key_value_options["submit_mode"] == "sftp":
+                    job_ids.append(submit_remote(client, sbatch_scripts[group_index], sbatch_args))
+                else:
+                    job_ids.append(submit_remote_single_exec(client, sbatch_scripts[group_index], sbatch_args))
+                if split_stages:
+                    _echo_stage_job(
+                        job_ids[-1], group, group_instances[group_index], is_last=group_index == len(groups) - 1
+                    )
+        finally:
+            # Stage jobs run even if the last job could not be submitted, and are attached to as well
+            if job_ids:
+                record_submission(
+                    rdvc_context.repo,
+                    Submission(
+                        host=client.host,
+                        job_id=job_ids[-1],
+                        key=key,
+                        job_name=job_name or "",
+                        rev=job_repo.rev,
+                        submitted=time.time(),
+                        upstream=",".join(job_ids[:-1]),
+                    ),
+                )
+
+    if experiments_per_job == 1:
+        record_jobs(
+            rdvc_context.repo,
+            client.host,
+            [(job_ids[group_index], history_keys[group_index]) for group_index in range(len(groups))],
+        )
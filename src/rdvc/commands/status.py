@@ -0,0 +1,122 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+import sqlite3
+from typing import Any, List, Optional
+
+import click
+
+from rdvc import cli_options
+from rdvc.context import RDvcContext
+from rdvc.slurm.jobs import SlurmJob, find_jobs, get_job_name_prefix, query_jobs
+from rdvc.slurm.ssh_client import SSHClient
+from rdvc.submission_index import Submission, SubmissionIndex
+
+log = logging.getLogger("rdvc")
+
+_COLUMNS = ["JOBID", "STATE", "ELAPSED", "EXIT", "NODES", "NAME"]
+
+
+def get_repo_job_name_prefix(ctx: click.Context, all_repos: bool) -> Optional[str]:
+    """Returns the job name prefix of the jobs run from the current repository, or None for `all_repos`."""
+    if all_repos:
+        return None
+
+    rdvc_context = ctx.find_object(RDvcContext)
+    if rdvc_context is None:
+        raise click.UsageError("Call this command from within a Git repository or pass --all-repos.")
+    return get_job_name_prefix("run", rdvc_context.job_repo.name)
+
+
+def _indexed_submissions(ctx: click.Context, host: str, last: int) -> List[Submission]:
+    rdvc_context = ctx.find_object(RDvcContext)
+    assert rdvc_context is not None
+    try:
+        with SubmissionIndex(rdvc_context.repo) as index:
+            return index.latest(host, last)
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not read the submission index: {err}")
+        return []
+
+
+def _query_indexed_jobs(
+    ctx: click.Context, client: SSHClient, submissions: List[Submission], name_prefix: Optional[str]
+) -> List[SlurmJob]:
+    """Queries the jobs recorded in the submission index, and records their states in it."""
+    job_ids = [submission.job_id for submission in submissions]
+    jobs = query_jobs(client, job_ids, name_prefix=name_prefix)
+
+    rdvc_context = ctx.find_object(RDvcContext)
+    assert rdvc_context is not None
+    try:
+        with SubmissionIndex(rdvc_context.repo) as index:
+            index.update_states(client.host, jobs)
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not update the submission index: {err}")
+    return jobs
+
+
+def _print_jobs(jobs: List[SlurmJob]) -> None:
+    if not jobs:
+        click.echo("No rDVC jobs found.")
+        return
+
+    rows = [[job.job_id, job.state, job.elapsed, job.exit_code, job.nodes, job.name] for job in jobs]
+    widths = [max(len(row[i]) for row in [_COLUMNS, *rows]) for i in range(len(_COLUMNS) - 1)]
+    for row in [_COLUMNS, *rows]:
+        click.echo("  ".join([*(row[i].ljust(width) for i, width in enumerate(widths)), row[-1]]))
+
+
+@click.command()
+@cli_options.options("cluster")
+@click.option("--all-repos", is_flag=True, help="show the rDVC jobs of all repositories")
+@click.option(
+    "-n",
+    "--last",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="number of most recent submissions to look at",
+)
+@click.option(
+    "--scan-submissions",
+    is_flag=True,
+    help="list the submissions archived on the cluster rather than the jobs recorded in the local submission index",
+)
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+def status(
+    ctx: click.Context,
+    all_repos: bool,
+    last: int,
+    scan_submissions: bool,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Show the state of the rDVC jobs of this repository.
+
+    All jobs are queried with a single `sacct` call per cluster. The jobs of the repository are read from
+    the local submission index, and the remote submissions directory is only listed for jobs of all
+    repositories, with --scan-submissions, or when the index has no jobs for the cluster."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    name_prefix = get_repo_job_name_prefix(ctx, all_repos)
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    username = cluster_key_value_options.get("username", None)
+    for host in cluster_key_value_options["host"]:
+        submissions = [] if all_repos or scan_submissions else _indexed_submissions(ctx, host, last)
+        with SSHClient(host=host, username=username) as client:
+            if submissions:
+                jobs = _query_indexed_jobs(ctx, client, submissions, name_prefix)
+            else:
+                jobs = find_jobs(client, name_prefix=name_prefix, last=last)
+
+        if len(cluster_key_value_options["host"]) > 1:
+            click.echo(f"{host}:")
+        _print_jobs(jobs)
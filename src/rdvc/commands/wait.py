@@ -0,0 +1,207 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Dict, List, Tuple
+
+import click
+
+from rdvc import cli_options
+from rdvc.commands.status import get_repo_job_name_prefix
+from rdvc.context import RDvcContext
+from rdvc.slurm.jobs import SlurmJob, find_jobs, query_jobs
+from rdvc.slurm.results import ExperimentPullError, fetch_result_refs, pull_experiments
+from rdvc.slurm.ssh_client import SSHClient
+from rdvc.submission_index import SACCT_GRACE_PERIOD, SubmissionIndex
+
+log = logging.getLogger("rdvc")
+
+# Factor by which the polling interval grows while no job finishes
+_BACKOFF = 1.5
+
+
+def _get_context(ctx: click.Context) -> RDvcContext:
+    rdvc_context = ctx.find_object(RDvcContext)
+    if rdvc_context is None:
+        raise click.UsageError("rdvc wait must be called from within a Git repository.")
+    return rdvc_context
+
+
+def _select_job_ids(
+    ctx: click.Context, client: SSHClient, job_ids: Tuple[str, ...], last: int
+) -> Tuple[List[str], Dict[str, float]]:
+    """Returns the ids of the jobs to wait for, and the submission times of those found in the submission index."""
+    try:
+        with SubmissionIndex(_get_context(ctx).repo) as index:
+            submissions = index.latest(client.host) if job_ids else index.unfinished(client.host)
+            indexed = bool(submissions) or bool(index.latest(client.host, 1))
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not read the submission index: {err}")
+        submissions, indexed = [], False
+    submitted = {submission.job_id: submission.submitted for submission in submissions}
+
+    if job_ids:
+        return list(job_ids), submitted
+    if indexed:
+        return [submission.job_id for submission in submissions], submitted
+
+    # Jobs submitted before the index existed, or from another clone
+    jobs = find_jobs(client, name_prefix=get_repo_job_name_prefix(ctx, all_repos=False), last=last)
+    return list(dict.fromkeys(job.array_job_id for job in jobs if not job.is_finished)), submitted
+
+
+def _record_states(ctx: click.Context, host: str, jobs: List[SlurmJob]) -> None:
+    try:
+        with SubmissionIndex(_get_context(ctx).repo) as index:
+            index.update_states(host, jobs)
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not update the submission index: {err}")
+
+
+def _report_pulls(pulls: Dict["Future[List[str]]", List[str]], block: bool) -> List[str]:
+    """Prints the outcome of the finished pulls and forgets them, returns the ids of the jobs whose pull failed."""
+    if block:
+        wait_futures(list(pulls))
+
+    failed = []
+    for future in [future for future in pulls if future.done()]:
+        pulled_job_ids = pulls.pop(future)
+        try:
+            names = future.result()
+        except ExperimentPullError as err:
+            click.echo(f"Could not pull the experiments of jobs {', '.join(pulled_job_ids)}: {err}", err=True)
+            failed += pulled_job_ids
+            continue
+        click.echo(f"Pulled experiments {', '.join(names)} of jobs {', '.join(pulled_job_ids)}.")
+    return failed
+
+
+@click.command()
+@cli_options.options("cluster")
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=10.0,
+    show_default=True,
+    help="seconds between two queries of the job states, after a job finished",
+)
+@click.option(
+    "--max-interval",
+    type=click.FloatRange(min=0.1),
+    default=120.0,
+    show_default=True,
+    help="longest time between two queries of the job states, reached while no job finishes",
+)
+@click.option("--pull/--no-pull", default=True, show_default=True, help="pull the experiments of completed jobs")
+@click.option(
+    "-n",
+    "--last",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="number of most recent submissions to look at when no JOB_IDS are given and the submission index is empty",
+)
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.argument("job_ids", nargs=-1)
+@click.pass_context
+# pylint: disable-next=too-many-locals,too-many-branches
+def wait(
+    ctx: click.Context,
+    interval: float,
+    max_interval: float,
+    pull: bool,
+    last: int,
+    job_ids: Tuple[str, ...],
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Wait for rDVC jobs to finish, pulling the experiments of each job as soon as it completes.
+
+    Waits for JOB_IDS, or for the unfinished jobs of this repository recorded in the submission index.
+    The states of all jobs, including the tasks of sweeps, are queried with a single `sacct` call per
+    interval, and the interval grows while no job finishes, up to --max-interval. Only the experiments
+    pushed by the finished jobs are pulled, with one `dvc exp pull` per interval, while the other jobs keep running.
+    Fails if any job did not complete or its experiments could not be pulled.
+
+    When several clusters are configured, the jobs are looked up on the first one; select another
+    one with `--host`."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    rdvc_context = _get_context(ctx)
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    # Job ids are specific to a cluster: only the first one is looked at
+    host = cluster_key_value_options["host"][0]
+    username = cluster_key_value_options.get("username", None)
+    # Pulls share the lock of the DVC repository: a single one runs in the background while the jobs are polled
+    with SSHClient(host=host, username=username) as client, ThreadPoolExecutor(max_workers=1) as executor:
+        waited_job_ids, submitted = _select_job_ids(ctx, client, job_ids, last)
+        if not waited_job_ids:
+            click.echo("No unfinished rDVC jobs found.")
+            return
+        click.echo(f"Waiting for jobs {', '.join(waited_job_ids)}.")
+
+        started = time.time()
+        finished: Dict[str, SlurmJob] = {}
+        pulls: Dict["Future[List[str]]", List[str]] = {}
+        failed_pulls: List[str] = []
+        delay = interval
+        while True:
+            polled_jobs = query_jobs(client, waited_job_ids)
+            _record_states(ctx, host, polled_jobs)
+
+            newly_finished = [job for job in polled_jobs if job.is_finished and job.job_id not in finished]
+            for job in newly_finished:
+                finished[job.job_id] = job
+                click.echo(f"Job {job.job_id} {job.state} after {job.elapsed}.")
+
+            if pull and newly_finished:
+                refs = fetch_result_refs(client, [job.job_id for job in newly_finished])
+                for job in newly_finished:
+                    if job.job_id not in refs and job.state == "COMPLETED":
+                        log.warning(f"Job {job.job_id} recorded no experiment to pull.")
+                pulled_job_ids = [job.job_id for job in newly_finished if job.job_id in refs]
+                if pulled_job_ids:
+                    future = executor.submit(
+                        pull_experiments,
+                        rdvc_context.git_root,
+                        rdvc_context.job_repo.url,
+                        [ref for job_id in pulled_job_ids for ref in refs[job_id]],
+                    )
+                    pulls[future] = pulled_job_ids
+            failed_pulls += _report_pulls(pulls, block=False)
+
+            # Jobs unknown to sacct, e.g. submitted moments ago, are waited for until the grace period is over
+            reported_job_ids = {job.array_job_id for job in polled_jobs}
+            for job_id in [job_id for job_id in waited_job_ids if job_id not in reported_job_ids]:
+                if time.time() - submitted.get(job_id, started) > SACCT_GRACE_PERIOD:
+                    click.echo(f"Job {job_id} is not known to sacct, not waiting for it anymore.", err=True)
+                    waited_job_ids.remove(job_id)
+
+            if not waited_job_ids or (
+                all(job.is_finished for job in polled_jobs) and reported_job_ids >= set(waited_job_ids)
+            ):
+                break
+
+            delay = interval if newly_finished else min(delay * _BACKOFF, max_interval)
+            log.info(f"Querying the job states again in {delay:.0f} seconds.")
+            time.sleep(delay)
+
+        failed_pulls += _report_pulls(pulls, block=True)
+
+    failed_jobs = [job.job_id for job in finished.values() if job.state != "COMPLETED"]
+    if failed_jobs or failed_pulls:
+        messages = []
+        if failed_jobs:
+            messages.append(f"jobs {', '.join(failed_jobs)} did not complete")
+        if failed_pulls:
+            messages.append(f"the experiments of jobs {', '.join(failed_pulls)} could not be pulled")
+        raise click.ClickException(f"{' and '.join(messages).capitalize()}.")
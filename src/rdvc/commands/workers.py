@@ -0,0 +1,220 @@
+# Duplicating code helps make each command self-contained and explicit
+# pylint: disable=duplicate-code
+import logging
+from typing import Any, List
+
+import click
+
+from rdvc import cli_options
+from rdvc.context import RDvcContext
+from rdvc.repo import check_local_repo_consistent_with_remote
+from rdvc.slurm.catalogue import InstanceCatalogueError, resolve_instance
+from rdvc.slurm.remote_checks import check_rdvc_init
+from rdvc.slurm.remote_command import submit_remote, submit_remote_single_exec
+from rdvc.slurm.sbatch_script import render_template
+from rdvc.slurm.ssh_client import SSHClient
+from rdvc.slurm.work_queue import (
+    WORKER_HEARTBEAT_INTERVAL,
+    QueueState,
+    get_environment_key,
+    get_queue_name,
+    prepare_queue,
+    read_queue_states,
+    stop_workers,
+)
+
+log = logging.getLogger("rdvc")
+
+_COLUMNS = ["QUEUE", "PENDING", "RUNNING", "DONE", "FAILED", "WORKERS"]
+
+
+def _get_context(ctx: click.Context) -> RDvcContext:
+    rdvc_context = ctx.find_object(RDvcContext)
+    if rdvc_context is None:
+        raise click.UsageError("rdvc workers must be called from within a Git repository.")
+    return rdvc_context
+
+
+def _print_queue_states(states: List[QueueState], current_queue: str) -> None:
+    if not states:
+        click.echo("No rDVC queues found.")
+        return
+
+    # The queue of the current revision is marked with a star
+    rows = [
+        [
+            f"{state.name}{' *' if state.name == current_queue else ''}",
+            str(state.pending),
+            str(state.claimed),
+            str(state.done),
+            str(state.failed),
+            str(state.workers),
+        ]
+        for state in states
+    ]
+    widths = [max(len(row[i]) for row in [_COLUMNS, *rows]) for i in range(len(_COLUMNS))]
+    for row in [_COLUMNS, *rows]:
+        click.echo("  ".join(row[i].ljust(width) for i, width in enumerate(widths)).rstrip())
+
+
+@click.group
+def workers() -> None:
+    """Manage pilot jobs running queued experiments."""
+
+
+@workers.command()
+@cli_options.options("cluster")
+@cli_options.options("instance")
+@cli_options.options("sbatch")
+@cli_options.options("job")
+@click.option("--count", type=click.IntRange(min=1), default=1, show_default=True, help="number of workers to start")
+@click.option(
+    "--idle-timeout",
+    type=click.IntRange(min=0),
+    default=600,
+    show_default=True,
+    help="seconds after which a worker exits when the queue stays empty",
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0.1),
+    default=1.0,
+    show_default=True,
+    help="seconds between two looks of an idle worker at the queue",
+)
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+# pylint: disable-next=too-many-locals
+def start(
+    ctx: click.Context,
+    count: int,
+    idle_timeout: int,
+    poll_interval: float,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Start workers running the experiments queued with `rdvc run --queue`.
+
+    Every worker is a job cloning the repository and setting up its Python environment once, then
+    running queued experiments one after the other until the queue stays empty for --idle-timeout.
+    Workers serve the revisions sharing the Python environment dependencies of the current one."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    rdvc_context = _get_context(ctx)
+    check_local_repo_consistent_with_remote(rdvc_context.repo, refs=rdvc_context.refs)
+
+    job_repo = rdvc_context.job_repo
+    queue_name = get_queue_name(job_repo, get_environment_key(rdvc_context.repo, job_repo.rev))
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+    sbatch_key_value_options, sbatch_flag_options = cli_options.get_options_from_context(ctx, "sbatch")
+    instance_key_value_options, _ = cli_options.get_options_from_context(ctx, "instance")
+    job_key_value_options, job_flag_options = cli_options.get_options_from_context(ctx, "job")
+
+    hosts = cluster_key_value_options["host"]
+    username = cluster_key_value_options.get("username", None)
+    try:
+        instance = resolve_instance(
+            instance_key_value_options["instance"],
+            host=hosts[0],
+            username=username,
+            ttl=instance_key_value_options["instance_cache_ttl"],
+            min_cpus=instance_key_value_options["min_cpus"],
+            min_gpus=instance_key_value_options["min_gpus"],
+            min_mem=instance_key_value_options["min_mem"] * 1024,
+        )
+    except InstanceCatalogueError as err:
+        raise click.UsageError(str(err)) from err
+
+    sbatch_script = render_template(
+        "commands/worker.sbatch.j2",
+        job_repo=job_repo,
+        sbatch_key_value_options=sbatch_key_value_options,
+        sbatch_flag_options=sbatch_flag_options,
+        instance_key_value_options=instance.to_key_value_options(),
+        instance_flag_options=instance.to_flag_options(),
+        job_options={**job_key_value_options, **job_flag_options},
+        array_size=count,
+        max_concurrent=None,
+        queue_name=queue_name,
+        idle_timeout=idle_timeout,
+        poll_interval=poll_interval,
+        heartbeat_interval=WORKER_HEARTBEAT_INTERVAL,
+    )
+
+    # `rdvc run --queue` appends experiments to the queue on the first cluster, so its workers run there too
+    with SSHClient(host=hosts[0], username=username) as client:
+        prepare_queue(client, queue_name)
+        if cluster_key_value_options["submit_mode"] == "sftp":
+            check_rdvc_init(client)
+            submit_remote(client, sbatch_script)
+        else:
+            submit_remote_single_exec(client, sbatch_script)
+
+    click.echo(f"Started {count} workers serving queue {queue_name}.")
+
+
+@workers.command()
+@cli_options.options("cluster")
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+def status(
+    ctx: click.Context,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Show the queues of this repository, with their experiments and live workers.
+
+    The queue serving the current revision is marked with a star."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    rdvc_context = _get_context(ctx)
+    job_repo = rdvc_context.job_repo
+    current_queue = get_queue_name(job_repo, get_environment_key(rdvc_context.repo, job_repo.rev))
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    username = cluster_key_value_options.get("username", None)
+    for host in cluster_key_value_options["host"]:
+        with SSHClient(host=host, username=username) as client:
+            states = read_queue_states(client, f"{job_repo.name}-")
+
+        if len(cluster_key_value_options["host"]) > 1:
+            click.echo(f"{host}:")
+        _print_queue_states(states, current_queue)
+
+
+@workers.command()
+@cli_options.options("cluster")
+@click.option("-v", "--verbose", is_flag=True, help="verbose mode")
+@click.pass_context
+def stop(
+    ctx: click.Context,
+    verbose: bool,
+    **kwargs: Any,
+) -> None:
+    """Stop the workers of this repository once their current experiment is finished."""
+
+    # We capture these arguments through ctx.params and delete their references only to satisfy linters
+    del kwargs
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    job_repo = _get_context(ctx).job_repo
+    cluster_key_value_options, _ = cli_options.get_options_from_context(ctx, "cluster")
+
+    username = cluster_key_value_options.get("username", None)
+    for host in cluster_key_value_options["host"]:
+        with SSHClient(host=host, username=username) as client:
+            queues = stop_workers(client, f"{job_repo.name}-")
+        for queue in queues:
+            click.echo(f"Stopping the workers of queue {queue} on {host}.")
@@ -0,0 +1,90 @@
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Union
+
+from dulwich.errors import NotGitRepository
+from dulwich.objects import ObjectID
+from dulwich.refs import Ref
+from dulwich.repo import Repo
+
+from rdvc.cli_options import (
+    get_global_rdvc_config_path,
+    get_project_rdvc_config_path,
+    load_config,
+)
+from rdvc.dir import get_git_root
+from rdvc.repo import OutsideRepositoryError, RDvcJobRepo, get_job_repo
+from rdvc.trace import span, traced
+
+
+@dataclass(frozen=True)
+class RDvcContext:
+    """State of the local repository and configs, read once per rDVC invocation and shared by commands.
+
+    Attributes:
+        git_root (Path): root of the git repository containing the working directory
+        repo (Repo): opened git repository
+        refs (Mapping[Ref, ObjectID]): refs of `repo` when the context was built
+        job_repo (RDvcJobRepo): description of the job to run from the working directory
+        global_config (Dict[str, Any]): content of the global rDVC config
+        project_config (Dict[str, Any]): content of the project rDVC config
+        build_time (float): seconds taken to build the context
+    """
+
+    git_root: Path
+    repo: Repo
+    refs: Mapping[Ref, ObjectID]
+    job_repo: RDvcJobRepo
+    global_config: Dict[str, Any]
+    project_config: Dict[str, Any]
+    build_time: float
+
+    @classmethod
+    @traced("load_context")
+    def build(cls, path: Union[str, os.PathLike, None] = None) -> "RDvcContext":
+        start = time.perf_counter()
+        path = os.getcwd() if path is None else path
+
+        with span("open_repo"):
+            try:
+                git_root = get_git_root(path)
+            except ValueError as err:
+                raise OutsideRepositoryError from err
+            repo = Repo(str(git_root))
+            refs = repo.get_refs()
+        job_repo = get_job_repo(path, repo=repo)
+
+        with span("load_config"):
+            global_config = load_config(get_global_rdvc_config_path())
+            project_config = load_config(get_project_rdvc_config_path(git_root))
+
+        return cls(
+            git_root=git_root,
+            repo=repo,
+            refs=refs,
+            job_repo=job_repo,
+            global_config=global_config,
+            project_config=project_config,
+            build_time=time.perf_counter() - start,
+        )
+
+    def merged_config(self, key: str) -> Dict[str, Any]:
+        """Returns section `key` of the configs, project values taking precedence over global ones."""
+
+        # Set job name to rdvc-{cmd}:REPO_NAME:BRANCH as default
+        rdvc_dynamic_config = {"job-name": f"rdvc-{key}:{self.job_repo.name}:{self.job_repo.branch}"}
+
+        merged = {**rdvc_dynamic_config, **self.global_config.get(key, {}), **self.project_config.get(key, {})}
+
+        # Click internally replaces dashes with underscores so we conform
+        return {k.replace("-", "_"): v for k, v in merged.items()}
+
+
+def load_context(path: Union[str, os.PathLike, None] = None) -> Optional[RDvcContext]:
+    """Builds the context of `path`, or returns None outside of a git repository."""
+    try:
+        return RDvcContext.build(path)
+    except (OutsideRepositoryError, NotGitRepository):
+        return None
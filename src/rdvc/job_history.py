@@ -0,0 +1,200 @@
+"""Local history of the resources used by the jobs submitted from a repository, kept in its Git directory.
+
+Jobs are recorded when they are submitted, and the metrics accounted by `sacct` are added once they
+finished, see `collect_metrics`. `rdvc run --right-size` sizes new jobs from the history of the jobs
+that ran the same pipeline stages on the same instance type.
+"""
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import TracebackType
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from dulwich.repo import Repo
+
+from rdvc.slurm.metrics import JobMetrics, query_job_metrics
+from rdvc.slurm.ssh_client import SSHClient
+from rdvc.submission_index import SACCT_GRACE_PERIOD, UNKNOWN_STATE
+
+log = logging.getLogger("rdvc")
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS jobs (
+    host TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    pipeline TEXT NOT NULL,
+    stages TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    state TEXT,
+    elapsed INTEGER,
+    max_rss INTEGER,
+    cpus REAL,
+    alloc_cpus INTEGER,
+    gpu_util REAL,
+    PRIMARY KEY (host, job_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (repo, pipeline, stages, instance, submitted);
+"""
+
+_METRICS_COLUMNS = "state, elapsed, max_rss, cpus, alloc_cpus, gpu_util"
+
+
+@dataclass
+class HistoryKey:
+    """What the jobs sized alike have in common.
+
+    Attributes:
+        repo (str): name of the repository
+        pipeline (str): pipeline of the repository, empty for the top-level one
+        stages (str): comma-separated stages run by jobs of `rdvc run --split-stages`, empty for whole experiments
+        instance (str): name of the instance type
+    """
+
+    repo: str
+    pipeline: str
+    stages: str
+    instance: str
+
+
+@dataclass
+class JobRecord:
+    """Resources used by a finished job, the largest of its tasks for job arrays, see `JobMetrics`."""
+
+    state: str
+    elapsed: int
+    max_rss: int
+    cpus: float
+    alloc_cpus: int
+    gpu_util: Optional[float]
+
+
+def aggregate_metrics(tasks: Sequence[JobMetrics]) -> JobRecord:
+    """Combines the metrics of the tasks of a job array, keeping the largest use of every resource."""
+    gpu_utils = [task.gpu_util for task in tasks if task.gpu_util is not None]
+    return JobRecord(
+        state=next((task.state for task in tasks if task.state != "COMPLETED"), "COMPLETED"),
+        elapsed=max(task.elapsed for task in tasks),
+        max_rss=max(task.max_rss for task in tasks),
+        cpus=max(task.cpus for task in tasks),
+        alloc_cpus=max(task.alloc_cpus for task in tasks),
+        gpu_util=max(gpu_utils) if gpu_utils else None,
+    )
+
+
+class JobHistory:
+    """SQLite history of the jobs submitted from a repository, used as a context manager.
+
+    Stored in the `.git` directory, like the submission index."""
+
+    FILE_NAME = "rdvc-history.sqlite"
+
+    def __init__(self, repo: Repo):
+        self.path = Path(repo.controldir()) / self.FILE_NAME
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "JobHistory":
+        # Concurrent rDVC commands wait for each other's writes rather than failing
+        self._connection = sqlite3.connect(self.path, timeout=30)
+        self._connection.executescript(_SCHEMA)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        assert self._connection is not None, "JobHistory must be used as a context manager."
+        return self._connection
+
+    def add(self, host: str, job_id: str, key: HistoryKey, submitted: float) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs (host, job_id, repo, pipeline, stages, instance, submitted) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (host, job_id, key.repo, key.pipeline, key.stages, key.instance, submitted),
+            )
+
+    def unrecorded(self) -> Dict[str, List[Tuple[str, float]]]:
+        """Returns the ids and submission times of the jobs whose metrics are missing, by host."""
+        jobs: Dict[str, List[Tuple[str, float]]] = {}
+        for host, job_id, submitted in self.connection.execute(
+            "SELECT host, job_id, submitted FROM jobs WHERE state IS NULL ORDER BY submitted"
+        ):
+            jobs.setdefault(host, []).append((job_id, submitted))
+        return jobs
+
+    def record(self, host: str, job_id: str, record: JobRecord) -> None:
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, elapsed = ?, max_rss = ?, cpus = ?, alloc_cpus = ?, gpu_util = ? "
+                "WHERE host = ? AND job_id = ?",
+                (
+                    record.state,
+                    record.elapsed,
+                    record.max_rss,
+                    record.cpus,
+                    record.alloc_cpus,
+                    record.gpu_util,
+                    host,
+                    job_id,
+                ),
+            )
+
+    def forget(self, host: str, job_id: str) -> None:
+        """Marks the metrics of a job no longer reported by `sacct` as unknown."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = ? WHERE host = ? AND job_id = ?", (UNKNOWN_STATE, host, job_id)
+            )
+
+    def latest(self, key: HistoryKey, last: int) -> List[JobRecord]:
+        """Returns the metrics of the `last` finished jobs of `key`, most recent first."""
+        rows = self.connection.execute(
+            f"SELECT {_METRICS_COLUMNS} FROM jobs WHERE repo = ? AND pipeline = ? AND stages = ? AND instance = ? "
+            "AND state IS NOT NULL AND state != ? ORDER BY submitted DESC LIMIT ?",
+            (key.repo, key.pipeline, key.stages, key.instance, UNKNOWN_STATE, last),
+        )
+        return [JobRecord(*row) for row in rows]
+
+
+def collect_metrics(history: JobHistory, username: Optional[str]) -> None:
+    """Adds the metrics of the jobs that finished since they were recorded, with one `sacct` call per cluster."""
+    for host, jobs in history.unrecorded().items():
+        with SSHClient(host=host, username=username) as client:
+            metrics = query_job_metrics(client, [job_id for job_id, _ in jobs])
+
+        tasks_by_id: Dict[str, List[JobMetrics]] = {}
+        for task in metrics:
+            tasks_by_id.setdefault(task.array_job_id, []).append(task)
+
+        for job_id, submitted in jobs:
+            tasks = tasks_by_id.get(job_id)
+            if tasks is None:
+                # Jobs whose accounting records expired are never recorded
+                if time.time() - submitted > SACCT_GRACE_PERIOD:
+                    history.forget(host, job_id)
+            elif all(task.is_finished for task in tasks):
+                history.record(host, job_id, aggregate_metrics(tasks))
+        log.info(f"Collected the metrics of {len(tasks_by_id)} jobs of {host}.")
+
+
+def record_jobs(repo: Repo, host: str, jobs: Sequence[Tuple[str, HistoryKey]]) -> None:
+    """Adds the submitted `jobs` to the history, warning rather than failing when it cannot be written."""
+    try:
+        with JobHistory(repo) as history:
+            for job_id, key in jobs:
+                history.add(host, job_id, key, time.time())
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not record jobs in the job history: {err}")
@@ -1,12 +1,27 @@
+import io
+import json
 import os
+import stat
+import time
 from dataclasses import dataclass
 from itertools import chain
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
 from dulwich import porcelain
+from dulwich.index import Index, blob_from_path_and_stat, cleanup_mode
+from dulwich.objects import S_ISGITLINK, ObjectID
+from dulwich.refs import Ref
 from dulwich.repo import Repo
+
 from rdvc.dir import get_git_root
+from rdvc.trace import traced
+
+# Index entry flag of paths excluded from the working tree by a sparse checkout
+_SKIP_WORKTREE_FLAG = 0x4000
+# The index stores sizes and inode numbers truncated to 32 bits
+_INDEX_STAT_MASK = 0xFFFFFFFF
+_NS_PER_S = 1_000_000_000
 
 
 @dataclass
@@ -41,8 +56,8 @@ class OutsideRepositoryError(Exception):
     pass
 
 
-def _get_pipeline(path: Union[str, os.PathLike]) -> Optional[str]:
-    rel_path = Path(path).relative_to(get_git_root(path))
+def _get_pipeline(path: Union[str, os.PathLike], git_root: Path) -> Optional[str]:
+    rel_path = Path(path).relative_to(git_root)
 
     if len(rel_path.parts) > 0 and rel_path.parts[0] == "pipelines":
         return rel_path.parts[1]
@@ -50,8 +65,11 @@ def _get_pipeline(path: Union[str, os.PathLike]) -> Optional[str]:
     return None
 
 
-def get_job_repo(path: Union[str, os.PathLike]) -> RDvcJobRepo:
-    repo = Repo(str(get_git_root(path)))
+@traced("get_job_repo")
+def get_job_repo(path: Union[str, os.PathLike], repo: Optional[Repo] = None) -> RDvcJobRepo:
+    """Describes the job to run for `path`, reusing `repo` if it is already open."""
+    if repo is None:
+        repo = Repo(str(get_git_root(path)))
 
     # NOTE Running outside of a git repo raises an IndexError here
     try:
@@ -64,12 +82,156 @@ def get_job_repo(path: Union[str, os.PathLike]) -> RDvcJobRepo:
         url=porcelain.get_remote_repo(repo)[-1],
         branch=repo_branch,
         rev=repo.head().decode(),
-        pipeline=_get_pipeline(path),
+        pipeline=_get_pipeline(path, Path(repo.path)),
+    )
+
+
+class StatCache:
+    """On-disk record of the stat data of files whose content was hashed and found to match the index.
+
+    Lets the fast consistency check skip re-hashing files that were touched (e.g. by a checkout) but
+    not modified, for as long as their stat data does not change. Stored in the `.git` directory.
+    """
+
+    FILE_NAME = "rdvc-stat-cache.json"
+
+    def __init__(self, repo: Repo):
+        self.path = Path(repo.controldir()) / self.FILE_NAME
+        self._entries: Dict[str, List[Any]] = {}
+        self._modified = False
+
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(st: os.stat_result, sha: bytes) -> List[Any]:
+        return [st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode, sha.decode()]
+
+    def matches(self, path: bytes, st: os.stat_result, sha: bytes) -> bool:
+        return self._entries.get(os.fsdecode(path)) == self._key(st, sha)
+
+    def add(self, path: bytes, st: os.stat_result, sha: bytes) -> None:
+        # Files modified within the last second could still change without changing their stat data
+        if st.st_mtime_ns < time.time_ns() - _NS_PER_S:
+            self._entries[os.fsdecode(path)] = self._key(st, sha)
+            self._modified = True
+
+    def save(self) -> None:
+        if self._modified:
+            with open(self.path, "w") as f:
+                json.dump(self._entries, f)
+
+
+def _to_ns(timestamp: Union[int, float, Tuple[int, int]]) -> int:
+    if isinstance(timestamp, tuple):
+        return timestamp[0] * _NS_PER_S + timestamp[1]
+    return int(timestamp * _NS_PER_S)
+
+
+def _index_stat_matches(entry: Any, st: os.stat_result, index_mtime_ns: int) -> bool:
+    entry_mtime_ns = _to_ns(entry.mtime)
+    st_mtime_ns = st.st_mtime_ns
+    if entry_mtime_ns % _NS_PER_S == 0:
+        # The index was written without sub-second precision
+        st_mtime_ns -= st_mtime_ns % _NS_PER_S
+
+    return (
+        entry_mtime_ns == st_mtime_ns
+        and entry.size == st.st_size & _INDEX_STAT_MASK
+        and (entry.ino == 0 or entry.ino == st.st_ino & _INDEX_STAT_MASK)
+        and entry.mode == cleanup_mode(st.st_mode)
+        # Files modified no earlier than the index itself cannot be told apart by their stat data ("racy git")
+        and st.st_mtime_ns < index_mtime_ns
     )
 
 
-def check_local_repo_consistent_with_remote(repo: Repo) -> None:
-    dulwich_status = porcelain.status(repo.path)
+def _find_staged_change(repo: Repo, index: Index) -> Optional[bytes]:
+    """Returns the first path whose staged content differs from HEAD, comparing hashes in the index
+    and in the HEAD tree only."""
+    head_tree = repo[repo.head()].tree  # type: ignore[attr-defined]
+    for (old_path, new_path), _, _ in index.changes_from_tree(repo.object_store, head_tree):
+        return new_path or old_path
+    return None
+
+
+def _find_unstaged_change(repo: Repo, index: Index, stat_cache: Optional[StatCache] = None) -> Optional[bytes]:
+    """Returns the first tracked path whose working tree content differs from the index.
+
+    Files are only hashed when their stat data differs from the index (and from `stat_cache`).
+    Untracked files are never visited."""
+    root_path = os.fsencode(repo.path)
+    index_mtime_ns = os.stat(os.path.join(repo.controldir(), "index")).st_mtime_ns
+
+    for path, index_entry in index.items():
+        # Older dulwich versions do not represent merge conflicts as a separate type
+        entry: Any = index_entry
+        if not hasattr(entry, "sha"):
+            # Unresolved merge conflict
+            return path
+        if S_ISGITLINK(entry.mode) or getattr(entry, "extended_flags", 0) & _SKIP_WORKTREE_FLAG:
+            continue
+
+        full_path = os.path.join(root_path, path)
+        try:
+            st = os.lstat(full_path)
+        except FileNotFoundError:
+            return path
+
+        if stat.S_ISDIR(st.st_mode):
+            return path
+        if _index_stat_matches(entry, st, index_mtime_ns):
+            continue
+        if stat_cache is not None and stat_cache.matches(path, st, entry.sha):
+            continue
+
+        if blob_from_path_and_stat(full_path, st).id != entry.sha:
+            return path
+        if stat_cache is not None:
+            stat_cache.add(path, st, entry.sha)
+
+    return None
+
+
+def _check_working_tree_fast(repo: Repo, use_stat_cache: bool = True) -> porcelain.GitStatus:
+    index = repo.open_index()
+
+    staged_path = _find_staged_change(repo, index)
+    if staged_path is not None:
+        return porcelain.GitStatus(staged={"add": [], "delete": [], "modify": [staged_path]}, unstaged=[], untracked=[])
+
+    stat_cache = StatCache(repo) if use_stat_cache else None
+    unstaged_path = _find_unstaged_change(repo, index, stat_cache)
+    if stat_cache is not None:
+        stat_cache.save()
+
+    return porcelain.GitStatus(
+        staged={"add": [], "delete": [], "modify": []},
+        unstaged=[] if unstaged_path is None else [unstaged_path],
+        untracked=[],
+    )
+
+
+@traced("repo_check")
+def check_local_repo_consistent_with_remote(
+    repo: Repo,
+    full_check: bool = False,
+    use_stat_cache: bool = True,
+    refs: Optional[Mapping[Ref, ObjectID]] = None,
+    require_pushed: bool = True,
+) -> None:
+    """Checks that the working tree is clean and that HEAD has been pushed.
+
+    By default, only tracked files are checked, trusting the stat data of the git index and stopping
+    at the first change. `full_check` hashes the whole working tree with `dulwich.porcelain.status`.
+    `refs` can be passed when they have already been read from `repo`. Unpushed commits are accepted
+    when `require_pushed` is False, for jobs fetching them from a bundle, see `create_bundle`."""
+    if full_check:
+        dulwich_status = porcelain.status(repo.path)
+    else:
+        dulwich_status = _check_working_tree_fast(repo, use_stat_cache=use_stat_cache)
 
     if len(dulwich_status.unstaged) > 0:
         raise RepositoryError(dulwich_status, message="Stash or stage, commit and push your local Git changes.")
@@ -79,12 +241,66 @@ def check_local_repo_consistent_with_remote(repo: Repo) -> None:
         raise RepositoryError(dulwich_status, message="Stash or commit and push your local Git changes.")
 
     # Get the hashes of the current local and remote branches and compare
-    refs = repo.get_refs()
-    head_tree_hash = refs.get(b"HEAD", None)
+    repo_refs = repo.get_refs() if refs is None else refs
+    head_tree_hash = repo_refs.get(Ref(b"HEAD"))
     if head_tree_hash is None:
         raise RepositoryError(dulwich_status, message="Do not work with detached HEAD.")
+    if not require_pushed:
+        return
 
     remote_branch = porcelain.get_branch_remote(repo) + b"/" + porcelain.active_branch(repo)
-    remote_tree_hash = refs.get(b"refs/remotes/" + remote_branch, None)
+    remote_tree_hash = repo_refs.get(Ref(b"refs/remotes/" + remote_branch))
     if head_tree_hash != remote_tree_hash:
         raise RepositoryError(dulwich_status, message="Push your local Git changes.")
+
+
+@dataclass
+class GitBundle:
+    """Thin git bundle of the commits of the current branch missing from its remote-tracking branch.
+
+    Attributes:
+        ref (str): branch ref contained in the bundle
+        rev (str): commit the bundle brings the branch to, HEAD
+        base_rev (str): commit of the remote-tracking branch, which the bundle requires
+        data (bytes): content of the bundle file
+    """
+
+    ref: str
+    rev: str
+    base_rev: str
+    data: bytes
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.rev}-{self.base_rev[:8]}.bundle"
+
+
+@traced("create_bundle")
+def create_bundle(repo: Repo, refs: Optional[Mapping[Ref, ObjectID]] = None) -> Optional[GitBundle]:
+    """Bundles the commits of the current branch that its remote-tracking branch lacks, if any.
+
+    The bundle only contains the objects missing from the remote-tracking branch, so jobs fetch it
+    into a clone of the remote. The branch must have been pushed once. `refs` can be passed when they
+    have already been read from `repo`."""
+    repo_refs = repo.get_refs() if refs is None else refs
+    head_sha = repo_refs.get(Ref(b"HEAD"))
+    branch = porcelain.active_branch(repo)
+    remote_branch = porcelain.get_branch_remote(repo) + b"/" + branch
+    remote_sha = repo_refs.get(Ref(b"refs/remotes/" + remote_branch))
+    if head_sha is None:
+        raise RepositoryError(porcelain.status(repo.path), message="Do not work with detached HEAD.")
+    if remote_sha is None:
+        raise RepositoryError(
+            porcelain.status(repo.path),
+            message=f"Push branch {branch.decode()} once, jobs fetch its later commits from a bundle.",
+        )
+    if head_sha == remote_sha:
+        return None
+
+    ref = b"refs/heads/" + branch
+    data = io.BytesIO()
+    # Version 2 bundle header: the prerequisite commit, then the ref, then the pack of the missing objects
+    data.write(b"# v2 git bundle\n-" + remote_sha + b" " + remote_branch + b"\n" + head_sha + b" " + ref + b"\n\n")
+    missing_objects = repo.object_store.find_missing_objects([remote_sha], [head_sha])
+    porcelain.pack_objects(repo, [sha for sha, _ in missing_objects], data, None)
+    return GitBundle(ref=ref.decode(), rev=head_sha.decode(), base_rev=remote_sha.decode(), data=data.getvalue())
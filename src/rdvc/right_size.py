@@ -0,0 +1,147 @@
+"""Resource requests of jobs sized from the resources used by earlier jobs, for `rdvc run --right-size`.
+
+Jobs requesting much more time or memory than they use cannot be backfilled into the gaps of the
+schedule, and wait longer in the queue. Requests are sized from the largest use among the last jobs
+of the same pipeline stages and instance type, recorded in the job history, with some headroom.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from rdvc.job_history import JobRecord
+from rdvc.slurm.catalogue import CatalogueEntry, load_catalogue
+from rdvc.slurm.instance import InstanceType, InstanceTypes
+
+RIGHT_SIZE_MODES = ["off", "recommend", "apply"]
+
+# Finished jobs needed before sizing requests, and the most recent ones looked at
+MIN_JOBS = 3
+LAST_JOBS = 10
+# Headroom over the largest use of each resource
+TIME_MARGIN = 1.5
+MEM_MARGIN = 1.25
+CPU_MARGIN = 1.25
+# GPUs busy less than this percentage of the time on average are considered unused
+IDLE_GPU_UTIL = 5.0
+
+_MIN_TIME = 300
+_MEM_STEP = 256
+_TIME_LIMIT_PATTERN = re.compile(r"^(?:(\d+)-)?(\d+)(?::(\d+))?(?::(\d+))?$")
+
+
+@dataclass
+class Recommendation:
+    """Tighter resource requests for a job, None for the requests that already fit.
+
+    Attributes:
+        jobs (int): number of finished jobs the requests are sized from
+        time (Optional[int]): time limit, in seconds
+        mem (Optional[int]): memory, in MB
+        instance (Optional[InstanceType]): smaller instance type
+    """
+
+    jobs: int
+    time: Optional[int] = None
+    mem: Optional[int] = None
+    instance: Optional[InstanceType] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return self.time is None and self.mem is None and self.instance is None
+
+    def describe(self, instance: InstanceType, time_limit: Optional[str]) -> str:
+        changes = []
+        if self.time is not None:
+            requested = f" instead of {time_limit}" if time_limit else ""
+            changes.append(f"--time={format_time_limit(self.time)}{requested}")
+        if self.mem is not None:
+            changes.append(f"{self.mem} MB of memory" + (f" instead of {instance.mem} MB" if instance.mem else ""))
+        if self.instance is not None:
+            changes.append(f"instance type {self.instance.name} instead of {instance.name}")
+        return ", ".join(changes)
+
+
+def parse_time_limit(value: str) -> int:
+    """Parses an sbatch time limit, e.g. `90`, `1:30:00` or `1-12`, into seconds."""
+    match = _TIME_LIMIT_PATTERN.match(value.strip())
+    if match is None:
+        raise ValueError(f"invalid time limit '{value}'")
+    days, first, second, third = match.groups()
+    if days is not None:
+        # days-hours[:minutes[:seconds]]
+        hours, minutes, seconds = int(first), int(second or 0), int(third or 0)
+        return ((int(days) * 24 + hours) * 60 + minutes) * 60 + seconds
+    if third is not None:
+        return (int(first) * 60 + int(second)) * 60 + int(third)
+    # minutes[:seconds]
+    return int(first) * 60 + int(second or 0)
+
+
+def format_time_limit(seconds: int) -> str:
+    days, seconds = divmod(seconds, 86400)
+    clock = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{days}-{clock}" if days else clock
+
+
+def _fits(entry: CatalogueEntry, cpus: int, gpus: int, mem: int) -> bool:
+    # The memory of the nodes of built-in instance types is not known
+    return entry.satisfies(cpus, gpus, mem if entry.mem_per_node else 0)
+
+
+def recommend(
+    records: List[JobRecord],
+    instance: InstanceType,
+    time_limit: Optional[str],
+    candidates: Sequence[CatalogueEntry],
+) -> Optional[Recommendation]:
+    """Sizes the requests of a job on `instance` with `time_limit` from the `records` of earlier jobs.
+
+    Requests are only tightened, and the time limit or memory are left as they are when one of the
+    jobs ran out of it. The instance type is replaced with the smallest of the `candidates` that is
+    no larger than `instance` and has enough CPUs, memory and GPUs, unless the GPUs sat idle, and is
+    kept when one of the jobs ran out of memory."""
+    if len(records) < MIN_JOBS:
+        return None
+
+    recommendation = Recommendation(jobs=len(records))
+    states = {record.state for record in records}
+    if "TIMEOUT" not in states:
+        time = max(_MIN_TIME, math.ceil(max(record.elapsed for record in records) * TIME_MARGIN / 60) * 60)
+        if time_limit is None or time < parse_time_limit(time_limit):
+            recommendation.time = time
+
+    mem = 0
+    if "OUT_OF_MEMORY" not in states:
+        mem = max(_MEM_STEP, math.ceil(max(record.max_rss for record in records) * MEM_MARGIN / _MEM_STEP) * _MEM_STEP)
+        if instance.mem == 0 or mem < instance.mem:
+            recommendation.mem = mem
+
+    cpus = max(1, math.ceil(max(record.cpus for record in records) * CPU_MARGIN))
+    gpus = instance.gpus
+    gpu_utils = [record.gpu_util for record in records]
+    if gpus and all(util is not None and util < IDLE_GPU_UTIL for util in gpu_utils):
+        gpus = 0
+    # Whether a smaller instance type has enough memory for jobs that ran out of it is unknown
+    if "OUT_OF_MEMORY" not in states:
+        smaller = [
+            entry.instance
+            for entry in candidates
+            if _fits(entry, cpus, gpus, mem)
+            and entry.instance.gpus <= instance.gpus
+            and entry.instance.cpus <= instance.cpus
+            and (entry.instance.gpus, entry.instance.cpus) != (instance.gpus, instance.cpus)
+        ]
+        if smaller:
+            recommendation.instance = min(smaller, key=lambda candidate: (candidate.gpus, candidate.cpus))
+
+    return None if recommendation.is_empty else recommendation
+
+
+def get_candidates(host: Optional[str]) -> List[CatalogueEntry]:
+    """Returns the built-in instance types and the cached catalogue of `host` if given, without connecting to it."""
+    builtin_entries = [CatalogueEntry(instance, mem_per_node=0) for instance in InstanceTypes.to_dict().values()]
+    if host is None:
+        return builtin_entries
+    return builtin_entries + (load_catalogue(host, ttl=math.inf) or [])
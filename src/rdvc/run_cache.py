@@ -0,0 +1,367 @@
+"""Lookup of the results of `dvc exp run` in the run-cache of the DVC remote, before submitting a job.
+
+DVC records every run of a stage in its run-cache, keyed by a hash of the command, dependencies and
+parameters of the stage. Keys are computed locally for the submitted revision and `-S` overrides,
+one level of the pipeline at a time: the outputs of upstream stages are taken from their run-cache
+entries, so a pipeline is found cached without running any of its stages. The entries of each level
+are fetched concurrently and the outputs of all experiments are checked with a single status query.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import click
+from contextlib_chdir import chdir
+
+from rdvc.trace import traced
+
+log = logging.getLogger("rdvc")
+
+RUN_CACHE_CHECK_MODES = ["off", "warn", "skip"]
+
+# Options of `dvc exp run` changing neither the stages to run nor their results, and whether they take a value
+_NEUTRAL_OPTIONS = {
+    "--pull": False,
+    "--allow-missing": False,
+    "-q": False,
+    "--quiet": False,
+    "-v": False,
+    "--verbose": False,
+    "-n": True,
+    "--name": True,
+    "-m": True,
+    "--message": True,
+}
+_SET_PARAM_OPTIONS = ("-S", "--set-param")
+
+# Concurrent requests to the DVC remote
+_JOBS = 16
+
+
+class RunCacheCheckError(Exception):
+    """Exception raised when the run-cache cannot be checked for the submitted experiments."""
+
+
+def parse_exp_run_args(args: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """Splits `dvc exp run` arguments into targets and `-S` overrides.
+
+    Raises RunCacheCheckError for options that may change the stages to run or their results."""
+    targets: List[str] = []
+    overrides: List[str] = []
+    arg_iter = iter(args)
+    for arg in arg_iter:
+        option, sep, value = arg.partition("=")
+        if option in _SET_PARAM_OPTIONS:
+            overrides.append(value if sep else next(arg_iter, ""))
+        elif arg.startswith("-S") and len(arg) > 2:
+            overrides.append(arg[2:])
+        elif option in _NEUTRAL_OPTIONS:
+            if _NEUTRAL_OPTIONS[option] and not sep:
+                next(arg_iter, None)
+        elif arg.startswith("-"):
+            raise RunCacheCheckError(f"option {arg} is not supported")
+        else:
+            targets.append(arg)
+    return targets, overrides
+
+
+class RunCacheLookup:
+    """Finds experiments of a DVC repository whose stages all have results in the run-cache of its default remote.
+
+    Use as a context manager, from the root of the repository, so that paths resolve as in `dvc exp run`.
+    """
+
+    def __init__(self, root: Path):
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.exceptions import DvcException
+        from dvc.repo import Repo as DvcRepo
+
+        self.root = root
+        try:
+            self.dvc_repo = DvcRepo(str(root))
+        except DvcException as err:
+            raise RunCacheCheckError(str(err)) from err
+        self._tmp_dir = tempfile.mkdtemp(prefix="rdvc-run-cache-")
+        self._entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._workspace_hashes: Dict[str, Optional[Tuple[Any, Any]]] = {}
+        self._params_files: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+
+    def __enter__(self) -> "RunCacheLookup":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.dvc_repo.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def find_cached(self, experiments: Sequence[Sequence[str]]) -> List[bool]:
+        """Returns whether all stages of each experiment, given by its `dvc exp run` arguments, are cached."""
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.config import RemoteConfigError
+        from dvc.exceptions import DvcException
+
+        parsed = [parse_exp_run_args(args) for args in experiments]
+        try:
+            with chdir(self.root):
+                return self._find_cached(parsed)
+        except RemoteConfigError as err:
+            raise RunCacheCheckError(f"the DVC remote has no run-cache: {err}") from err
+        except DvcException as err:
+            raise RunCacheCheckError(str(err)) from err
+
+    def _find_cached(self, experiments: List[Tuple[List[str], List[str]]]) -> List[bool]:
+        if self.dvc_repo.config.get("hydra", {}).get("enabled", False):
+            raise RunCacheCheckError("parameters composed by Hydra are not supported")
+
+        # Outputs of every experiment, None once one of its stages is found not cached
+        outputs: List[Optional[Dict[str, Tuple[Any, Any]]]] = []
+        levels_per_experiment = []
+        for targets, _ in experiments:
+            levels, data_outputs = self._collect_levels(targets)
+            levels_per_experiment.append(levels)
+            outputs.append(data_outputs)
+
+        depth = max((len(levels) for levels in levels_per_experiment), default=0)
+        for level in range(depth):
+            keys: List[Dict[Any, Optional[str]]] = []
+            for i, (_, overrides) in enumerate(experiments):
+                stage_outputs = outputs[i]
+                levels = levels_per_experiment[i]
+                if stage_outputs is None or level >= len(levels):
+                    keys.append({})
+                    continue
+                keys.append({stage: self._stage_key(stage, overrides, stage_outputs) for stage in levels[level]})
+
+            self._load_entries({key for stage_keys in keys for key in stage_keys.values() if key is not None})
+
+            for i, stage_keys in enumerate(keys):
+                for stage, key in stage_keys.items():
+                    entry = self._entries.get(key) if key is not None else None
+                    stage_outputs = outputs[i]
+                    if entry is None or stage_outputs is None:
+                        log.info(f"Stage {stage.addressing} of experiment {i} is not in the run-cache.")
+                        outputs[i] = None
+                        break
+                    stage_outputs.update(self._entry_outputs(stage, entry))
+
+        return self._outputs_in_remote(outputs)
+
+    def _collect_levels(self, targets: List[str]) -> Tuple[List[List[Any]], Dict[str, Tuple[Any, Any]]]:
+        """Groups the stages run for `targets` by depth, upstream stages first, and returns the outputs
+        of the data tracked by `.dvc` files they depend on."""
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.dvcfile import PROJECT_FILE
+
+        graph = self.dvc_repo.index.graph
+        stages: Set[Any] = set()
+        for target in targets or [PROJECT_FILE]:
+            stages.update(self.dvc_repo.stage.collect(target, with_deps=True))
+
+        data_outputs: Dict[str, Tuple[Any, Any]] = {}
+        depths: Dict[Any, int] = {}
+
+        def depth(stage: Any) -> int:
+            # Edges go from a stage to the stages it depends on
+            if stage not in depths:
+                upstream = [dep for dep in graph.successors(stage) if getattr(dep, "cmd", None)]
+                depths[stage] = 1 + max((depth(dep) for dep in upstream), default=-1)
+            return depths[stage]
+
+        for stage in stages:
+            if not stage.cmd:
+                for out in stage.outs:
+                    data_outputs[out.fs_path] = (out.hash_info, out.meta)
+
+        levels: List[List[Any]] = []
+        for stage in sorted((stage for stage in stages if stage.cmd), key=depth):
+            while len(levels) <= depth(stage):
+                levels.append([])
+            levels[depth(stage)].append(stage)
+        return levels, data_outputs
+
+    def _stage_key(self, stage: Any, overrides: List[str], outputs: Dict[str, Tuple[Any, Any]]) -> Optional[str]:
+        """Computes the run-cache key of `stage`, or returns None if it cannot be cached or hashed."""
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.dependency.param import ParamsDependency
+        from dvc.stage.cache import _get_cache_hash
+        from dvc.stage.serialize import to_single_stage_lockfile
+
+        # The conditions of dvc.stage.cache._can_hash, without hashing the dependencies again
+        if stage.is_callback or stage.always_changed or not (stage.cmd and stage.deps and stage.outs):
+            return None
+        if any(out.protocol != "local" or out.persist or not out.is_in_repo for out in stage.outs):
+            return None
+
+        for dep in stage.deps:
+            if dep.protocol != "local":
+                return None
+            if isinstance(dep, ParamsDependency):
+                dep.fill_values(self._read_params(dep, overrides))
+            elif dep.fs_path in outputs:
+                dep.hash_info, dep.meta = outputs[dep.fs_path]
+            else:
+                workspace_hash = self._workspace_hash(dep)
+                if workspace_hash is None:
+                    return None
+                dep.hash_info, dep.meta = workspace_hash
+
+        key: str = _get_cache_hash(to_single_stage_lockfile(stage), key=True)
+        return key
+
+    def _workspace_hash(self, dep: Any) -> Optional[Tuple[Any, Any]]:
+        if dep.fs_path not in self._workspace_hashes:
+            if not dep.exists:
+                log.info(f"Dependency {dep} is missing from the workspace.")
+                self._workspace_hashes[dep.fs_path] = None
+            else:
+                # pylint: disable-next=protected-access
+                meta, hash_info = dep._get_hash_meta()
+                self._workspace_hashes[dep.fs_path] = (hash_info, meta)
+        return self._workspace_hashes[dep.fs_path]
+
+    def _read_params(self, dep: Any, overrides: List[str]) -> Dict[str, Any]:
+        """Reads the parameters of `dep` as `dvc exp run` would see them after applying `overrides`."""
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.dependency.param import read_param_file
+        from dvc.fs import LocalFileSystem
+        from dvc.utils.cli_parse import to_path_overrides
+        from dvc.utils.hydra import apply_overrides
+
+        file_overrides = tuple(
+            override
+            for path, path_overrides in to_path_overrides(overrides).items()
+            if os.path.abspath(path) == os.path.abspath(dep.fs_path)
+            for override in path_overrides
+        )
+        if not file_overrides:
+            params: Dict[str, Any] = dep.read_params()
+            return params
+
+        cache_key = (dep.fs_path, file_overrides)
+        if cache_key not in self._params_files:
+            # Overrides are applied to a copy, the workspace must stay as committed
+            path = os.path.join(self._tmp_dir, f"{len(self._params_files)}-{os.path.basename(dep.fs_path)}")
+            shutil.copyfile(dep.fs_path, path)
+            apply_overrides(path, list(file_overrides))
+            self._params_files[cache_key] = path
+
+        params = read_param_file(
+            LocalFileSystem(), self._params_files[cache_key], list(dep.params) or None, flatten=True
+        )
+        return params
+
+    def _load_entries(self, keys: Set[str]) -> None:
+        """Loads the run-cache entries of `keys`, from the local run-cache or concurrently from the remote."""
+        keys = {key for key in keys if key not in self._entries}
+        remote_keys = []
+        for key in keys:
+            entry = self._load_local_entry(key)
+            if entry is None:
+                remote_keys.append(key)
+            self._entries[key] = entry
+
+        if remote_keys:
+            odb = self.dvc_repo.cloud.get_remote_odb(None, "fetch --run-cache", hash_name="md5-dos2unix")
+            with ThreadPoolExecutor(max_workers=_JOBS) as executor:
+                entries = list(executor.map(lambda key: self._load_remote_entry(odb, key), remote_keys))
+            for i, key in enumerate(remote_keys):
+                self._entries[key] = entries[i]
+
+    def _load_local_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        stage_cache = self.dvc_repo.stage_cache
+        # pylint: disable-next=protected-access
+        cache_dir = stage_cache._get_cache_dir(key)
+        if not os.path.isdir(cache_dir):
+            return None
+        for value in sorted(os.listdir(cache_dir)):
+            # pylint: disable-next=protected-access
+            entry: Optional[Dict[str, Any]] = stage_cache._load_cache(key, value)
+            if entry:
+                return entry
+        return None
+
+    @staticmethod
+    def _load_remote_entry(odb: Any, key: str) -> Optional[Dict[str, Any]]:
+        # pylint: disable-next=import-outside-toplevel
+        from dvc.schema import COMPILED_LOCK_FILE_STAGE_SCHEMA
+        from dvc.utils.serialize import parse_yaml
+        from voluptuous import Invalid
+
+        cache_dir = odb.fs.join(odb.path, "runs", key[:2], key)
+        try:
+            paths = sorted(odb.fs.find(cache_dir))
+        except FileNotFoundError:
+            return None
+        for path in paths:
+            try:
+                entry: Dict[str, Any] = COMPILED_LOCK_FILE_STAGE_SCHEMA(
+                    parse_yaml(odb.fs.cat_file(path).decode(), path)
+                )
+                return entry
+            except (FileNotFoundError, Invalid, ValueError):
+                continue
+        return None
+
+    def _entry_outputs(self, stage: Any, entry: Dict[str, Any]) -> Iterator[Tuple[str, Tuple[Any, Any]]]:
+        # pylint: disable-next=protected-access
+        cached_stage = self.dvc_repo.stage_cache._create_stage(entry, wdir=stage.wdir)
+        for out in cached_stage.outs:
+            yield out.fs_path, (out.hash_info, out.meta)
+
+    def _outputs_in_remote(self, outputs: List[Optional[Dict[str, Tuple[Any, Any]]]]) -> List[bool]:
+        """Checks with a single status query that the outputs of the cached experiments can be pulled."""
+        hash_infos = {
+            hash_info
+            for stage_outputs in outputs
+            if stage_outputs
+            for hash_info, _ in stage_outputs.values()
+            if hash_info
+        }
+        if not hash_infos:
+            return [stage_outputs is not None for stage_outputs in outputs]
+
+        status = self.dvc_repo.cloud.status(hash_infos, jobs=_JOBS)
+        missing = status.new | status.missing
+        return [
+            stage_outputs is not None and not any(hash_info in missing for hash_info, _ in stage_outputs.values())
+            for stage_outputs in outputs
+        ]
+
+
+@traced("run_cache_check")
+def check_run_cache(
+    root: Path, args: Sequence[str], sweep: List[Tuple[str, ...]], mode: str
+) -> Optional[List[Tuple[str, ...]]]:
+    """Looks the experiments to submit up in the run-cache and returns the sweep left to submit, or None if
+    there is nothing left to submit. In `warn` mode, cached experiments are only reported."""
+    experiments = [(*args, *options) for options in sweep] or [tuple(args)]
+    try:
+        with RunCacheLookup(root) as lookup:
+            cached = lookup.find_cached(experiments)
+    except RunCacheCheckError as err:
+        log.warning(f"Skipping the run-cache check: {err}")
+        return sweep
+
+    n_cached = sum(cached)
+    if n_cached == 0:
+        return sweep
+
+    if mode == "warn":
+        click.echo(
+            f"{n_cached} of {len(experiments)} experiments already have results in the run-cache of the DVC remote.",
+            err=True,
+        )
+        return sweep
+
+    if n_cached == len(experiments):
+        click.echo("All experiments already have results in the run-cache of the DVC remote, not submitting.")
+        return None
+
+    click.echo(
+        f"Skipping {n_cached} of {len(experiments)} experiments with results in the run-cache of the DVC remote."
+    )
+    return [options for i, options in enumerate(sweep) if not cached[i]]
@@ -0,0 +1,195 @@
+"""Instance types discovered from the partitions and nodes of a cluster.
+
+A single `sinfo` call lists the partitions, node features, resources and states of a cluster. The
+resulting catalogue is cached locally for a limited time, so that resolving an instance type does
+not need a connection to the cluster.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from rdvc.slurm.instance import InstanceType, InstanceTypes
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+AUTO_INSTANCE = "auto"
+DEFAULT_CATALOGUE_TTL = 300
+
+SINFO_FIELDS = ["%P", "%f", "%c", "%G", "%m", "%D", "%T"]
+
+_NULL = "(null)"
+
+
+class InstanceCatalogueError(Exception):
+    """Exception raised when no instance type of the cluster matches the requested one."""
+
+
+@dataclass
+class CatalogueEntry:
+    """Instance type available on a cluster, with the nodes that can run it.
+
+    Attributes:
+        instance (InstanceType): instance type requesting a whole node of the partition
+        mem_per_node (int): memory of a node, in MB
+        idle_nodes (int): nodes idle when the catalogue was built
+        total_nodes (int): nodes of the partition with these features and resources
+    """
+
+    instance: InstanceType
+    mem_per_node: int
+    idle_nodes: int = 0
+    total_nodes: int = 0
+
+    def satisfies(self, min_cpus: int, min_gpus: int, min_mem: int) -> bool:
+        return self.instance.cpus >= min_cpus and self.instance.gpus >= min_gpus and self.mem_per_node >= min_mem
+
+    def size_key(self) -> List[int]:
+        return [self.instance.gpus, self.instance.cpus, self.mem_per_node]
+
+
+def get_catalogue_cache_path(host: str) -> Path:
+    cache_dir = Path(os.environ.get("RDVC_CACHE_DIR", Path("~/.cache/rdvc").expanduser()))
+    return cache_dir / "instances" / f"{host}.json"
+
+
+def _leading_int(value: str) -> int:
+    # sinfo reports e.g. "8+" for nodes of different sizes grouped together
+    match = re.match(r"\d+", value)
+    return int(match.group()) if match else 0
+
+
+def _parse_gpus(gres: str) -> int:
+    gpus = 0
+    for resource in gres.split(","):
+        # e.g. gpu:4, gpu:a10g:4 or gpu:a10g:4(S:0-1)
+        if resource.startswith("gpu:"):
+            gpus += _leading_int(resource.split("(", 1)[0].rsplit(":", 1)[-1])
+    return gpus
+
+
+def parse_sinfo_output(output: str) -> List[CatalogueEntry]:
+    """Parses `sinfo --noheader --format=...` run with `SINFO_FIELDS` separated by `|`."""
+    entries: Dict[Any, CatalogueEntry] = {}
+    for line in output.splitlines():
+        fields = line.strip().split("|")
+        if len(fields) != len(SINFO_FIELDS):
+            continue
+
+        partition, features, cpus, gres, mem, nodes, state = fields
+        partition = partition.rstrip("*")
+        feature_list = [] if features == _NULL else features.split(",")
+        constraint = feature_list[0] if feature_list else ""
+        gpus = _parse_gpus(gres) if gres != _NULL else 0
+
+        key = (partition, constraint, _leading_int(cpus), gpus, _leading_int(mem))
+        if key not in entries:
+            instance = InstanceType(
+                name=constraint or partition, partition=partition, gpus=gpus, cpus=key[2], constraint=constraint
+            )
+            entries[key] = CatalogueEntry(instance=instance, mem_per_node=key[4])
+
+        entries[key].total_nodes += int(nodes)
+        # Flags such as "~" (powered down) or "*" (not responding) follow the state
+        if state.rstrip("~#!%$@^-*") == "idle":
+            entries[key].idle_nodes += int(nodes)
+
+    return list(entries.values())
+
+
+def load_catalogue(host: str, ttl: float) -> Optional[List[CatalogueEntry]]:
+    """Returns the cached catalogue of `host`, or None if it is missing or older than `ttl` seconds."""
+    path = get_catalogue_cache_path(host)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if time.time() - cached["created"] > ttl:
+            return None
+        return [
+            CatalogueEntry(**{**entry, "instance": InstanceType(**entry["instance"])}) for entry in cached["entries"]
+        ]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_catalogue(host: str, entries: List[CatalogueEntry]) -> None:
+    path = get_catalogue_cache_path(host)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write then rename so that concurrent rDVC commands never read a partial catalogue
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"created": time.time(), "entries": [asdict(entry) for entry in entries]}, f)
+    tmp_path.replace(path)
+
+
+def select_auto_instance(
+    entries: List[CatalogueEntry], min_cpus: int = 0, min_gpus: int = 0, min_mem: int = 0
+) -> InstanceType:
+    """Picks the smallest instance type satisfying the resources, preferring the ones with idle nodes."""
+    candidates = [entry for entry in entries if entry.satisfies(min_cpus, min_gpus, min_mem)]
+    if not candidates:
+        raise InstanceCatalogueError(
+            f"No instance type has {min_cpus} CPUs, {min_gpus} GPUs and {min_mem} MB of memory per node."
+        )
+
+    selected = min(candidates, key=lambda entry: [entry.idle_nodes == 0, *entry.size_key()])
+    log.info(f"Selected instance type {selected.instance.name} ({selected.idle_nodes} idle nodes).")
+    return selected.instance
+
+
+def find_instance(entries: List[CatalogueEntry], name: str) -> InstanceType:
+    """Looks `name` up among the built-in instance types, then among the discovered ones."""
+    builtin_instances = InstanceTypes.to_dict()
+    if name in builtin_instances:
+        return builtin_instances[name]
+
+    for entry in sorted(entries, key=CatalogueEntry.size_key):
+        if entry.instance.name == name:
+            return entry.instance
+
+    names = sorted({*builtin_instances, *(entry.instance.name for entry in entries)})
+    raise InstanceCatalogueError(f"Unknown instance type {name}, choose one of {', '.join(names)}.")
+
+
+def discover_catalogue(client: SSHClient) -> List[CatalogueEntry]:
+    return parse_sinfo_output(client.sinfo("--noheader", f"--format={'|'.join(SINFO_FIELDS)}"))
+
+
+def get_catalogue(host: str, username: Optional[str], ttl: float, refresh: bool = False) -> List[CatalogueEntry]:
+    """Returns the catalogue of `host`, only connecting to it when the cached one has expired."""
+    entries = None if refresh else load_catalogue(host, ttl)
+    if entries is None:
+        log.info(f"Discovering the instance types of {host}.")
+        with SSHClient(host=host, username=username) as client:
+            entries = discover_catalogue(client)
+        save_catalogue(host, entries)
+    return entries
+
+
+# pylint: disable-next=too-many-arguments
+def resolve_instance(
+    name: str,
+    host: str,
+    username: Optional[str],
+    ttl: float = DEFAULT_CATALOGUE_TTL,
+    min_cpus: int = 0,
+    min_gpus: int = 0,
+    min_mem: int = 0,
+) -> InstanceType:
+    """Resolves instance type `name`, or the smallest idle one with the given resources for `auto`.
+
+    Built-in instance types are resolved without looking at the cluster."""
+    if name != AUTO_INSTANCE and name in InstanceTypes.to_dict():
+        return InstanceTypes.from_name(name)
+
+    entries = get_catalogue(host, username, ttl)
+    if name == AUTO_INSTANCE:
+        return select_auto_instance(entries, min_cpus=min_cpus, min_gpus=min_gpus, min_mem=min_mem)
+    return find_instance(entries, name)
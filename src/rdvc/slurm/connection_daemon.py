@@ -0,0 +1,398 @@
+"""Local daemon keeping authenticated SSH transports alive across rDVC invocations.
+
+Clients talk to the daemon over a Unix socket. Every connection starts with a JSON header line
+naming the cluster and the kind of channel to open on the shared transport; the daemon answers
+with a JSON status line and then relays the channel, closing the socket if relaying fails:
+
+- `sftp`: raw SFTP bytes in both directions, so `paramiko.SFTPClient` runs directly on the socket.
+- `exec`: frames of a 1-byte type, a 4-byte big-endian length and the payload; see `FRAME_*`.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import paramiko
+
+log = logging.getLogger("rdvc")
+
+DEFAULT_IDLE_TIMEOUT = 600
+
+FRAME_STDIN = 0
+FRAME_STDOUT = 1
+FRAME_STDERR = 2
+FRAME_EXIT = 3
+
+_FRAME_HEADER = struct.Struct(">BI")
+_EXIT_STATUS = struct.Struct(">i")
+_RELAY_CHUNK_SIZE = 32768
+
+
+class ConnectionDaemonError(Exception):
+    """Exception raised when the connection daemon cannot serve a request."""
+
+
+def split_host_port(host: str, default_port: int = 22) -> Tuple[str, int]:
+    """Splits `HOST:PORT` into its hostname and port. IPv6 addresses need brackets, e.g. `[::1]:2222`."""
+    if host.startswith("["):
+        hostname, _, port = host[1:].partition("]")
+        return hostname, int(port[1:]) if port.startswith(":") else default_port
+    if host.count(":") == 1:
+        hostname, port = host.split(":")
+        return hostname, int(port)
+    return host, default_port
+
+
+def get_daemon_socket_path() -> Path:
+    return Path(os.environ.get("RDVC_DAEMON_SOCKET", Path("~/.cache/rdvc/daemon.sock").expanduser()))
+
+
+def send_frame(sock: socket.socket, frame_type: int, payload: bytes = b"") -> None:
+    sock.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionDaemonError("Connection daemon closed the connection unexpectedly.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    frame_type, size = _FRAME_HEADER.unpack(_recv_exactly(sock, _FRAME_HEADER.size))
+    return frame_type, _recv_exactly(sock, size)
+
+
+def _recv_line(sock: socket.socket) -> bytes:
+    # Read byte by byte so that no channel data following the line is consumed
+    line = bytearray()
+    while not line.endswith(b"\n"):
+        char = sock.recv(1)
+        if not char:
+            break
+        line += char
+    return bytes(line)
+
+
+def request(
+    socket_path: Path, header: Dict[str, Any], timeout: Optional[float] = None
+) -> Tuple[socket.socket, Dict[str, Any]]:
+    """Connects to the daemon and sends `header`. Returns the daemon's response and the socket,
+    ready to relay the channel."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(header).encode() + b"\n")
+        response = json.loads(_recv_line(sock) or b"{}")
+    except (OSError, ValueError):
+        sock.close()
+        raise
+
+    if not response.get("ok", False):
+        sock.close()
+        raise ConnectionDaemonError(response.get("error", "Connection daemon refused the request."))
+
+    sock.settimeout(None)
+    return sock, response
+
+
+def is_daemon_running(socket_path: Optional[Path] = None) -> bool:
+    socket_path = socket_path or get_daemon_socket_path()
+    if not socket_path.is_socket():
+        return False
+
+    try:
+        sock, _ = request(socket_path, {"kind": "ping"}, timeout=1)
+        sock.close()
+    except (OSError, ValueError, ConnectionDaemonError):
+        return False
+    return True
+
+
+# pylint: disable-next=too-many-arguments
+def daemon_exec(
+    socket_path: Path,
+    host: str,
+    username: Optional[str],
+    command: str,
+    stdin: Optional[bytes] = None,
+    connect_timeout: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[int, bytes, bytes]:
+    """Runs `command` on a channel of the daemon's transport to `host`, connecting within `connect_timeout`
+    seconds if the daemon is not connected to it yet. Raises `socket.timeout` if the daemon relays nothing
+    for `timeout` seconds."""
+    sock, _ = request(
+        socket_path,
+        {"kind": "exec", "host": host, "username": username, "command": command, "connect_timeout": connect_timeout},
+    )
+    with sock:
+        sock.settimeout(timeout)
+        if stdin:
+            send_frame(sock, FRAME_STDIN, stdin)
+        send_frame(sock, FRAME_STDIN)
+
+        stdout, stderr = bytearray(), bytearray()
+        while True:
+            frame_type, payload = recv_frame(sock)
+            if frame_type == FRAME_STDOUT:
+                stdout += payload
+            elif frame_type == FRAME_STDERR:
+                stderr += payload
+            elif frame_type == FRAME_EXIT:
+                (exit_code,) = _EXIT_STATUS.unpack(payload)
+                return exit_code, bytes(stdout), bytes(stderr)
+
+
+class _SFTPSocket(socket.socket):
+    """Daemon socket relaying an SFTP channel, with the `paramiko.Channel` methods used by `paramiko.SFTPClient`."""
+
+    def get_name(self) -> str:
+        return "rdvc-daemon"
+
+    def recv_ready(self) -> bool:
+        return bool(select.select([self], [], [], 0)[0])
+
+
+def daemon_open_sftp(
+    socket_path: Path, host: str, username: Optional[str], connect_timeout: Optional[float] = None
+) -> paramiko.SFTPClient:
+    sock, _ = request(
+        socket_path, {"kind": "sftp", "host": host, "username": username, "connect_timeout": connect_timeout}
+    )
+    return paramiko.SFTPClient(_SFTPSocket(fileno=sock.detach()))  # type: ignore[arg-type]
+
+
+@dataclass
+class _Connection:
+    client: paramiko.SSHClient
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Channels currently relayed, e.g. a long SFTP upload or `rdvc logs --follow`
+    channels: int = 0
+
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+class ConnectionDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self.active_requests = 0
+        self._connections: Dict[Tuple[str, Optional[str]], _Connection] = {}
+        self._lock = threading.Lock()
+
+        # Only the current user may talk to the daemon: it holds authenticated sessions
+        socket_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        socket_path.parent.chmod(0o700)
+        if socket_path.is_socket():
+            socket_path.unlink()
+        super().__init__(str(socket_path), _RequestHandler)
+        socket_path.chmod(0o600)
+
+    @contextlib.contextmanager
+    def use_transport(
+        self, host: str, username: Optional[str], connect_timeout: Optional[float] = None
+    ) -> Iterator[paramiko.Transport]:
+        """Yields the transport to `host`, connecting if needed, and keeps it open while in use."""
+        with self._lock:
+            connection = self._connections.setdefault((host, username), _Connection(paramiko.SSHClient()))
+            connection.channels += 1
+
+        try:
+            with connection.lock:
+                if not connection.is_active():
+                    log.info(f"Establishing SSH connection to {host}...")
+                    connection.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                    hostname, port = split_host_port(host)
+                    connection.client.connect(hostname, port=port, username=username, timeout=connect_timeout)
+                    connection.client.get_transport().set_keepalive(30)  # type: ignore[union-attr]
+            yield connection.client.get_transport()  # type: ignore[misc]
+        finally:
+            with self._lock:
+                connection.channels -= 1
+                connection.last_used = time.monotonic()
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "host": host,
+                    "username": username,
+                    "active": c.is_active(),
+                    "channels": c.channels,
+                    "idle": 0 if c.channels else round(now - c.last_used),
+                }
+                for (host, username), c in self._connections.items()
+            ]
+
+    def close_idle_connections(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, connection in list(self._connections.items()):
+                if connection.channels == 0 and now - connection.last_used > self.idle_timeout:
+                    log.info(f"Closing idle SSH connection to {key[0]}.")
+                    connection.client.close()
+                    del self._connections[key]
+
+    def _reap(self) -> None:
+        while True:
+            time.sleep(min(self.idle_timeout, 10))
+            self.close_idle_connections()
+            with self._lock:
+                idle = not self._connections and self.active_requests == 0
+            if idle and time.monotonic() - self.last_activity > self.idle_timeout:
+                log.info("Connection daemon idle, shutting down.")
+                self.shutdown()
+                return
+
+    def serve(self) -> None:
+        threading.Thread(target=self._reap, daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            with self._lock:
+                for connection in self._connections.values():
+                    connection.client.close()
+            if self.socket_path.is_socket():
+                self.socket_path.unlink()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    server: ConnectionDaemon
+    request: socket.socket
+
+    def setup(self) -> None:
+        self._relaying = False
+
+    def _respond(self, **response: Any) -> None:
+        self.request.sendall(json.dumps(response).encode() + b"\n")
+        self._relaying = bool(response.get("ok"))
+
+    def handle(self) -> None:
+        with self.server._lock:
+            self.server.active_requests += 1
+            self.server.last_activity = time.monotonic()
+        try:
+            self._handle(json.loads(_recv_line(self.request) or b"{}"))
+        # Errors are reported to the client and must never bring the daemon down
+        except Exception as err:
+            log.warning(f"Connection daemon request failed: {err}")
+            # An error line would corrupt the relayed stream: the client sees the socket close instead
+            if not self._relaying:
+                with contextlib.suppress(OSError):
+                    self._respond(ok=False, error=str(err))
+        finally:
+            with self.server._lock:
+                self.server.active_requests -= 1
+                self.server.last_activity = time.monotonic()
+
+    def _handle(self, header: Dict[str, Any]) -> None:
+        kind = header.get("kind")
+        if kind == "ping":
+            self._respond(ok=True)
+        elif kind == "status":
+            self._respond(ok=True, connections=self.server.status())
+        elif kind == "shutdown":
+            self._respond(ok=True)
+            threading.Thread(target=self.server.shutdown).start()
+        elif kind == "exec":
+            with self.server.use_transport(
+                header["host"], header.get("username"), header.get("connect_timeout")
+            ) as transport:
+                channel = transport.open_session()
+                channel.exec_command(header["command"])
+                self._respond(ok=True)
+                self._relay_exec(channel)
+        elif kind == "sftp":
+            with self.server.use_transport(
+                header["host"], header.get("username"), header.get("connect_timeout")
+            ) as transport:
+                channel = transport.open_session()
+                channel.invoke_subsystem("sftp")
+                self._respond(ok=True)
+                self._relay_raw(channel)
+        else:
+            raise ConnectionDaemonError(f"Unknown request kind '{kind}'.")
+
+    def _relay_exec(self, channel: paramiko.Channel) -> None:
+        send_lock = threading.Lock()
+        client_gone = threading.Event()
+
+        def forward(recv: Callable[[int], bytes], frame_type: int) -> None:
+            try:
+                for chunk in iter(lambda: recv(_RELAY_CHUNK_SIZE), b""):
+                    with send_lock:
+                        send_frame(self.request, frame_type, chunk)
+            # The client went away, e.g. on Ctrl-C: closing the channel ends the other stream too
+            except OSError:
+                client_gone.set()
+                channel.close()
+
+        def forward_stdin() -> None:
+            try:
+                while True:
+                    _, payload = recv_frame(self.request)
+                    if not payload:
+                        break
+                    channel.sendall(payload)
+            except (ConnectionDaemonError, OSError):
+                pass
+            channel.shutdown_write()
+
+        try:
+            threads = [
+                threading.Thread(target=forward_stdin, daemon=True),
+                threading.Thread(target=forward, args=(channel.recv, FRAME_STDOUT)),
+                threading.Thread(target=forward, args=(channel.recv_stderr, FRAME_STDERR)),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads[1:]:
+                thread.join()
+
+            if not client_gone.is_set():
+                with send_lock:
+                    send_frame(self.request, FRAME_EXIT, _EXIT_STATUS.pack(channel.recv_exit_status()))
+        finally:
+            channel.close()
+
+    def _relay_raw(self, channel: paramiko.Channel) -> None:
+        def forward_to_channel() -> None:
+            with contextlib.suppress(OSError):
+                for chunk in iter(lambda: self.request.recv(_RELAY_CHUNK_SIZE), b""):
+                    channel.sendall(chunk)
+            channel.close()
+
+        try:
+            thread = threading.Thread(target=forward_to_channel, daemon=True)
+            thread.start()
+            for chunk in iter(lambda: channel.recv(_RELAY_CHUNK_SIZE), b""):
+                self.request.sendall(chunk)
+            with contextlib.suppress(OSError):
+                self.request.shutdown(socket.SHUT_WR)
+            thread.join()
+        finally:
+            channel.close()
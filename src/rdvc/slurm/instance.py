@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 
 @dataclass
@@ -13,16 +13,29 @@ class InstanceType:
     mem: int = 0
     exclusive: bool = True
     nodes: int = 1
+    # Node feature requested with --constraint, defaults to the name and is left out when empty
+    constraint: Optional[str] = None
 
     def to_key_value_options(self) -> Dict[str, Any]:
-        return {
+        options = {
             "partition": self.partition,
             "gpus": self.gpus,
             "cpus-per-task": self.cpus,
-            "constraint": self.name,
+            "constraint": self.name if self.constraint is None else self.constraint,
             "mem": self.mem,
             "nodes": self.nodes,
         }
+        return {option: value for option, value in options.items() if value != ""}
+
+    def split(self, steps: int) -> Tuple[int, int]:
+        """Returns the CPUs and GPUs of each of `steps` job steps sharing an allocation of this instance type."""
+        cpus, gpus = self.cpus // steps, self.gpus // steps
+        if cpus == 0 or (self.gpus and gpus == 0):
+            raise ValueError(
+                f"Instance type {self.name} has {self.cpus} CPUs and {self.gpus} GPUs, "
+                f"too few to run {steps} experiments side by side."
+            )
+        return cpus, gpus
 
     def to_flag_options(self) -> List[str]:
         if self.exclusive:
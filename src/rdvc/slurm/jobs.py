@@ -0,0 +1,104 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+SUBMISSIONS_DIR = ".rdvc/submissions"
+LOGS_DIR = ".rdvc/logs"
+
+# Jobs in these states will not write to their logs anymore
+FINISHED_STATES = {
+    "BOOT_FAIL",
+    "CANCELLED",
+    "COMPLETED",
+    "DEADLINE",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "TIMEOUT",
+}
+
+_SUBMISSION_FILE_PATTERN = re.compile(r"^(\d+)\.sbatch\.sh$")
+_SACCT_FIELDS = ["JobID", "JobName", "State", "Elapsed", "ExitCode", "NodeList"]
+
+
+@dataclass
+class SlurmJob:
+    """SLURM job as reported by `sacct`. Array tasks are reported as `ARRAY_JOB_ID_TASK_ID`."""
+
+    job_id: str
+    name: str
+    state: str
+    elapsed: str
+    exit_code: str
+    nodes: str
+
+    @property
+    def array_job_id(self) -> str:
+        return self.job_id.split("_", 1)[0]
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def has_log(self) -> bool:
+        # Pending array tasks are reported together, e.g. as 1234_[2-9%2], and have not written logs yet
+        return self.state != "PENDING" and "[" not in self.job_id
+
+    @property
+    def log_path(self) -> str:
+        return f"{LOGS_DIR}/slurm-{self.job_id}.out"
+
+
+def get_job_name_prefix(command: str, repo_name: str) -> str:
+    """Prefix of the default job names of `rdvc COMMAND`, see `RDvcContext.merged_config`."""
+    return f"rdvc-{command}:{repo_name}:"
+
+
+def get_submitted_job_ids(client: SSHClient) -> List[str]:
+    """Returns the ids of the jobs archived in the remote submissions directory, most recent first."""
+    job_ids = [m.group(1) for m in map(_SUBMISSION_FILE_PATTERN.match, client.listdir(SUBMISSIONS_DIR)) if m]
+    return sorted(job_ids, key=int, reverse=True)
+
+
+def query_jobs(client: SSHClient, job_ids: Iterable[str], name_prefix: Optional[str] = None) -> List[SlurmJob]:
+    """Queries the state of all `job_ids` with a single `sacct` call, keeping the jobs named `name_prefix*`."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+
+    stdout = client.sacct(
+        "--allocations",
+        "--noheader",
+        "--parsable2",
+        f"--format={','.join(_SACCT_FIELDS)}",
+        f"--jobs={','.join(job_ids)}",
+    )
+
+    jobs = []
+    for line in stdout.splitlines():
+        fields = line.split("|")
+        if len(fields) != len(_SACCT_FIELDS):
+            log.info(f"Skipping malformed sacct line: {line}")
+            continue
+
+        job_id, name, state, elapsed, exit_code, nodes = fields
+        if name_prefix is not None and not name.startswith(name_prefix):
+            continue
+        # e.g. "CANCELLED by 1234"
+        state = state.split(" ", 1)[0]
+        jobs.append(SlurmJob(job_id, name, state, elapsed, exit_code, nodes))
+
+    return sorted(jobs, key=lambda job: [int(part) for part in re.findall(r"\d+", job.job_id)], reverse=True)
+
+
+def find_jobs(client: SSHClient, name_prefix: Optional[str] = None, last: Optional[int] = None) -> List[SlurmJob]:
+    """Queries the jobs among the `last` submissions archived on the cluster that are named `name_prefix*`."""
+    job_ids = get_submitted_job_ids(client)
+    return query_jobs(client, job_ids[:last], name_prefix=name_prefix)
@@ -0,0 +1,76 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import paramiko
+
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+_READ_CHUNK_SIZE = 1 << 20
+
+
+class LogTail:
+    """Remote log file read incrementally: every read only fetches the bytes appended since the previous one.
+
+    Attributes:
+        path (str): remote path of the log
+        prefix (bytes): prepended to every line, empty when following a single log
+        offset (int): number of bytes of the log already read
+    """
+
+    def __init__(self, path: str, prefix: bytes = b"", offset: int = 0):
+        self.path = path
+        self.prefix = prefix
+        self.offset = offset
+        self._file: Optional[paramiko.SFTPFile] = None
+        self._partial_line = b""
+
+    def read(self, client: SSHClient, size: int) -> bytes:
+        """Reads the log up to `size` bytes and returns the new complete lines."""
+        if size < self.offset:
+            log.info(f"{self.path} was truncated, reading it from the start.")
+            self.offset, self._partial_line = 0, b""
+        if size == self.offset:
+            return b""
+
+        if self._file is None:
+            self._file = client.open_file(self.path)
+        self._file.seek(self.offset)
+        # Request all chunks up front rather than waiting for each one in turn
+        self._file.prefetch(size)
+
+        chunks = []
+        while self.offset < size:
+            chunk = self._file.read(min(size - self.offset, _READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.offset += len(chunk)
+
+        return self._split_lines(b"".join(chunks))
+
+    def flush(self) -> bytes:
+        """Returns the last line of the log even if it does not end with a newline."""
+        data, self._partial_line = self._partial_line, b""
+        return self.prefix + data + b"\n" if data else b""
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _split_lines(self, data: bytes) -> bytes:
+        if not self.prefix:
+            return data
+
+        lines = (self._partial_line + data).split(b"\n")
+        self._partial_line = lines.pop()
+        return b"".join(self.prefix + line + b"\n" for line in lines)
+
+
+def read_new_lines(client: SSHClient, tails: Iterable[LogTail]) -> List[bytes]:
+    """Reads the new lines of all `tails`, fetching the sizes of their logs in a single remote command."""
+    tails = list(tails)
+    sizes: Dict[str, int] = client.file_sizes([tail.path for tail in tails])
+    return [tail.read(client, sizes[tail.path]) for tail in tails if tail.path in sizes]
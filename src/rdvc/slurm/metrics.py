@@ -0,0 +1,119 @@
+"""Resources used by finished jobs, as accounted by `sacct`, see `rdvc run --right-size`.
+
+The allocation of a job reports its state, run time and CPU time, while the memory and GPU utilisation
+are reported by each of its steps, e.g. `1234.batch` or `1234_5.0` for a task of a job array.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from rdvc.slurm.jobs import FINISHED_STATES
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+_SACCT_FIELDS = ["JobID", "State", "ElapsedRaw", "TotalCPU", "MaxRSS", "AllocTRES", "TRESUsageInAve"]
+
+
+@dataclass
+class JobMetrics:
+    """Resources used by a job, or by a task of a job array.
+
+    Attributes:
+        job_id (str): SLURM job id, `ARRAY_JOB_ID_TASK_ID` for array tasks
+        state (str): SLURM state of the job
+        elapsed (int): seconds the job ran
+        cpu_time (float): CPU seconds used by all steps of the job
+        alloc_cpus (int): CPUs allocated to the job
+        max_rss (int): MB of memory used by the largest step of the job
+        gpu_util (Optional[float]): average GPU utilisation of the busiest step in percent, None when the
+            cluster does not account for it
+    """
+
+    job_id: str
+    state: str
+    elapsed: int = 0
+    cpu_time: float = 0.0
+    alloc_cpus: int = 0
+    max_rss: int = 0
+    gpu_util: Optional[float] = None
+
+    @property
+    def array_job_id(self) -> str:
+        return self.job_id.split("_", 1)[0]
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def cpus(self) -> float:
+        """CPUs kept busy on average."""
+        return self.cpu_time / self.elapsed if self.elapsed else 0.0
+
+
+def parse_cpu_time(value: str) -> float:
+    """Parses a `sacct` CPU time, e.g. `1-02:03:04`, `02:03:04` or `03:04.567`, into seconds."""
+    days, _, clock = value.rpartition("-")
+    seconds = 0.0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + float(part or 0)
+    return seconds + int(days or 0) * 86400
+
+
+def _parse_tres(tres: str) -> Dict[str, str]:
+    # e.g. billing=2,cpu=2,gres/gpu=1,mem=8000M,node=1
+    return dict(item.split("=", 1) for item in tres.split(",") if "=" in item)
+
+
+def _parse_megabytes(value: str) -> int:
+    # sacct --units=M reports e.g. 1234.56M
+    match = re.match(r"[\d.]+", value)
+    return round(float(match.group())) if match else 0
+
+
+def query_job_metrics(client: SSHClient, job_ids: Iterable[str]) -> List[JobMetrics]:
+    """Queries the resources used by `job_ids`, and by all tasks of job arrays, with a single `sacct` call."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+
+    stdout = client.sacct(
+        "--noheader",
+        "--parsable2",
+        "--units=M",
+        f"--format={','.join(_SACCT_FIELDS)}",
+        f"--jobs={','.join(job_ids)}",
+    )
+
+    jobs: Dict[str, JobMetrics] = {}
+    for line in stdout.splitlines():
+        fields = line.split("|")
+        if len(fields) != len(_SACCT_FIELDS):
+            log.info(f"Skipping malformed sacct line: {line}")
+            continue
+
+        job_id, state, elapsed, cpu_time, max_rss, alloc_tres, tres_usage = fields
+        allocation_id, _, step = job_id.partition(".")
+        if not step:
+            jobs[job_id] = JobMetrics(
+                job_id,
+                # e.g. "CANCELLED by 1234"
+                state.split(" ", 1)[0],
+                elapsed=int(elapsed or 0),
+                cpu_time=parse_cpu_time(cpu_time) if cpu_time else 0.0,
+                alloc_cpus=int(_parse_tres(alloc_tres).get("cpu", 0)),
+            )
+            continue
+
+        job = jobs.get(allocation_id)
+        if job is None:
+            continue
+        job.max_rss = max(job.max_rss, _parse_megabytes(max_rss))
+        gpu_util = _parse_tres(tres_usage).get("gres/gpuutil")
+        if gpu_util is not None:
+            job.gpu_util = max(job.gpu_util or 0.0, float(gpu_util))
+
+    return list(jobs.values())
@@ -0,0 +1,124 @@
+import logging
+import shlex
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import click
+
+from rdvc.slurm.instance import InstanceType
+from rdvc.slurm.ssh_client import SLURM_BIN_DIR, SSHClient
+
+log = logging.getLogger("rdvc")
+
+# Seconds after which an unreachable cluster is left out of the placement
+PROBE_CONNECT_TIMEOUT = 10
+# Seconds after which a cluster whose SLURM commands hang is left out of the placement
+PROBE_TIMEOUT = 10
+
+# Counts the idle nodes of the partition with their features, then the jobs pending in it, in a single exec
+_PROBE_SCRIPT = """\
+set -e
+{slurm_bin_dir}/sinfo --noheader --partition={partition} --states=idle --format='%D %f'
+echo ---
+{slurm_bin_dir}/squeue --noheader --partition={partition} --states=PENDING --format=%i | wc -l
+"""
+
+
+class PlacementError(Exception):
+    """Exception raised when none of the configured clusters can take a job."""
+
+
+@dataclass
+class ClusterLoad:
+    """Load of the partition of an instance type on a cluster.
+
+    Attributes:
+        host (str): cluster address
+        idle_nodes (int): idle nodes of the partition matching the instance type
+        pending_jobs (int): jobs waiting in the partition
+    """
+
+    host: str
+    idle_nodes: int
+    pending_jobs: int
+
+    def expected_wait_key(self, nodes: int) -> Tuple[bool, int, int]:
+        """Sort key ranking first the clusters able to start the job right away, then the shortest queues."""
+        return (self.idle_nodes < nodes, self.pending_jobs, -self.idle_nodes)
+
+
+def parse_probe_output(host: str, output: str, constraint: str) -> ClusterLoad:
+    sinfo_output, _, squeue_output = output.partition("---")
+
+    idle_nodes = 0
+    for line in sinfo_output.splitlines():
+        if not line.strip():
+            continue
+        count, _, features = line.strip().partition(" ")
+        if constraint in features.split(","):
+            idle_nodes += int(count)
+
+    return ClusterLoad(host=host, idle_nodes=idle_nodes, pending_jobs=int(squeue_output.strip() or 0))
+
+
+def probe_cluster(client: SSHClient, instance: InstanceType) -> ClusterLoad:
+    script = _PROBE_SCRIPT.format(slurm_bin_dir=SLURM_BIN_DIR, partition=shlex.quote(instance.partition))
+    try:
+        exit_code, stdout, stderr = client.run_script(script, timeout=PROBE_TIMEOUT)
+    except socket.timeout as err:
+        raise PlacementError(f"Probing {client.host} timed out after {PROBE_TIMEOUT} seconds.") from err
+    if exit_code != 0:
+        raise PlacementError(f"Probing {client.host} failed: {stderr}")
+    return parse_probe_output(client.host, stdout, instance.name)
+
+
+def _connect_and_probe(host: str, username: Optional[str], instance: InstanceType) -> Tuple[SSHClient, ClusterLoad]:
+    client = SSHClient(host=host, username=username, connect_timeout=PROBE_CONNECT_TIMEOUT)
+    client.__enter__()
+    try:
+        return client, probe_cluster(client, instance)
+    except Exception:
+        client.__exit__(None, None, None)
+        raise
+
+
+@contextmanager
+def connect_least_loaded(hosts: Sequence[str], username: Optional[str], instance: InstanceType) -> Iterator[SSHClient]:
+    """Connects to the cluster where a job of `instance` is expected to start first.
+
+    All clusters are probed concurrently, so placement costs a single round trip on top of the
+    connections. The connection to the selected cluster is kept and the others are closed."""
+    if len(hosts) == 1:
+        with SSHClient(host=hosts[0], username=username) as client:
+            yield client
+        return
+
+    log.info(f"Probing the load of {', '.join(hosts)}...")
+    probes: List[Tuple[SSHClient, ClusterLoad]] = []
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        futures = {host: executor.submit(_connect_and_probe, host, username, instance) for host in hosts}
+        for host, future in futures.items():
+            try:
+                probes.append(future.result())
+            # Any unreachable or misbehaving cluster is left out rather than failing the submission
+            except Exception as err:
+                log.warning(f"Leaving out cluster {host}: {err}")
+
+    if not probes:
+        raise PlacementError(f"None of the clusters {', '.join(hosts)} could be probed.")
+
+    for _, load in probes:
+        log.info(f"{load.host}: {load.idle_nodes} idle nodes, {load.pending_jobs} pending jobs.")
+    probes.sort(key=lambda probe: probe[1].expected_wait_key(instance.nodes))
+    selected, *others = [client for client, _ in probes]
+    for client in others:
+        client.__exit__(None, None, None)
+
+    click.echo(f"Submitting to {selected.host}.")
+    try:
+        yield selected
+    finally:
+        selected.__exit__(None, None, None)
@@ -1,7 +1,8 @@
 import logging
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from rdvc.slurm.ssh_client import SSHClient
+if TYPE_CHECKING:
+    from rdvc.slurm.ssh_client import SSHClient
 
 log = logging.getLogger("rdvc")
 REMOTE_RDVC_DIRECTORIES = ["logs", "submissions"]
@@ -25,7 +26,7 @@ class RDvcInitError(Exception):
         super().__init__(self.message)
 
 
-def check_rdvc_init(client: SSHClient) -> None:
+def check_rdvc_init(client: "SSHClient") -> None:
     """Check for existence of rDVC directories on the remote host."""
     log.info("Checking that rDVC directories exist on the remote host.")
     remote_dirs = client.listdir(".rdvc")
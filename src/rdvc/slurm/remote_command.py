@@ -1,23 +1,89 @@
 import io
 import logging
+import os
+import shlex
 from pathlib import Path
+from typing import Sequence
 
 import click
-from rdvc.slurm.ssh_client import SSHClient
+
+from rdvc.repo import GitBundle
+from rdvc.slurm.jobs import SUBMISSIONS_DIR
+from rdvc.slurm.remote_checks import REMOTE_RDVC_DIRECTORIES, RDvcInitError
+from rdvc.slurm.ssh_client import SLURM_BIN_DIR, SSHClient
+from rdvc.trace import traced
 
 log = logging.getLogger("rdvc")
 
+# Exit code of SUBMIT_SCRIPT when the remote rDVC directories are missing
+_RDVC_INIT_ERROR_EXIT_CODE = 3
+
+# Checks the rDVC directories, then places, submits and archives the sbatch script read from stdin. Positional
+# parameters are passed on to sbatch
+SUBMIT_SCRIPT = f"""\
+set -e
+for dir in {" ".join(REMOTE_RDVC_DIRECTORIES)}; do
+    if [ ! -d ".rdvc/$dir" ]; then
+        ls -A .rdvc 2>/dev/null || true
+        exit {_RDVC_INIT_ERROR_EXIT_CODE}
+    fi
+done
+sbatch_path=$(mktemp rdvc-sbatch-XXXXXXXXXX)
+trap 'rm -f "$sbatch_path"' EXIT
+cat > "$sbatch_path"
+chmod 775 "$sbatch_path"
+job_id=$({SLURM_BIN_DIR}/sbatch --parsable "$@" "$sbatch_path")
+mv "$sbatch_path" ".rdvc/submissions/$job_id.sbatch.sh"
+echo "$job_id"
+"""
+
+
+@traced("upload_bundle")
+def upload_bundle(client: SSHClient, bundle: GitBundle) -> None:
+    """Uploads `bundle` to the remote submissions directory, where the jobs fetch it from, unless an
+    earlier submission already did."""
+    bundle_path = f"{SUBMISSIONS_DIR}/{bundle.file_name}"
+    if client.file_exists(bundle_path):
+        log.info(f"Reusing git bundle {bundle_path}.")
+        return
+
+    # Jobs never see a partially uploaded bundle
+    temp_bundle_path = f"{bundle_path}.{os.getpid()}.tmp"
+    log.info(f"Uploading git bundle of {len(bundle.data)} bytes to {bundle_path}.")
+    client.upload(io.BytesIO(bundle.data), temp_bundle_path)
+    client.rename(temp_bundle_path, bundle_path)
+
 
-def submit_remote(client: SSHClient, sbatch_script: str) -> None:
+@traced("submit")
+def submit_remote(client: SSHClient, sbatch_script: str, sbatch_args: Sequence[str] = ()) -> str:
     submissions_dir = Path(".rdvc/submissions")
     sbatch_script_fo = io.BytesIO(sbatch_script.encode("utf-8"))
     temp_sbatch_path = client.make_tmpdir("rdvc-sbatch-XXXXXXXXXX")
 
     log.info(f"Copying sbatch submission file to {temp_sbatch_path}.")
-    client.upload(sbatch_script_fo, temp_sbatch_path, chmod=775)
+    client.upload(sbatch_script_fo, temp_sbatch_path, chmod=0o775)
 
-    job_id = client.submit_sbatch(temp_sbatch_path)
+    job_id = client.submit_sbatch(temp_sbatch_path, sbatch_args)
     click.echo(f"Submitted batch job {job_id}.")
 
     final_remote_file_path = submissions_dir / f"{job_id}.sbatch.sh"
     client.move(temp_sbatch_path, str(final_remote_file_path))
+    return job_id
+
+
+@traced("submit")
+def submit_remote_single_exec(client: SSHClient, sbatch_script: str, sbatch_args: Sequence[str] = ()) -> str:
+    """Checks the remote rDVC directories and submits `sbatch_script` with `sbatch_args` in a single round trip.
+
+    The script is sent over stdin, so neither an SFTP channel nor further exec calls are needed."""
+    log.info("Submitting sbatch script in a single remote command.")
+    script = f"set -- {shlex.join(sbatch_args)}\n{SUBMIT_SCRIPT}" if sbatch_args else SUBMIT_SCRIPT
+    exit_code, stdout, _ = client.run_script(script, stdin=sbatch_script.encode("utf-8"))
+
+    if exit_code == _RDVC_INIT_ERROR_EXIT_CODE:
+        raise RDvcInitError(stdout.split())
+    assert exit_code == 0, f"Failed to submit sbatch script (exit code {exit_code})."
+
+    job_id = stdout.splitlines()[-1]
+    click.echo(f"Submitted batch job {job_id}.")
+    return job_id
@@ -0,0 +1,121 @@
+import json
+import logging
+import statistics
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+REPORTS_DIR = ".rdvc/reports"
+
+# Phases recorded by the sbatch script, see `sections/report.j2`, and where they spend cluster time
+PHASE_CATEGORIES = {
+    "clone": "setup",
+    "venv": "setup",
+    # Only recorded by queue workers, checking out each experiment in turn, see `commands/worker.sbatch.j2`
+    "checkout": "setup",
+    "node_cache": "setup",
+    "exp_run": "compute",
+    "push": "push",
+    "push_run_cache": "push",
+    "node_cache_write_back": "push",
+}
+
+# Lists the reports of the last jobs, most recent first, and prints them in a single exec
+_FETCH_SCRIPT = """\
+cd {reports_dir} 2>/dev/null || exit 0
+ls -t -- *.jsonl 2>/dev/null | head -n {last} | xargs -r cat --
+"""
+
+
+@dataclass
+class PhaseRecord:
+    """Time spent by a job in one of its phases, as recorded on the compute node.
+
+    Attributes:
+        job_id (str): SLURM job id, `ARRAY_JOB_ID_TASK_ID` for array tasks
+        job_name (str): SLURM job name
+        phase (str): phase of the job, one of `PHASE_CATEGORIES`
+        node (str): compute node running the job
+        start (float): UNIX time at which the phase started
+        wall_seconds (float): elapsed time of the phase
+        cpu_seconds (float): user and system time of the processes run by the phase
+        exit_status (int): exit status of the phase, non-zero if the job failed in it
+    """
+
+    job_id: str
+    job_name: str
+    phase: str
+    node: str
+    start: float
+    wall_seconds: float
+    cpu_seconds: float
+    exit_status: int = 0
+
+
+@dataclass
+class PhaseSummary:
+    """Time spent in a phase, or in a category of phases, across jobs."""
+
+    name: str
+    wall_seconds: List[float] = field(default_factory=list)
+    cpu_seconds: float = 0.0
+    failures: int = 0
+
+    @property
+    def total(self) -> float:
+        return sum(self.wall_seconds)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.wall_seconds) if self.wall_seconds else 0.0
+
+    def add(self, record: PhaseRecord) -> None:
+        self.wall_seconds.append(record.wall_seconds)
+        self.cpu_seconds += record.cpu_seconds
+        self.failures += record.exit_status != 0
+
+
+def parse_report_records(output: str, name_prefix: Optional[str] = None) -> List[PhaseRecord]:
+    """Parses JSON lines of phase records, keeping the jobs named `name_prefix*`."""
+    records = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = PhaseRecord(**json.loads(line))
+        except (ValueError, TypeError):
+            # A job killed while writing its report leaves a truncated line
+            log.info(f"Skipping malformed report line: {line}")
+            continue
+        if name_prefix is None or record.job_name.startswith(name_prefix):
+            records.append(record)
+    return records
+
+
+def fetch_reports(client: SSHClient, last: int, name_prefix: Optional[str] = None) -> List[PhaseRecord]:
+    """Fetches the phase records of the `last` jobs that wrote a report with a single remote command."""
+    exit_code, stdout, stderr = client.run_script(_FETCH_SCRIPT.format(reports_dir=REPORTS_DIR, last=last))
+    if exit_code != 0:
+        log.warning(f"Reading the job reports of {client.host} failed: {stderr}")
+    return parse_report_records(stdout, name_prefix=name_prefix)
+
+
+def summarise_phases(records: List[PhaseRecord]) -> Dict[str, PhaseSummary]:
+    """Groups `records` by phase, in the order the phases run in a job."""
+    order = {phase: i for i, phase in enumerate(PHASE_CATEGORIES)}
+    summaries: Dict[str, PhaseSummary] = {}
+    for record in sorted(records, key=lambda record: order.get(record.phase, len(order))):
+        summaries.setdefault(record.phase, PhaseSummary(record.phase)).add(record)
+    return summaries
+
+
+def summarise_categories(records: List[PhaseRecord]) -> Dict[str, PhaseSummary]:
+    """Groups `records` into setup, compute and push time."""
+    summaries = {category: PhaseSummary(category) for category in dict.fromkeys(PHASE_CATEGORIES.values())}
+    for record in records:
+        category = PHASE_CATEGORIES.get(record.phase, "other")
+        summaries.setdefault(category, PhaseSummary(category)).add(record)
+    return summaries
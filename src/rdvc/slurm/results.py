@@ -0,0 +1,63 @@
+"""Experiments pushed by rDVC jobs, recorded on the cluster so that `rdvc wait` pulls only theirs.
+
+After pushing its experiment, every job appends the Git ref of the experiment to a file of the
+remote `.rdvc/results` directory named after the job, or the array task, see `sections/report.j2`.
+"""
+
+import logging
+import shlex
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+RESULTS_DIR = ".rdvc/results"
+
+# Prints the refs recorded by each job, prefixed with its id, in a single exec
+_READ_SCRIPT = """\
+cd {results_dir} 2>/dev/null || exit 0
+for job_id in {job_ids}; do
+    if [ -f "$job_id.refs" ]; then
+        sed "s|^|$job_id |" "$job_id.refs"
+    fi
+done
+"""
+
+
+class ExperimentPullError(Exception):
+    """Exception raised when the experiments of a job cannot be pulled."""
+
+
+def fetch_result_refs(client: SSHClient, job_ids: Sequence[str]) -> Dict[str, List[str]]:
+    """Reads the refs of the experiments pushed by the finished `job_ids` with a single remote command."""
+    if not job_ids:
+        return {}
+
+    exit_code, stdout, stderr = client.run_script(
+        _READ_SCRIPT.format(results_dir=RESULTS_DIR, job_ids=" ".join(map(shlex.quote, job_ids)))
+    )
+    if exit_code != 0:
+        log.warning(f"Reading the results of jobs {', '.join(job_ids)} failed: {stderr}")
+
+    refs: Dict[str, List[str]] = {}
+    for line in stdout.splitlines():
+        job_id, _, ref = line.partition(" ")
+        if ref:
+            refs.setdefault(job_id, []).append(ref)
+    return refs
+
+
+def pull_experiments(git_root: Path, git_remote: str, refs: Sequence[str]) -> List[str]:
+    """Pulls the experiments `refs` and their outputs from `git_remote` and the DVC remote, returns their names.
+
+    Pulls hold the lock of the DVC repository, so all the experiments to pull are best pulled at once. The
+    pull waits for the lock held by other DVC commands rather than failing."""
+    command = ["dvc", "--wait-for-lock", "exp", "pull", git_remote, *refs]
+    log.info(f"Running {shlex.join(command)}")
+    result = subprocess.run(command, cwd=git_root, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise ExperimentPullError(result.stderr.strip() or result.stdout.strip())
+    return [ref.rsplit("/", 1)[-1] for ref in refs]
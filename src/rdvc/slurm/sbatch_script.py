@@ -1,11 +1,16 @@
+import shlex
 from pathlib import Path
 from typing import Any
 
 from jinja2 import Environment, FileSystemLoader
 
+from rdvc.trace import traced
 
+
+@traced("render_template")
 def render_template(template_name: str, trim_blocks: bool = True, trim_lspace: bool = True, **kwargs: Any) -> str:
     environment = Environment(loader=FileSystemLoader(Path(__file__).parent.parent / "templates"))
+    environment.filters["quote"] = shlex.quote
     template = environment.get_template(template_name)
 
     return template.render(trim_blocks=trim_blocks, trim_lspace=trim_lspace, **kwargs)
@@ -1,32 +1,78 @@
 import logging
 import os
+import shlex
+import socket
+from pathlib import Path
 from types import TracebackType
-from typing import IO, List, Optional, Tuple, Type, Union, overload
+from typing import IO, Dict, List, Optional, Sequence, Tuple, Type, Union, overload
 
 import click
 import paramiko
 
+from rdvc.slurm.connection_daemon import (
+    daemon_exec,
+    daemon_open_sftp,
+    get_daemon_socket_path,
+    is_daemon_running,
+    split_host_port,
+)
+from rdvc.trace import span, traced
+
 log = logging.getLogger("rdvc")
 
+SLURM_BIN_DIR = "/opt/slurm/bin"
+
 
 class SSHClient:
-    def __init__(self, host: str, username: Optional[str] = None):
+    def __init__(self, host: str, username: Optional[str] = None, connect_timeout: Optional[float] = None):
         self.host = host
         self.username = username
+        self.connect_timeout = connect_timeout
         self._client = paramiko.SSHClient()
         self._sftp_client: Optional[paramiko.SFTPClient] = None
+        self._daemon_socket_path: Optional[Path] = None
 
         self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     def __enter__(self) -> "SSHClient":
+        # Open channels on the connection daemon's shared transport whenever it is running
+        daemon_socket_path = get_daemon_socket_path()
+        if is_daemon_running(daemon_socket_path):
+            log.info(f"Using the connection daemon's SSH connection to {self.host}.")
+            self._daemon_socket_path = daemon_socket_path
+            return self
+
         log.info(f"Establishing SSH connection to {self.host}...")
-        self._client.connect(self.host, username=self.username)
+        hostname, port = split_host_port(self.host)
+        with span("ssh_connect", host=self.host):
+            sock = self._open_socket(hostname, port)
+            with span("ssh_handshake"):
+                self._client.connect(
+                    hostname, port=port, username=self.username, timeout=self.connect_timeout, sock=sock
+                )
         log.info("Connected.")
         return self
 
+    def _open_socket(self, hostname: str, port: int) -> socket.socket:
+        # Resolving and connecting here rather than in paramiko times them apart from the SSH handshake
+        with span("dns", hostname=hostname):
+            addresses = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+
+        with span("tcp_connect"):
+            error: Optional[OSError] = None
+            for family, socket_type, proto, _, address in addresses:
+                sock = socket.socket(family, socket_type, proto)
+                sock.settimeout(self.connect_timeout)
+                try:
+                    sock.connect(address)
+                    return sock
+                except OSError as err:
+                    sock.close()
+                    error = err
+        raise error or OSError(f"Could not resolve {hostname}.")
+
     @overload
-    def __exit__(self, exc_type: None, exc_val: None, exc_tb: None) -> None:
-        ...
+    def __exit__(self, exc_type: None, exc_val: None, exc_tb: None) -> None: ...
 
     @overload
     def __exit__(
@@ -34,8 +80,7 @@ class SSHClient:
         exc_type: Type[BaseException],
         exc_val: BaseException,
         exc_tb: TracebackType,
-    ) -> None:
-        ...
+    ) -> None: ...
 
     def __exit__(
         self, exc_type: Optional[Type[BaseException]], exc_val: Optional[BaseException], exc_tb: Optional[TracebackType]
@@ -46,52 +91,104 @@ class SSHClient:
             self._sftp_client.close()
         self._client.close()
 
+    def _get_sftp_client(self) -> paramiko.SFTPClient:
+        if not self._sftp_client:
+            log.info("Establishing SFTP connection...")
+            with span("sftp_open"):
+                if self._daemon_socket_path:
+                    self._sftp_client = daemon_open_sftp(
+                        self._daemon_socket_path, self.host, self.username, connect_timeout=self.connect_timeout
+                    )
+                else:
+                    self._sftp_client = self._client.open_sftp()
+            log.info("Connected.")
+
+        return self._sftp_client
+
+    def _run_command(
+        self, command: str, stdin: Optional[bytes] = None, timeout: Optional[float] = None
+    ) -> Tuple[int, bytes, bytes]:
+        if self._daemon_socket_path:
+            return daemon_exec(
+                self._daemon_socket_path,
+                self.host,
+                self.username,
+                command,
+                stdin=stdin,
+                connect_timeout=self.connect_timeout,
+                timeout=timeout,
+            )
+
+        stdin_file, stdout, stderr = self._client.exec_command(command, timeout=timeout)
+        if stdin is not None:
+            stdin_file.write(stdin)
+            stdin_file.flush()
+        stdin_file.channel.shutdown_write()
+
+        stdout_bytes = stdout.read()
+        stderr_bytes = stderr.read()
+        return stdout.channel.recv_exit_status(), stdout_bytes, stderr_bytes
+
     def _exec_command(
-        self, command: str, print_stdout: bool = True, print_stderr: bool = True, assert_exit_code: Optional[int] = 0
+        self,
+        command: str,
+        print_stdout: bool = True,
+        print_stderr: bool = True,
+        assert_exit_code: Optional[int] = 0,
+        stdin: Optional[bytes] = None,
+        timeout: Optional[float] = None,
     ) -> Tuple[int, str, str]:
-        _, stdout, stderr = self._client.exec_command(command)
+        # Long scripts are cut short to keep traces readable
+        with span("exec", command=command[:200]) as span_args:
+            exit_code, stdout, stderr = self._run_command(command, stdin=stdin, timeout=timeout)
+            span_args["exit_code"] = exit_code
 
-        stdout_str = stdout.read().decode().rstrip()
+        stdout_str = stdout.decode().rstrip()
         if print_stdout and stdout_str:
             click.echo(stdout_str)
 
-        stderr_str = stderr.read().decode().rstrip()
+        stderr_str = stderr.decode().rstrip()
         if print_stderr and stderr_str:
             click.echo(stderr_str, err=True)
 
-        exit_code = stdout.channel.recv_exit_status()
         if assert_exit_code is not None:
             assert exit_code == 0, f"Exit code not equal to {assert_exit_code} ({command})."
 
         return exit_code, stdout_str, stderr_str
 
     def upload(self, file_obj: IO, remote_file_path: Union[str, os.PathLike], chmod: Optional[int] = None) -> None:
-        if not self._sftp_client:
-            log.info("Establishing SFTP connection...")
-            self._sftp_client = self._client.open_sftp()
-            log.info("Connected.")
-
-        self._sftp_client.putfo(file_obj, str(remote_file_path))
+        sftp_client = self._get_sftp_client()
+        sftp_client.putfo(file_obj, str(remote_file_path))
 
         if chmod is not None:
-            self._sftp_client.chmod(str(remote_file_path), chmod)
+            sftp_client.chmod(str(remote_file_path), chmod)
 
     def listdir(self, path: str) -> List[str]:
-        if not self._sftp_client:
-            log.info("Establishing SFTP connection...")
-            self._sftp_client = self._client.open_sftp()
-            log.info("Connected.")
-
-        return self._sftp_client.listdir(path)
+        return self._get_sftp_client().listdir(path)
+
+    def open_file(self, path: str) -> paramiko.SFTPFile:
+        """Opens remote file `path` for reading over the SFTP channel shared by all calls."""
+        return self._get_sftp_client().open(path, "rb")
+
+    def file_sizes(self, paths: List[str]) -> Dict[str, int]:
+        """Returns the sizes of the existing `paths` with a single remote command."""
+        if not paths:
+            return {}
+        _, stdout, _ = self._exec_command(
+            shlex.join(["stat", "--format=%s %n", "--", *paths]),
+            print_stdout=False,
+            print_stderr=False,
+            assert_exit_code=None,
+        )
+        sizes = {}
+        for line in stdout.splitlines():
+            size, path = line.split(" ", 1)
+            sizes[path] = int(size)
+        return sizes
 
     def file_exists(self, path: str) -> bool:
-        if not self._sftp_client:
-            log.info("Establishing SFTP connection...")
-            self._sftp_client = self._client.open_sftp()
-            log.info("Connected.")
-
         try:
-            self._sftp_client.stat(path)
+            self._get_sftp_client().stat(path)
             return True
         except FileNotFoundError:
             return False
@@ -106,7 +203,34 @@ class SSHClient:
     def move(self, old_path: str, new_path: str) -> Tuple[int, str, str]:
         return self._exec_command(f"mv {old_path} {new_path}")
 
-    def submit_sbatch(self, sbatch_file_path: str) -> str:
-        sbatch_cmd = "/opt/slurm/bin/sbatch"
-        _, job_id, _ = self._exec_command(f"{sbatch_cmd} --parsable {sbatch_file_path}", print_stdout=False)
+    def rename(self, old_path: str, new_path: str) -> None:
+        """Atomically renames `old_path` over the SFTP channel, without a remote command."""
+        self._get_sftp_client().posix_rename(old_path, new_path)
+
+    @traced("submit_sbatch")
+    def submit_sbatch(self, sbatch_file_path: str, sbatch_args: Sequence[str] = ()) -> str:
+        sbatch_cmd = f"{SLURM_BIN_DIR}/sbatch"
+        _, job_id, _ = self._exec_command(
+            shlex.join([sbatch_cmd, "--parsable", *sbatch_args, sbatch_file_path]), print_stdout=False
+        )
         return job_id
+
+    def sacct(self, *args: str) -> str:
+        sacct_cmd = f"{SLURM_BIN_DIR}/sacct"
+        _, stdout, _ = self._exec_command(shlex.join([sacct_cmd, *args]), print_stdout=False)
+        return stdout
+
+    def sinfo(self, *args: str) -> str:
+        sinfo_cmd = f"{SLURM_BIN_DIR}/sinfo"
+        _, stdout, _ = self._exec_command(shlex.join([sinfo_cmd, *args]), print_stdout=False)
+        return stdout
+
+    def run_script(
+        self, script: str, stdin: Optional[bytes] = None, timeout: Optional[float] = None
+    ) -> Tuple[int, str, str]:
+        """Runs a POSIX shell `script` in a single remote exec without asserting its exit code.
+
+        Raises `socket.timeout` if the script outputs nothing for `timeout` seconds."""
+        return self._exec_command(
+            f"sh -c {shlex.quote(script)}", print_stdout=False, assert_exit_code=None, stdin=stdin, timeout=timeout
+        )
@@ -0,0 +1,181 @@
+"""Queues of experiments on the cluster, drained by pilot jobs started with `rdvc workers start`.
+
+Every queue is a directory of the cluster holding one small shell file per experiment. Experiments
+are appended over SFTP and claimed by workers with an atomic rename, so neither side needs a lock.
+A queue only serves revisions sharing the Python environment dependencies its workers were started
+with, so that workers can keep their environment warm across experiments.
+"""
+
+import fnmatch
+import hashlib
+import io
+import logging
+import secrets
+import shlex
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from dulwich.objects import Commit, Tree
+from dulwich.repo import Repo
+
+from rdvc.repo import RDvcJobRepo
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+QUEUES_DIR = ".rdvc/queues"
+QUEUE_SUBDIRECTORIES = ["pending", "claimed", "done", "failed", "workers"]
+
+# Files of the repository root defining its Python environment, see `sections/prepare_dvc.j2`
+ENVIRONMENT_FILE_PATTERNS = [
+    "pyproject.toml",
+    "setup.cfg",
+    "setup.py",
+    "requirements*.txt",
+    "*.lock",
+    ".python-version",
+    "init_python_venv.sh",
+]
+
+# Workers touch their heartbeat file every WORKER_HEARTBEAT_INTERVAL seconds while they run
+WORKER_HEARTBEAT_INTERVAL = 30
+_WORKER_LIVENESS_MINUTES = 2
+
+# Prints the state of the queues named `prefix*`, one line per queue, in a single exec
+_STATE_SCRIPT = """\
+mkdir -p {create}
+cd {queues_dir} 2>/dev/null || exit 0
+for queue in {prefix}*/; do
+    queue="${{queue%/}}"
+    [ -d "$queue" ] || continue
+    printf '%s' "$queue"
+    for dir in pending claimed done failed; do
+        printf ' %s' "$(ls "$queue/$dir" 2>/dev/null | wc -l)"
+    done
+    printf ' %s\\n' "$(find "$queue/workers" -type f -mmin -{liveness} 2>/dev/null | wc -l)"
+done
+"""
+
+# Creates a queue, and lets its workers run again if they were stopped
+_PREPARE_SCRIPT = """\
+mkdir -p {directories}
+rm -f {queue_dir}/stop
+"""
+
+# Asks the workers of the queues named `prefix*` to exit once their current experiment is finished
+_STOP_SCRIPT = """\
+cd {queues_dir} 2>/dev/null || exit 0
+for queue in {prefix}*/; do
+    [ -d "$queue" ] && touch "${{queue}}stop" && echo "${{queue%/}}"
+done
+"""
+
+
+@dataclass
+class QueueState:
+    """Number of experiments in each state, and of live workers, of a queue."""
+
+    name: str
+    pending: int
+    claimed: int
+    done: int
+    failed: int
+    workers: int
+
+
+def get_environment_key(repo: Repo, rev: str) -> str:
+    """Hashes the files defining the Python environment of the repository at `rev`."""
+    commit = repo[rev.encode()]
+    assert isinstance(commit, Commit)
+    tree = repo[commit.tree]
+    assert isinstance(tree, Tree)
+
+    digest = hashlib.sha256()
+    for entry in tree.iteritems():
+        name = entry.path.decode()
+        if any(fnmatch.fnmatch(name, pattern) for pattern in ENVIRONMENT_FILE_PATTERNS):
+            digest.update(entry.path + b"\0" + entry.sha + b"\n")
+    return digest.hexdigest()
+
+
+def get_queue_name(job_repo: RDvcJobRepo, environment_key: str) -> str:
+    """Name of the queue of the experiments of `job_repo` sharing the Python environment `environment_key`."""
+    digest = hashlib.sha256(f"{job_repo.url}\0{environment_key}".encode()).hexdigest()
+    return f"{job_repo.name}-{digest[:16]}"
+
+
+def make_experiment_spec(spec_id: str, job_repo: RDvcJobRepo, pull: bool, options: Sequence[str]) -> str:
+    """Shell variables describing an experiment, sourced by the worker running it."""
+    variables = {
+        "RDVC_EXP_ID": spec_id,
+        "RDVC_EXP_REV": job_repo.rev,
+        "RDVC_EXP_PULL": "1" if pull else "0",
+        "RDVC_EXP_OPTIONS": " ".join(options),
+    }
+    return "".join(f"{name}={shlex.quote(value)}\n" for name, value in variables.items())
+
+
+def parse_queue_states(output: str) -> List[QueueState]:
+    states = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) != 6:
+            log.info(f"Skipping malformed queue state line: {line}")
+            continue
+        name, *counts = fields
+        states.append(QueueState(name, *(int(count) for count in counts)))
+    return states
+
+
+def read_queue_states(client: SSHClient, prefix: str, create: Optional[str] = None) -> List[QueueState]:
+    """Reads the state of the queues named `prefix*` with a single remote command, creating queue `create`."""
+    directories = [f"{QUEUES_DIR}/{create}/{subdirectory}" for subdirectory in QUEUE_SUBDIRECTORIES] if create else []
+    script = _STATE_SCRIPT.format(
+        create=" ".join(map(shlex.quote, directories or [QUEUES_DIR])),
+        queues_dir=QUEUES_DIR,
+        prefix=shlex.quote(prefix),
+        liveness=_WORKER_LIVENESS_MINUTES,
+    )
+    exit_code, stdout, stderr = client.run_script(script)
+    if exit_code != 0:
+        log.warning(f"Reading the queues of {client.host} failed: {stderr}")
+    return parse_queue_states(stdout)
+
+
+def prepare_queue(client: SSHClient, queue_name: str) -> None:
+    queue_dir = f"{QUEUES_DIR}/{queue_name}"
+    directories = [f"{queue_dir}/{subdirectory}" for subdirectory in QUEUE_SUBDIRECTORIES]
+    exit_code, _, stderr = client.run_script(
+        _PREPARE_SCRIPT.format(directories=" ".join(map(shlex.quote, directories)), queue_dir=shlex.quote(queue_dir))
+    )
+    assert exit_code == 0, f"Failed to create queue {queue_name}: {stderr}"
+
+
+def enqueue_experiments(
+    client: SSHClient, queue_name: str, job_repo: RDvcJobRepo, pull: bool, experiments: Sequence[Sequence[str]]
+) -> List[str]:
+    """Appends `experiments`, given as their `dvc exp run` options, to queue `queue_name` over SFTP.
+
+    Every experiment is written to a hidden file first and renamed into the queue, so that workers
+    never read a partial one. Returns the ids of the queued experiments, in queue order."""
+    queue_dir = f"{QUEUES_DIR}/{queue_name}"
+    spec_ids = []
+    for options in experiments:
+        # Workers take the experiments in the lexicographic order of their ids
+        spec_id = f"{time.time_ns()}-{secrets.token_hex(4)}"
+        spec = make_experiment_spec(spec_id, job_repo, pull, options)
+        client.upload(io.BytesIO(spec.encode("utf-8")), f"{queue_dir}/pending/.{spec_id}.tmp")
+        client.rename(f"{queue_dir}/pending/.{spec_id}.tmp", f"{queue_dir}/pending/{spec_id}.sh")
+        spec_ids.append(spec_id)
+    return spec_ids
+
+
+def stop_workers(client: SSHClient, prefix: str) -> List[str]:
+    """Asks the workers of the queues named `prefix*` to exit, returns the names of these queues."""
+    exit_code, stdout, stderr = client.run_script(
+        _STOP_SCRIPT.format(queues_dir=QUEUES_DIR, prefix=shlex.quote(prefix))
+    )
+    if exit_code != 0:
+        log.warning(f"Stopping the workers of {client.host} failed: {stderr}")
+    return stdout.split()
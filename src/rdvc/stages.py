@@ -0,0 +1,157 @@
+"""Split of a DVC pipeline into jobs running groups of its stages, for `rdvc run --split-stages`.
+
+Chains of stages sharing an instance type are run by the same job, and independent branches of the
+pipeline by separate jobs. Outputs are passed from job to job through the run-cache of the DVC remote:
+every job pushes the run-cache of its stages, and `dvc exp run --pull` restores them in the jobs
+downstream instead of running them again. The last job runs the whole pipeline that way and pushes
+the experiment.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Set, Tuple
+
+import click
+from contextlib_chdir import chdir
+
+from rdvc.run_cache import RunCacheCheckError, parse_exp_run_args
+
+log = logging.getLogger("rdvc")
+
+
+class StageSplitError(Exception):
+    """Exception raised when the pipeline cannot be split into jobs."""
+
+
+@dataclass
+class StageGroup:
+    """Stages of a pipeline run by the same job.
+
+    Attributes:
+        stages (List[str]): addresses of the stages, upstream first, empty for a job only collecting the
+            results of the others
+        instance (str): name of the instance type of the job
+        upstream (List[int]): indices of the groups the stages depend on, whose jobs must complete first
+    """
+
+    stages: List[str]
+    instance: str
+    upstream: List[int] = field(default_factory=list)
+
+
+def parse_stage_instances(specs: Sequence[str]) -> Dict[str, str]:
+    """Parses `STAGE=INSTANCE` options into instance types by stage."""
+    stage_instances = {}
+    for spec in specs:
+        stage, sep, instance = spec.partition("=")
+        if not sep or not stage or not instance:
+            raise click.BadParameter(f"expected STAGE=INSTANCE but got '{spec}'", param_hint="--stage-instance")
+        stage_instances[stage] = instance
+    return stage_instances
+
+
+def read_stage_graph(root: Path, targets: Sequence[str]) -> Dict[str, List[str]]:
+    """Reads the stages of the DVC pipelines of `root` needed for `targets`, or all of them.
+
+    Returns the upstream stages of every stage, by address, upstream stages first. Stages of `.dvc`
+    files only track data and are left out, their outputs are pulled by the jobs needing them."""
+    # pylint: disable-next=import-outside-toplevel
+    from dvc.exceptions import DvcException
+    from dvc.repo import Repo as DvcRepo
+    from dvc.stage import PipelineStage
+
+    try:
+        dvc_repo = DvcRepo(str(root))
+    except DvcException as err:
+        raise StageSplitError(str(err)) from err
+
+    # Edges of the graph point from each stage to the stages it depends on
+    ordered: Dict[str, List[str]] = {}
+
+    def visit(stage: Any) -> None:
+        if stage.addressing in ordered:
+            return
+        upstream = sorted((dep for dep in graph.successors(stage) if dep in stages), key=lambda dep: dep.addressing)
+        for dep in upstream:
+            visit(dep)
+        if isinstance(stage, PipelineStage):
+            ordered[stage.addressing] = [dep.addressing for dep in upstream if isinstance(dep, PipelineStage)]
+
+    try:
+        # Addresses of stages are relative to the working directory
+        with chdir(root):
+            graph = dvc_repo.index.graph
+            stages: Set[Any] = set()
+            for target in targets:
+                stages.update(dvc_repo.stage.collect(target, with_deps=True))
+            if not targets:
+                stages.update(graph.nodes)
+            for stage in sorted(stages, key=lambda stage: stage.addressing):
+                visit(stage)
+    except DvcException as err:
+        raise StageSplitError(str(err)) from err
+    finally:
+        dvc_repo.close()
+
+    if not ordered:
+        raise StageSplitError("the pipeline has no stages to run")
+    return ordered
+
+
+def get_stage_instance(address: str, stage_instances: Mapping[str, str], default_instance: str) -> str:
+    """Instance type of the stage at `address`, stages of `foreach` loops also matching their common name."""
+    return stage_instances.get(address, stage_instances.get(address.split("@", 1)[0], default_instance))
+
+
+def group_stages(
+    graph: Mapping[str, List[str]], stage_instances: Mapping[str, str], default_instance: str
+) -> List[StageGroup]:
+    """Groups the stages of `graph`, as returned by `read_stage_graph`, into jobs.
+
+    A stage joins the job of its upstream stage when it is the only stage depending on it, and both run
+    on the same instance type. The groups are returned in submission order, and the last one completes
+    the experiment: it is the group of the last stage when the pipeline has a single one, otherwise an
+    extra group depending on the groups of all the last stages."""
+    downstream: Dict[str, List[str]] = {address: [] for address in graph}
+    for address, upstream in graph.items():
+        for dep in upstream:
+            downstream[dep].append(address)
+
+    groups: List[StageGroup] = []
+    group_of: Dict[str, int] = {}
+    for address, upstream in graph.items():
+        instance = get_stage_instance(address, stage_instances, default_instance)
+        if (
+            len(upstream) == 1
+            and len(downstream[upstream[0]]) == 1
+            and groups[group_of[upstream[0]]].instance == instance
+        ):
+            group_of[address] = group_of[upstream[0]]
+            groups[group_of[address]].stages.append(address)
+            continue
+
+        group_of[address] = len(groups)
+        groups.append(StageGroup([address], instance, sorted({group_of[dep] for dep in upstream})))
+
+    upstream_groups = {index for group in groups for index in group.upstream}
+    last_groups = [index for index in range(len(groups)) if index not in upstream_groups]
+    if len(last_groups) > 1:
+        groups.append(StageGroup([], default_instance, last_groups))
+    return groups
+
+
+def split_pipeline(
+    root: Path, args: Sequence[str], stage_instances: Mapping[str, str], default_instance: str
+) -> Tuple[List[StageGroup], List[str]]:
+    """Groups the stages run by `dvc exp run ARGS` into jobs, see `group_stages`.
+
+    Also returns the `dvc exp run` arguments of the jobs running groups of stages, which keep the
+    parameter overrides of ARGS but run their own stages rather than its targets."""
+    try:
+        targets, overrides = parse_exp_run_args(args)
+    except RunCacheCheckError as err:
+        raise StageSplitError(str(err)) from err
+
+    groups = group_stages(read_stage_graph(root, targets), stage_instances, default_instance)
+    return groups, [arg for override in overrides for arg in ("-S", override)]
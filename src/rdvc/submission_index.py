@@ -0,0 +1,235 @@
+"""Local index of the jobs submitted from a repository, kept in `rdvc-index.sqlite` of its Git directory."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import TracebackType
+from typing import Dict, List, Optional, Sequence, Type
+
+from dulwich.repo import Repo
+
+from rdvc.slurm.jobs import FINISHED_STATES, SlurmJob, query_jobs
+from rdvc.slurm.ssh_client import SSHClient
+
+log = logging.getLogger("rdvc")
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS submissions (
+    host TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    rev TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    state TEXT NOT NULL,
+    upstream TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (host, job_id)
+);
+CREATE INDEX IF NOT EXISTS submissions_key ON submissions (key, state);
+"""
+
+_COLUMNS = "host, job_id, key, job_name, rev, submitted, state, upstream"
+
+# Jobs no longer reported by `sacct`, e.g. after its records expired, are not in flight anymore
+UNKNOWN_STATE = "UNKNOWN"
+_DONE_STATES = sorted(FINISHED_STATES | {UNKNOWN_STATE})
+# Seconds during which a job just submitted may not be reported by `sacct` yet
+SACCT_GRACE_PERIOD = 300
+
+
+@dataclass
+class Submission:
+    """Job submitted from the repository, as recorded in the index.
+
+    Attributes:
+        host (str): cluster the job was submitted to
+        job_id (str): SLURM job id, the array job id for sweeps
+        key (str): hash of the submitted job, see `submission_key`
+        job_name (str): SLURM job name
+        rev (str): git revision run by the job
+        submitted (float): UNIX time of the submission
+        state (str): last known SLURM state of the job
+        upstream (str): comma-separated ids of the stage jobs of `rdvc run --split-stages` the job depends on
+    """
+
+    host: str
+    job_id: str
+    key: str
+    job_name: str
+    rev: str
+    submitted: float
+    state: str = "PENDING"
+    upstream: str = ""
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in _DONE_STATES
+
+    @property
+    def upstream_job_ids(self) -> List[str]:
+        return self.upstream.split(",") if self.upstream else []
+
+
+def submission_key(sbatch_script: str, rev: str, args: Sequence[str], instance: str) -> str:
+    """Hashes everything that defines a job, so that identical submissions share the same key."""
+    content = json.dumps([sbatch_script, rev, list(args), instance])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def aggregate_state(jobs: Sequence[SlurmJob]) -> str:
+    """State of a job from its `sacct` records: the state of its first unfinished array task if any,
+    otherwise COMPLETED only if all its tasks completed."""
+    for job in jobs:
+        if not job.is_finished:
+            return job.state
+    return next((job.state for job in jobs if job.state != "COMPLETED"), "COMPLETED")
+
+
+class SubmissionIndex:
+    """SQLite index of the jobs submitted from a repository, used as a context manager.
+
+    It lets `rdvc run` find identical jobs still in flight, and `rdvc status` and `rdvc wait` query the
+    jobs of the repository without listing the remote submissions directory. Stored in the `.git` directory,
+    like the stat cache of the repository check."""
+
+    FILE_NAME = "rdvc-index.sqlite"
+
+    def __init__(self, repo: Repo):
+        self.path = Path(repo.controldir()) / self.FILE_NAME
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "SubmissionIndex":
+        # Concurrent rDVC commands wait for each other's writes rather than failing
+        self._connection = sqlite3.connect(self.path, timeout=30)
+        self._connection.executescript(_SCHEMA)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        assert self._connection is not None, "SubmissionIndex must be used as a context manager."
+        return self._connection
+
+    def add(self, submission: Submission) -> None:
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO submissions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    submission.host,
+                    submission.job_id,
+                    submission.key,
+                    submission.job_name,
+                    submission.rev,
+                    submission.submitted,
+                    submission.state,
+                    submission.upstream,
+                ),
+            )
+
+    def find_unfinished(self, key: str) -> List[Submission]:
+        """Returns the submissions of `key` not known to be finished, most recent first, including those with
+        stage jobs, whose state only reflects the last job of their chain."""
+        placeholders = ", ".join("?" * len(_DONE_STATES))
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM submissions WHERE key = ? AND (state NOT IN ({placeholders}) OR upstream != '') "
+            "ORDER BY submitted DESC",
+            (key, *_DONE_STATES),
+        )
+        return [Submission(*row) for row in rows]
+
+    def unfinished(self, host: str) -> List[Submission]:
+        """Returns the submissions to `host` not known to be finished, most recent first."""
+        placeholders = ", ".join("?" * len(_DONE_STATES))
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM submissions WHERE host = ? AND state NOT IN ({placeholders}) "
+            "ORDER BY submitted DESC",
+            (host, *_DONE_STATES),
+        )
+        return [Submission(*row) for row in rows]
+
+    def latest(self, host: str, last: Optional[int] = None) -> List[Submission]:
+        """Returns the `last` submissions to `host`, most recent first."""
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM submissions WHERE host = ? ORDER BY submitted DESC LIMIT ?",
+            (host, -1 if last is None else last),
+        )
+        return [Submission(*row) for row in rows]
+
+    def update_states(self, host: str, jobs: Sequence[SlurmJob]) -> Dict[str, str]:
+        """Records the states of the `jobs` reported by `sacct`, aggregating the tasks of job arrays, and
+        returns them by job id."""
+        jobs_by_id: Dict[str, List[SlurmJob]] = {}
+        for job in jobs:
+            jobs_by_id.setdefault(job.array_job_id, []).append(job)
+        states = {job_id: aggregate_state(array_jobs) for job_id, array_jobs in jobs_by_id.items()}
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE submissions SET state = ? WHERE host = ? AND job_id = ?",
+                [(state, host, job_id) for job_id, state in states.items()],
+            )
+        return states
+
+
+def find_in_flight(
+    index: SubmissionIndex, key: str, username: Optional[str], client: Optional[SSHClient] = None
+) -> Optional[Submission]:
+    """Returns the most recent submission of `key` still pending or running, checking the states of all
+    candidates with a single `sacct` call per cluster, through `client` for its own cluster.
+
+    A submission of `rdvc run --split-stages` is in flight as long as any job of its chain is, e.g. the stage
+    jobs after the last job was cancelled, and is then returned as its first such stage job."""
+    submissions = index.find_unfinished(key)
+    states: Dict[str, Dict[str, str]] = {}
+    for host in dict.fromkeys(submission.host for submission in submissions):
+        job_ids = [
+            job_id
+            for submission in submissions
+            if submission.host == host
+            for job_id in [submission.job_id, *submission.upstream_job_ids]
+        ]
+        if client is not None and client.host == host:
+            jobs = query_jobs(client, job_ids)
+        else:
+            with SSHClient(host=host, username=username) as host_client:
+                jobs = query_jobs(host_client, job_ids)
+        states[host] = index.update_states(host, jobs)
+
+    for submission in submissions:
+        host_states = states[submission.host]
+        is_recent = time.time() - submission.submitted <= SACCT_GRACE_PERIOD
+        if submission.job_id in host_states:
+            submission.state = host_states[submission.job_id]
+        elif not is_recent:
+            submission.state = UNKNOWN_STATE
+            index.add(submission)
+        if not submission.is_finished:
+            return submission
+
+        for job_id in submission.upstream_job_ids:
+            state = host_states.get(job_id, "PENDING" if is_recent else UNKNOWN_STATE)
+            if state not in _DONE_STATES:
+                return replace(submission, job_id=job_id, state=state)
+    return None
+
+
+def record_submission(repo: Repo, submission: Submission) -> None:
+    """Adds `submission` to the index, warning rather than failing when the index cannot be written."""
+    try:
+        with SubmissionIndex(repo) as index:
+            index.add(submission)
+    except (OSError, sqlite3.Error) as err:
+        log.warning(f"Could not record job {submission.job_id} in the submission index: {err}")
@@ -0,0 +1,45 @@
+import itertools
+import shlex
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import click
+
+
+def parse_sweep_param(spec: str) -> List[Tuple[str, ...]]:
+    """Parses `PARAM=V1,V2,...` into one `-S PARAM=Vi` override per value."""
+    param, sep, values = spec.partition("=")
+    if not sep or not param or not values:
+        raise click.BadParameter(f"expected PARAM=V1,V2,... but got '{spec}'", param_hint="--sweep")
+
+    return [("-S", f"{param}={value}") for value in values.split(",")]
+
+
+def load_sweep_file(path: Path) -> List[Tuple[str, ...]]:
+    """Reads one set of `dvc exp run` overrides per line, ignoring blank lines and comments."""
+    points = []
+    with open(path) as f:
+        for line in f:
+            args = tuple(shlex.split(line, comments=True))
+            if args:
+                points.append(args)
+
+    if not points:
+        raise click.BadParameter(f"no experiments listed in '{path}'", param_hint="--sweep-file")
+
+    return points
+
+
+def expand_sweep(sweep_params: Sequence[str], sweep_file: Optional[Path] = None) -> List[Tuple[str, ...]]:
+    """Returns the extra `dvc exp run` arguments of each experiment in the sweep.
+
+    The sweep is the cartesian product of the lines of `sweep_file` and the values of every
+    `--sweep` parameter. An empty list means no sweep was requested."""
+    axes = [parse_sweep_param(spec) for spec in sweep_params]
+    if sweep_file is not None:
+        axes.insert(0, load_sweep_file(sweep_file))
+
+    if not axes:
+        return []
+
+    return [tuple(itertools.chain.from_iterable(point)) for point in itertools.product(*axes)]
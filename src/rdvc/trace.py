@@ -0,0 +1,116 @@
+"""Timed spans of the phases of an rDVC command, exported in the Chrome trace event format.
+
+Spans are only recorded once `enable` has been called, e.g. by `rdvc --profile PATH`, so that
+instrumented code costs next to nothing otherwise. Load the exported file in `chrome://tracing`
+or https://ui.perfetto.dev.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, TypeVar, cast
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int
+    end_ns: int
+    thread_id: int
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class _Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.spans: List[Span] = []
+        self.origin_ns = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+_tracer = _Tracer()
+
+
+def enable() -> None:
+    _tracer.enabled = True
+    _tracer.origin_ns = time.perf_counter_ns()
+
+
+def is_enabled() -> bool:
+    return _tracer.enabled
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """Records the time spent in the block as span `name`. The yielded `args` can be completed in the block."""
+    if not _tracer.enabled:
+        yield args
+        return
+
+    start_ns = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        _tracer.record(Span(name, start_ns, time.perf_counter_ns(), threading.get_ident(), args))
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Records every call of the decorated function as span `name`."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def export_chrome_trace(path: Path) -> None:
+    thread_ids: Dict[int, int] = {}
+    events = [
+        {
+            "name": s.name,
+            "cat": "rdvc",
+            "ph": "X",
+            "ts": (s.start_ns - _tracer.origin_ns) / 1e3,
+            "dur": (s.end_ns - s.start_ns) / 1e3,
+            "pid": os.getpid(),
+            "tid": thread_ids.setdefault(s.thread_id, len(thread_ids)),
+            "args": s.args,
+        }
+        for s in sorted(_tracer.spans, key=lambda s: s.start_ns)
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+def summarise() -> str:
+    """Returns the number of calls and the total time of every span name, in the order they first started."""
+    totals: Dict[str, List[float]] = {}
+    for s in sorted(_tracer.spans, key=lambda s: s.start_ns):
+        count_and_total = totals.setdefault(s.name, [0, 0.0])
+        count_and_total[0] += 1
+        count_and_total[1] += s.duration_ms
+
+    width = max((len(name) for name in totals), default=0)
+    lines = [f"{'span'.ljust(width)}  calls  total (ms)"]
+    lines += [f"{name.ljust(width)}  {int(count):>5}  {total:>10.1f}" for name, (count, total) in totals.items()]
+    return "\n".join(lines)
@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from rdvc.slurm.catalogue import (
+    CatalogueEntry,
+    InstanceCatalogueError,
+    find_instance,
+    load_catalogue,
+    parse_sinfo_output,
+    save_catalogue,
+    select_auto_instance,
+)
+from rdvc.slurm.instance import InstanceType, InstanceTypes
+
+SINFO_OUTPUT = """\
+general*|c5.2xlarge,x86|8|(null)|15000|3|idle
+general*|c5.2xlarge,x86|8|(null)|15000|2|mixed
+general*|c5.2xlarge,x86|8|(null)|15000|1|idle~
+gpu|g5.xlarge|4|gpu:a10g:1(S:0)|16000|2|allocated
+gpu|g5.12xlarge|48+|gpu:a10g:4,gpu:t4:2|190000|1|idle
+debug|(null)|2|(null)|4000|1|idle*
+not|enough|fields
+"""
+
+
+def _entries_by_name() -> Dict[str, CatalogueEntry]:
+    return {entry.instance.name: entry for entry in parse_sinfo_output(SINFO_OUTPUT)}
+
+
+def test_parse_sinfo_output_groups_nodes_of_the_same_kind() -> None:
+    entry = _entries_by_name()["c5.2xlarge"]
+    assert entry.instance == InstanceType(
+        name="c5.2xlarge", partition="general", gpus=0, cpus=8, constraint="c5.2xlarge"
+    )
+    assert entry.mem_per_node == 15000
+    assert entry.total_nodes == 6
+    # Powered down idle nodes are idle too
+    assert entry.idle_nodes == 4
+
+
+def test_parse_sinfo_output_counts_gpus() -> None:
+    entries = _entries_by_name()
+    assert entries["g5.xlarge"].instance.gpus == 1
+    assert entries["g5.xlarge"].idle_nodes == 0
+    assert entries["g5.12xlarge"].instance.gpus == 6
+    assert entries["g5.12xlarge"].instance.cpus == 48
+
+
+def test_parse_sinfo_output_names_nodes_without_features_after_their_partition() -> None:
+    entry = _entries_by_name()["debug"]
+    assert entry.instance.partition == "debug"
+    assert entry.instance.constraint == ""
+    assert entry.idle_nodes == 1
+
+
+def test_parse_sinfo_output_skips_malformed_lines() -> None:
+    assert len(parse_sinfo_output(SINFO_OUTPUT)) == 4
+    assert parse_sinfo_output("") == []
+
+
+def test_select_auto_instance_prefers_idle_nodes_then_the_smallest() -> None:
+    entries = parse_sinfo_output(SINFO_OUTPUT)
+    assert select_auto_instance(entries).name == "debug"
+    assert select_auto_instance(entries, min_cpus=4).name == "c5.2xlarge"
+    # The smaller instance type with a GPU has no idle node
+    assert select_auto_instance(entries, min_gpus=1).name == "g5.12xlarge"
+    assert select_auto_instance(entries, min_mem=100000).name == "g5.12xlarge"
+
+
+def test_select_auto_instance_without_match() -> None:
+    with pytest.raises(InstanceCatalogueError):
+        select_auto_instance(parse_sinfo_output(SINFO_OUTPUT), min_gpus=8)
+
+
+def test_find_instance_prefers_built_in_instance_types() -> None:
+    entries = parse_sinfo_output(SINFO_OUTPUT)
+    assert find_instance(entries, "g5.xlarge") == InstanceTypes.from_name("g5.xlarge")
+    assert find_instance(entries, "c5.2xlarge").partition == "general"
+    with pytest.raises(InstanceCatalogueError):
+        find_instance(entries, "p4d.24xlarge")
+
+
+def test_catalogue_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("RDVC_CACHE_DIR", str(tmp_path))
+    assert load_catalogue("cluster", ttl=60) is None
+
+    entries = parse_sinfo_output(SINFO_OUTPUT)
+    save_catalogue("cluster", entries)
+    assert load_catalogue("cluster", ttl=60) == entries
+    assert load_catalogue("cluster", ttl=-1) is None
+
+
+def test_catalogue_entry_satisfies() -> None:
+    entry = CatalogueEntry(InstanceType(name="a", partition="p", gpus=1, cpus=8), mem_per_node=1000)
+    assert entry.satisfies(8, 1, 1000)
+    assert not entry.satisfies(9, 1, 1000)
+    assert not entry.satisfies(8, 2, 1000)
+    assert not entry.satisfies(8, 1, 1001)
@@ -0,0 +1,34 @@
+"""The CLI starts without importing the dependencies of the subcommands it does not run."""
+
+import json
+import subprocess
+import sys
+from typing import List
+
+HEAVY_MODULES = ["paramiko", "dulwich", "jinja2"]
+
+_LOADED_MODULES = f"""
+import json, sys
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def _loaded_heavy_modules(code: str) -> List[str]:
+    result = subprocess.run([sys.executable, "-c", code + _LOADED_MODULES], capture_output=True, text=True, check=True)
+    loaded: List[str] = json.loads(result.stdout.splitlines()[-1])
+    return loaded
+
+
+def test_import_cli() -> None:
+    assert _loaded_heavy_modules("import rdvc.cli") == []
+
+
+def test_help() -> None:
+    code = """
+from rdvc.cli import cli
+try:
+    cli(["--help"])
+except SystemExit as error:
+    assert not error.code, error.code
+"""
+    assert _loaded_heavy_modules(code) == []
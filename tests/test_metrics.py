@@ -0,0 +1,63 @@
+from typing import List
+
+import pytest
+
+from rdvc.slurm.metrics import JobMetrics, parse_cpu_time, query_job_metrics
+
+SACCT_OUTPUT = """\
+1234|COMPLETED|600|00:20:00||billing=4,cpu=4,mem=16000M,node=1|
+1234.batch|COMPLETED|600|00:19:59|1500.50M|cpu=4,mem=16000M,node=1|cpu=00:19:59,mem=1500M,gres/gpuutil=20
+1234.0|COMPLETED|590|00:00:01|3000M|cpu=4,mem=16000M,node=1|cpu=00:00:01,mem=3000M,gres/gpuutil=75
+1235_0|CANCELLED by 1000|30|01:00.500||cpu=2,node=1|
+1235_0.batch|CANCELLED|30|01:00.500|200M|cpu=2,node=1|cpu=01:00.500,mem=200M
+1235_1|RUNNING|10|||cpu=2,node=1|
+9999.batch|COMPLETED|1|00:00:01|1M|cpu=1|
+not|enough|fields
+"""
+
+
+class FakeClient:
+    def __init__(self, stdout: str) -> None:
+        self.stdout = stdout
+        self.calls: List[List[str]] = []
+
+    def sacct(self, *args: str) -> str:
+        self.calls.append(list(args))
+        return self.stdout
+
+
+@pytest.mark.parametrize(
+    ("value", "seconds"),
+    [("03:04.5", 184.5), ("02:03:04", 7384.0), ("1-02:03:04", 93784.0), ("00:00:00", 0.0)],
+)
+def test_parse_cpu_time(value: str, seconds: float) -> None:
+    assert parse_cpu_time(value) == seconds
+
+
+def test_query_job_metrics() -> None:
+    client = FakeClient(SACCT_OUTPUT)
+
+    jobs = query_job_metrics(client, ["1234", "1235"])  # type: ignore[arg-type]
+
+    assert jobs == [
+        JobMetrics("1234", "COMPLETED", elapsed=600, cpu_time=1200.0, alloc_cpus=4, max_rss=3000, gpu_util=75.0),
+        JobMetrics("1235_0", "CANCELLED", elapsed=30, cpu_time=60.5, alloc_cpus=2, max_rss=200),
+        JobMetrics("1235_1", "RUNNING", elapsed=10, alloc_cpus=2),
+    ]
+    assert len(client.calls) == 1
+    assert "--jobs=1234,1235" in client.calls[0]
+
+
+def test_job_metrics_properties() -> None:
+    job = JobMetrics("1235_0", "CANCELLED", elapsed=30, cpu_time=60.0)
+    assert job.array_job_id == "1235"
+    assert job.is_finished
+    assert job.cpus == 2.0
+    assert JobMetrics("1235_1", "RUNNING").cpus == 0.0
+    assert not JobMetrics("1235_1", "RUNNING").is_finished
+
+
+def test_query_job_metrics_without_jobs() -> None:
+    client = FakeClient(SACCT_OUTPUT)
+    assert query_job_metrics(client, []) == []  # type: ignore[arg-type]
+    assert client.calls == []
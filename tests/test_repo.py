@@ -0,0 +1,126 @@
+import os
+import stat
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from dulwich.index import cleanup_mode
+from dulwich.repo import Repo
+
+from rdvc.repo import _find_unstaged_change, _index_stat_matches
+
+_NS_PER_S = 1_000_000_000
+
+
+def _git(repo_path: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=rdvc", "-c", "user.email=rdvc@example.com", *args],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    _git(tmp_path, "init", "--quiet")
+    (tmp_path / "data.txt").write_text("original\n")
+    (tmp_path / "other.txt").write_text("other\n")
+    _git(tmp_path, "add", "data.txt", "other.txt")
+    _git(tmp_path, "commit", "--quiet", "-m", "init")
+    # Files written in the same instant as the index are always hashed, see test_racy_change_is_found
+    index_path = tmp_path / ".git" / "index"
+    index_mtime_ns = index_path.stat().st_mtime_ns + 2 * _NS_PER_S
+    os.utime(index_path, ns=(index_mtime_ns, index_mtime_ns))
+    return tmp_path
+
+
+def _unstaged_change(repo_path: Path) -> Optional[bytes]:
+    repo = Repo(str(repo_path))
+    return _find_unstaged_change(repo, repo.open_index())
+
+
+def test_clean_working_tree(repo_path: Path) -> None:
+    assert _unstaged_change(repo_path) is None
+
+
+def test_modified_file(repo_path: Path) -> None:
+    (repo_path / "data.txt").write_text("modified content\n")
+    assert _unstaged_change(repo_path) == b"data.txt"
+
+
+def test_deleted_file(repo_path: Path) -> None:
+    (repo_path / "other.txt").unlink()
+    assert _unstaged_change(repo_path) == b"other.txt"
+
+
+def test_touched_file_is_hashed_and_found_unchanged(repo_path: Path) -> None:
+    data_path = repo_path / "data.txt"
+    mtime_ns = data_path.stat().st_mtime_ns + _NS_PER_S
+    os.utime(data_path, ns=(mtime_ns, mtime_ns))
+    assert _unstaged_change(repo_path) is None
+
+
+def test_untracked_files_are_ignored(repo_path: Path) -> None:
+    (repo_path / "untracked.txt").write_text("new\n")
+    assert _unstaged_change(repo_path) is None
+
+
+def test_racy_change_is_found(repo_path: Path) -> None:
+    # Same size and modification time as in the index, but written no earlier than the index itself
+    data_path = repo_path / "data.txt"
+    original_mtime_ns = data_path.stat().st_mtime_ns
+    data_path.write_text("changed!\n")
+    os.utime(data_path, ns=(original_mtime_ns, original_mtime_ns))
+    index_path = repo_path / ".git" / "index"
+    os.utime(index_path, ns=(original_mtime_ns, original_mtime_ns))
+
+    assert _unstaged_change(repo_path) == b"data.txt"
+
+
+def _entry_for(path: Path, **overrides: object) -> SimpleNamespace:
+    st = path.stat()
+    fields = {
+        "mtime": (st.st_mtime_ns // _NS_PER_S, st.st_mtime_ns % _NS_PER_S),
+        "size": st.st_size,
+        "ino": st.st_ino,
+        "mode": cleanup_mode(st.st_mode),
+        **overrides,
+    }
+    return SimpleNamespace(**fields)
+
+
+def test_index_stat_matches(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_text("content\n")
+    st = path.stat()
+    later_ns = st.st_mtime_ns + _NS_PER_S
+
+    assert _index_stat_matches(_entry_for(path), st, later_ns)
+    assert not _index_stat_matches(_entry_for(path, size=st.st_size + 1), st, later_ns)
+    assert not _index_stat_matches(_entry_for(path, ino=st.st_ino + 1), st, later_ns)
+    assert not _index_stat_matches(_entry_for(path, mode=stat.S_IFREG | 0o755), st, later_ns)
+
+
+def test_index_stat_matches_ignores_missing_inode_numbers(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_text("content\n")
+    st = path.stat()
+    assert _index_stat_matches(_entry_for(path, ino=0), st, st.st_mtime_ns + _NS_PER_S)
+
+
+def test_index_stat_matches_with_whole_seconds(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_text("content\n")
+    st = path.stat()
+    entry = _entry_for(path, mtime=(st.st_mtime_ns // _NS_PER_S, 0))
+    assert _index_stat_matches(entry, st, st.st_mtime_ns + _NS_PER_S)
+
+
+def test_index_stat_matches_distrusts_files_as_recent_as_the_index(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_text("content\n")
+    st = path.stat()
+    assert not _index_stat_matches(_entry_for(path), st, st.st_mtime_ns)
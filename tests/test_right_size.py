@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+import pytest
+
+from rdvc.job_history import JobRecord
+from rdvc.right_size import (
+    Recommendation,
+    format_time_limit,
+    parse_time_limit,
+    recommend,
+)
+from rdvc.slurm.catalogue import CatalogueEntry
+from rdvc.slurm.instance import InstanceType
+
+GPU_INSTANCE = InstanceType(name="gpu.large", partition="gpu", gpus=4, cpus=32)
+CANDIDATES = [
+    CatalogueEntry(InstanceType(name="cpu.small", partition="cpu", gpus=0, cpus=4), mem_per_node=8000),
+    CatalogueEntry(InstanceType(name="gpu.small", partition="gpu", gpus=1, cpus=8), mem_per_node=30000),
+    CatalogueEntry(InstanceType(name="gpu.medium", partition="gpu", gpus=4, cpus=16), mem_per_node=60000),
+    CatalogueEntry(GPU_INSTANCE, mem_per_node=120000),
+]
+
+
+def _records(
+    state: str = "COMPLETED",
+    elapsed: int = 1200,
+    max_rss: int = 2000,
+    cpus: float = 2.0,
+    gpu_util: Optional[float] = 50.0,
+) -> List[JobRecord]:
+    return [
+        JobRecord(state="COMPLETED", elapsed=600, max_rss=1000, cpus=1.0, alloc_cpus=32, gpu_util=gpu_util),
+        JobRecord(state="COMPLETED", elapsed=900, max_rss=1500, cpus=1.5, alloc_cpus=32, gpu_util=gpu_util),
+        JobRecord(state=state, elapsed=elapsed, max_rss=max_rss, cpus=cpus, alloc_cpus=32, gpu_util=gpu_util),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("value", "seconds"),
+    [
+        ("90", 5400),
+        ("90:30", 5430),
+        ("1:30:00", 5400),
+        ("2-12", 216000),
+        ("2-12:30", 217800),
+        ("1-00:00:10", 86410),
+        (" 45 ", 2700),
+    ],
+)
+def test_parse_time_limit(value: str, seconds: int) -> None:
+    assert parse_time_limit(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["", "1h", "1:2:3:4", "-5"])
+def test_parse_time_limit_rejects_invalid_limits(value: str) -> None:
+    with pytest.raises(ValueError, match="invalid time limit"):
+        parse_time_limit(value)
+
+
+def test_format_time_limit() -> None:
+    assert format_time_limit(5430) == "01:30:30"
+    assert format_time_limit(86410) == "1-00:00:10"
+    assert parse_time_limit(format_time_limit(217800)) == 217800
+
+
+def test_recommend_needs_enough_jobs() -> None:
+    assert recommend(_records()[:2], GPU_INSTANCE, None, CANDIDATES) is None
+
+
+def test_recommend_sizes_requests_with_headroom() -> None:
+    # Busy GPUs are kept
+    assert recommend(_records(), GPU_INSTANCE, "4:00:00", CANDIDATES) == Recommendation(
+        jobs=3, time=1800, mem=2560, instance=CANDIDATES[2].instance
+    )
+
+
+def test_recommend_only_tightens_requests() -> None:
+    instance = InstanceType(name="gpu.small", partition="gpu", gpus=1, cpus=8, mem=2048)
+    assert recommend(_records(), instance, "20", CANDIDATES) is None
+
+
+def test_recommend_drops_idle_gpus() -> None:
+    recommendation = recommend(_records(gpu_util=1.0), GPU_INSTANCE, None, CANDIDATES)
+    assert recommendation is not None
+    assert recommendation.instance == CANDIDATES[0].instance
+
+
+def test_recommend_keeps_gpus_without_utilisation_accounting() -> None:
+    recommendation = recommend(_records(gpu_util=None), GPU_INSTANCE, None, CANDIDATES)
+    assert recommendation is not None
+    assert recommendation.instance == CANDIDATES[2].instance
+
+
+def test_recommend_keeps_the_time_limit_after_a_timeout() -> None:
+    recommendation = recommend(_records(state="TIMEOUT"), GPU_INSTANCE, "4:00:00", CANDIDATES)
+    assert recommendation is not None
+    assert recommendation.time is None
+    assert recommendation.mem == 2560
+
+
+def test_recommend_keeps_memory_and_instance_type_after_running_out_of_memory() -> None:
+    recommendation = recommend(_records(state="OUT_OF_MEMORY"), GPU_INSTANCE, "4:00:00", CANDIDATES)
+    assert recommendation == Recommendation(jobs=3, time=1800)
+
+
+def test_recommend_only_picks_instance_types_with_enough_resources() -> None:
+    recommendation = recommend(_records(cpus=14.0, max_rss=70000), GPU_INSTANCE, None, CANDIDATES)
+    assert recommendation is not None
+    assert recommendation.instance is None
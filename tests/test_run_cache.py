@@ -0,0 +1,33 @@
+from typing import List
+
+import pytest
+
+from rdvc.run_cache import RunCacheCheckError, parse_exp_run_args
+
+
+def test_parse_exp_run_args_without_args() -> None:
+    assert parse_exp_run_args([]) == ([], [])
+
+
+def test_parse_exp_run_args_splits_targets_and_overrides() -> None:
+    args = ["train", "-S", "lr=0.1", "--set-param", "epochs=3", "-Sseed=1", "--set-param=model=small", "evaluate"]
+    assert parse_exp_run_args(args) == (["train", "evaluate"], ["lr=0.1", "epochs=3", "seed=1", "model=small"])
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--pull", "--allow-missing", "-q"],
+        ["-n", "my-exp", "-m", "message"],
+        ["--name=my-exp", "--message=message"],
+        ["--verbose", "-v", "--quiet"],
+    ],
+)
+def test_parse_exp_run_args_skips_neutral_options(args: List[str]) -> None:
+    assert parse_exp_run_args([*args, "train"]) == (["train"], [])
+
+
+@pytest.mark.parametrize("args", [["--force"], ["train", "--downstream"], ["-R", "pipelines"], ["--queue"]])
+def test_parse_exp_run_args_rejects_options_changing_the_run(args: List[str]) -> None:
+    with pytest.raises(RunCacheCheckError):
+        parse_exp_run_args(args)
@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import click
+import pytest
+
+from rdvc.stages import (
+    StageGroup,
+    StageSplitError,
+    get_stage_instance,
+    group_stages,
+    parse_stage_instances,
+    read_stage_graph,
+    split_pipeline,
+)
+
+DVC_YAML = """\
+stages:
+  prepare:
+    cmd: echo prepare > prepared.txt
+    outs: [prepared.txt]
+  train:
+    foreach: [a, b]
+    do:
+      cmd: cat prepared.txt > model-${item}.txt
+      deps: [prepared.txt]
+      outs:
+        - model-${item}.txt
+  evaluate:
+    cmd: cat model-a.txt model-b.txt > metrics.txt
+    deps: [model-a.txt, model-b.txt]
+    outs: [metrics.txt]
+"""
+
+
+def test_parse_stage_instances() -> None:
+    assert parse_stage_instances(["train=g5.xlarge", "prepare=c5.large"]) == {
+        "train": "g5.xlarge",
+        "prepare": "c5.large",
+    }
+
+
+@pytest.mark.parametrize("spec", ["train", "=g5.xlarge", "train="])
+def test_parse_stage_instances_rejects_invalid_specs(spec: str) -> None:
+    with pytest.raises(click.BadParameter):
+        parse_stage_instances([spec])
+
+
+def test_get_stage_instance_matches_foreach_stages() -> None:
+    stage_instances = {"train": "g5.xlarge", "train@b": "g5.12xlarge"}
+    assert get_stage_instance("train@a", stage_instances, "t3.large") == "g5.xlarge"
+    assert get_stage_instance("train@b", stage_instances, "t3.large") == "g5.12xlarge"
+    assert get_stage_instance("evaluate", stage_instances, "t3.large") == "t3.large"
+
+
+def test_group_stages_runs_a_chain_on_one_instance_type_as_one_job() -> None:
+    graph = {"prepare": [], "train": ["prepare"], "evaluate": ["train"]}
+    assert group_stages(graph, {}, "t3.large") == [StageGroup(["prepare", "train", "evaluate"], "t3.large")]
+
+
+def test_group_stages_splits_chains_on_instance_types() -> None:
+    graph = {"prepare": [], "train": ["prepare"], "evaluate": ["train"]}
+    assert group_stages(graph, {"train": "g5.xlarge"}, "t3.large") == [
+        StageGroup(["prepare"], "t3.large"),
+        StageGroup(["train"], "g5.xlarge", [0]),
+        StageGroup(["evaluate"], "t3.large", [1]),
+    ]
+
+
+def test_group_stages_runs_branches_as_separate_jobs() -> None:
+    graph = {"prepare": [], "train@a": ["prepare"], "train@b": ["prepare"], "evaluate": ["train@a", "train@b"]}
+    assert group_stages(graph, {}, "t3.large") == [
+        StageGroup(["prepare"], "t3.large"),
+        StageGroup(["train@a"], "t3.large", [0]),
+        StageGroup(["train@b"], "t3.large", [0]),
+        StageGroup(["evaluate"], "t3.large", [1, 2]),
+    ]
+
+
+def test_group_stages_completes_independent_pipelines_with_an_extra_job() -> None:
+    graph = {"a": [], "a2": ["a"], "b": []}
+    assert group_stages(graph, {"b": "g5.xlarge"}, "t3.large") == [
+        StageGroup(["a", "a2"], "t3.large"),
+        StageGroup(["b"], "g5.xlarge"),
+        StageGroup([], "t3.large", [0, 1]),
+    ]
+
+
+@pytest.fixture
+def dvc_repo(tmp_path: Path) -> Path:
+    # pylint: disable-next=import-outside-toplevel
+    from dvc.repo import Repo as DvcRepo
+
+    DvcRepo.init(str(tmp_path), no_scm=True).close()
+    (tmp_path / "dvc.yaml").write_text(DVC_YAML)
+    return tmp_path
+
+
+def test_read_stage_graph(dvc_repo: Path) -> None:
+    assert read_stage_graph(dvc_repo, []) == {
+        "prepare": [],
+        "train@a": ["prepare"],
+        "train@b": ["prepare"],
+        "evaluate": ["train@a", "train@b"],
+    }
+
+
+def test_read_stage_graph_of_targets(dvc_repo: Path) -> None:
+    assert read_stage_graph(dvc_repo, ["train@a"]) == {"prepare": [], "train@a": ["prepare"]}
+
+
+def test_read_stage_graph_outside_a_dvc_repository(tmp_path: Path) -> None:
+    with pytest.raises(StageSplitError):
+        read_stage_graph(tmp_path, [])
+
+
+def test_split_pipeline_keeps_parameter_overrides(dvc_repo: Path) -> None:
+    groups, args = split_pipeline(dvc_repo, ["-S", "lr=0.1", "train@b"], {"train": "g5.xlarge"}, "t3.large")
+    assert groups == [StageGroup(["prepare"], "t3.large"), StageGroup(["train@b"], "g5.xlarge", [0])]
+    assert args == ["-S", "lr=0.1"]
@@ -0,0 +1,151 @@
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterable, Iterator, List
+
+import pytest
+from dulwich.repo import Repo
+
+from rdvc import submission_index
+from rdvc.slurm.jobs import SlurmJob
+from rdvc.submission_index import (
+    UNKNOWN_STATE,
+    Submission,
+    SubmissionIndex,
+    aggregate_state,
+    find_in_flight,
+    submission_key,
+)
+
+
+def _job(job_id: str, state: str) -> SlurmJob:
+    return SlurmJob(job_id=job_id, name="rdvc-run:repo:main", state=state, elapsed="", exit_code="", nodes="")
+
+
+def _submission(job_id: str, state: str = "PENDING", key: str = "key", **fields: object) -> Submission:
+    defaults = {"host": "cluster", "job_name": "rdvc-run:repo:main", "rev": "abc", "submitted": float(job_id)}
+    return Submission(job_id=job_id, key=key, state=state, **{**defaults, **fields})  # type: ignore[arg-type]
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> Iterator[SubmissionIndex]:
+    with SubmissionIndex(Repo.init(str(tmp_path))) as index:
+        yield index
+
+
+def test_index_is_kept_in_the_git_directory(tmp_path: Path) -> None:
+    with SubmissionIndex(Repo.init(str(tmp_path))) as index:
+        index.add(_submission("1"))
+    assert (tmp_path / ".git" / SubmissionIndex.FILE_NAME).is_file()
+
+
+def test_submission_key_depends_on_every_input() -> None:
+    key = submission_key("script", "rev", ["-S", "a=1"], "t3.xlarge")
+    assert key == submission_key("script", "rev", ["-S", "a=1"], "t3.xlarge")
+    assert key != submission_key("script2", "rev", ["-S", "a=1"], "t3.xlarge")
+    assert key != submission_key("script", "rev2", ["-S", "a=1"], "t3.xlarge")
+    assert key != submission_key("script", "rev", ["-S", "a=2"], "t3.xlarge")
+    assert key != submission_key("script", "rev", ["-S", "a=1"], "g5.xlarge")
+
+
+def test_aggregate_state() -> None:
+    assert aggregate_state([_job("1_0", "COMPLETED"), _job("1_1", "COMPLETED")]) == "COMPLETED"
+    assert aggregate_state([_job("1_0", "COMPLETED"), _job("1_1", "RUNNING")]) == "RUNNING"
+    assert aggregate_state([_job("1_0", "FAILED"), _job("1_1", "PENDING")]) == "PENDING"
+    assert aggregate_state([_job("1_0", "COMPLETED"), _job("1_1", "FAILED")]) == "FAILED"
+
+
+def test_find_unfinished(index: SubmissionIndex) -> None:
+    index.add(_submission("1", "RUNNING"))
+    index.add(_submission("2", "COMPLETED"))
+    index.add(_submission("3", UNKNOWN_STATE))
+    index.add(_submission("4", "PENDING"))
+    index.add(_submission("5", "PENDING", key="other"))
+    # Chains of stage jobs stay candidates after their last job finished
+    index.add(_submission("6", "CANCELLED", upstream="7,8"))
+
+    assert [submission.job_id for submission in index.find_unfinished("key")] == ["6", "4", "1"]
+
+
+def test_latest_and_unfinished(index: SubmissionIndex) -> None:
+    index.add(_submission("1", "RUNNING"))
+    index.add(_submission("2", "COMPLETED"))
+    index.add(_submission("3", "PENDING", host="other"))
+
+    assert [submission.job_id for submission in index.latest("cluster")] == ["2", "1"]
+    assert [submission.job_id for submission in index.latest("cluster", 1)] == ["2"]
+    assert [submission.job_id for submission in index.unfinished("cluster")] == ["1"]
+
+
+def test_update_states_aggregates_array_tasks(index: SubmissionIndex) -> None:
+    index.add(_submission("1"))
+    index.add(_submission("2"))
+
+    states = index.update_states("cluster", [_job("1_0", "COMPLETED"), _job("1_1", "RUNNING"), _job("2", "FAILED")])
+
+    assert states == {"1": "RUNNING", "2": "FAILED"}
+    assert [(s.job_id, s.state) for s in index.latest("cluster")] == [("2", "FAILED"), ("1", "RUNNING")]
+
+
+def _fake_sacct(monkeypatch: pytest.MonkeyPatch, jobs: List[SlurmJob]) -> List[List[str]]:
+    queries: List[List[str]] = []
+
+    def query_jobs(client: object, job_ids: Iterable[str]) -> List[SlurmJob]:
+        queries.append(list(job_ids))
+        return [job for job in jobs if job.array_job_id in queries[-1]]
+
+    monkeypatch.setattr(submission_index, "query_jobs", query_jobs)
+    return queries
+
+
+def test_find_in_flight(index: SubmissionIndex, monkeypatch: pytest.MonkeyPatch) -> None:
+    index.add(_submission("1", "RUNNING"))
+    index.add(_submission("2", "PENDING"))
+    queries = _fake_sacct(monkeypatch, [_job("1", "RUNNING"), _job("2", "COMPLETED")])
+
+    in_flight = find_in_flight(index, "key", None, client=SimpleNamespace(host="cluster"))  # type: ignore[arg-type]
+
+    assert in_flight is not None
+    assert (in_flight.job_id, in_flight.state) == ("1", "RUNNING")
+    # A single sacct call for all the candidates, whose states are recorded
+    assert queries == [["2", "1"]]
+    assert index.find_unfinished("key")[0].job_id == "1"
+
+
+def test_find_in_flight_forgets_jobs_unknown_to_sacct(index: SubmissionIndex, monkeypatch: pytest.MonkeyPatch) -> None:
+    index.add(_submission("1", "RUNNING"))
+    _fake_sacct(monkeypatch, [])
+
+    assert find_in_flight(index, "key", None, client=SimpleNamespace(host="cluster")) is None  # type: ignore[arg-type]
+    assert index.find_unfinished("key") == []
+
+
+def test_find_in_flight_trusts_recent_jobs_unknown_to_sacct(
+    index: SubmissionIndex, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A job submitted moments ago may not be reported by sacct yet
+    index.add(_submission("1", "PENDING", submitted=time.time()))
+    _fake_sacct(monkeypatch, [])
+
+    in_flight = find_in_flight(index, "key", None, client=SimpleNamespace(host="cluster"))  # type: ignore[arg-type]
+
+    assert in_flight is not None
+    assert (in_flight.job_id, in_flight.state) == ("1", "PENDING")
+
+
+def test_find_in_flight_returns_the_running_stage_job(index: SubmissionIndex, monkeypatch: pytest.MonkeyPatch) -> None:
+    index.add(_submission("3", "PENDING", upstream="1,2"))
+    _fake_sacct(monkeypatch, [_job("1", "COMPLETED"), _job("2", "RUNNING"), _job("3", "CANCELLED")])
+
+    in_flight = find_in_flight(index, "key", None, client=SimpleNamespace(host="cluster"))  # type: ignore[arg-type]
+
+    assert in_flight is not None
+    assert (in_flight.job_id, in_flight.state) == ("2", "RUNNING")
+
+
+def test_find_in_flight_without_candidates(index: SubmissionIndex, monkeypatch: pytest.MonkeyPatch) -> None:
+    index.add(_submission("1", "COMPLETED"))
+    queries = _fake_sacct(monkeypatch, [])
+
+    assert find_in_flight(index, "key", None) is None
+    assert queries == []
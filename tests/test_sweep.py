@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import click
+import pytest
+
+from rdvc.sweep import expand_sweep, load_sweep_file, parse_sweep_param
+
+
+def test_parse_sweep_param() -> None:
+    assert parse_sweep_param("lr=0.1,0.01") == [("-S", "lr=0.1"), ("-S", "lr=0.01")]
+
+
+def test_parse_sweep_param_keeps_equal_signs_of_values() -> None:
+    assert parse_sweep_param("train.opt=a=1,b=2") == [("-S", "train.opt=a=1"), ("-S", "train.opt=b=2")]
+
+
+@pytest.mark.parametrize("spec", ["lr", "=0.1", "lr="])
+def test_parse_sweep_param_rejects_invalid_specs(spec: str) -> None:
+    with pytest.raises(click.BadParameter):
+        parse_sweep_param(spec)
+
+
+def test_expand_sweep_without_sweep() -> None:
+    assert expand_sweep([]) == []
+
+
+def test_expand_sweep_is_the_product_of_the_params() -> None:
+    assert expand_sweep(["a=1,2", "b=x,y"]) == [
+        ("-S", "a=1", "-S", "b=x"),
+        ("-S", "a=1", "-S", "b=y"),
+        ("-S", "a=2", "-S", "b=x"),
+        ("-S", "a=2", "-S", "b=y"),
+    ]
+
+
+def test_load_sweep_file_skips_blank_lines_and_comments(tmp_path: Path) -> None:
+    sweep_file = tmp_path / "sweep.txt"
+    sweep_file.write_text("# learning rates\n-S lr=0.1\n\n-S 'name=a b'  # quoted\n")
+    assert load_sweep_file(sweep_file) == [("-S", "lr=0.1"), ("-S", "name=a b")]
+
+
+def test_load_sweep_file_rejects_empty_files(tmp_path: Path) -> None:
+    sweep_file = tmp_path / "sweep.txt"
+    sweep_file.write_text("# nothing yet\n")
+    with pytest.raises(click.BadParameter):
+        load_sweep_file(sweep_file)
+
+
+def test_expand_sweep_puts_the_file_first(tmp_path: Path) -> None:
+    sweep_file = tmp_path / "sweep.txt"
+    sweep_file.write_text("-S model=small\n-S model=large\n")
+    assert expand_sweep(["seed=1,2"], sweep_file) == [
+        ("-S", "model=small", "-S", "seed=1"),
+        ("-S", "model=small", "-S", "seed=2"),
+        ("-S", "model=large", "-S", "seed=1"),
+        ("-S", "model=large", "-S", "seed=2"),
+    ]